@@ -1,351 +1,82 @@
-import os
-import pyodbc
-import win32com.client as win32
-from win32com.client import constants
+import startup_profile  # первым: от него отсчитывается время запуска
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
-import pandas as pd
 from datetime import datetime, timedelta
-import pythoncom
-from tkcalendar import DateEntry
-import shutil
-
-
-# --- 1. Создание и резервное копирование БД ---
-def create_access_database(db_path):
-    if os.path.exists(db_path):
-        try:
-            os.remove(db_path)
-        except PermissionError:
-            messagebox.showerror("Ошибка", f"Файл {db_path} используется другим процессом.")
-            return False
 
-    try:
-        pythoncom.CoInitialize()
-        access_app = win32.Dispatch("Access.Application")
-        access_app.NewCurrentDatabase(db_path)
-        db = access_app.CurrentDb()
-
-        # Таблица групп
-        sql_groups = """
-        CREATE TABLE Groups (
-            group_id AUTOINCREMENT PRIMARY KEY,
-            group_name TEXT,
-            description MEMO
-        );
-        """
-        db.Execute(sql_groups)
+import backup_store
+import club_client
+import club_data
+import periods
+import query_trace
+import search_index
+import storage
+import virtual_tree
+import worker
+
+# Тонкий клиент: при заданном SPORTCLUB_SERVER программа не открывает файл БД,
+# а работает через сервер club_server.py — одну базу делят несколько стоек
+THIN_CLIENT = club_client.server_url() is not None
+if THIN_CLIENT:
+    from club_client import (
+        DB_CACHE, load_groups, load_all_athletes, load_athletes,
+        add_group, update_group, delete_group, add_athlete, get_athlete, update_athlete, move_athlete,
+        delete_athlete, mark_payment, mark_payments_bulk, get_group_snapshot, get_payment_stats,
+        get_diagnostics, reset_diagnostics,
+    )
+else:
+    from club_data import (
+        DB_BACKEND, DB_POOL, DB_CACHE, backup_database, load_groups, load_all_athletes, load_athletes,
+        add_group, update_group, delete_group, add_athlete, get_athlete, update_athlete, move_athlete,
+        delete_athlete, mark_payment, mark_payments_bulk, get_group_snapshot, get_payment_stats,
+        get_diagnostics, reset_diagnostics,
+    )
 
-        # Таблица спортсменов
-        sql_athletes = """
-        CREATE TABLE Athletes (
-            athlete_id AUTOINCREMENT PRIMARY KEY,
-            name TEXT,
-            birth_date DATETIME,
-            phone TEXT,
-            current_group_id LONG
-        );
-        """
-        db.Execute(sql_athletes)
-
-        # Таблица оплаты
-        sql_payments = """
-        CREATE TABLE Payments (
-            payment_id AUTOINCREMENT PRIMARY KEY,
-            athlete_id LONG,
-            month_year TEXT,
-            paid YESNO,
-            CONSTRAINT NoDuplicatePayment UNIQUE (athlete_id, month_year)
-        );
-        """
-        db.Execute(sql_payments)
-
-        access_app.Quit()
-        return True
+# Ошибки функций работы с БД показываются в окне (из фонового потока — через очередь)
+club_data.show_error = club_client.show_error = worker.show_error
+club_data.show_warning = club_client.show_warning = messagebox.showwarning
 
-    except Exception as e:
-        messagebox.showerror("Ошибка", f"Не удалось создать БД: {str(e)}")
-        return False
-    finally:
-        pythoncom.CoUninitialize()
 
+# --- 1. Данные для списков ---
+def athletes_source(group_id=None):
+    if THIN_CLIENT:
+        return club_client.RosterSource(group_id)
+    sql, params, count_sql = club_data.roster_query(group_id)
+    return virtual_tree.QuerySource(DB_POOL, sql, params, count_sql,
+                                    cache=DB_CACHE, cache_key=("athletes", group_id or None, "pages"))
 
-def backup_database(db_path):
-    try:
-        backup_dir = os.path.join(os.path.dirname(db_path), "backups")
-        if not os.path.exists(backup_dir):
-            os.makedirs(backup_dir)
 
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        backup_path = os.path.join(backup_dir, f"backup_{timestamp}.accdb")
-        shutil.copy2(db_path, backup_path)
-        return True
-    except Exception as e:
-        messagebox.showerror("Ошибка", f"Не удалось создать резервную копию: {str(e)}")
-        return False
+def athlete_values(athlete):
+    birth_date = athlete.birth_date.strftime("%d.%m.%Y") if athlete.birth_date else ""
+    return (athlete.athlete_id, athlete.name, birth_date, athlete.phone)
 
 
-# --- 2. Подключение к БД ---
-def connect_db():
-    db_path = os.path.join(os.path.dirname(__file__), "sportclub.accdb")
-    if not os.path.exists(db_path):
-        if not create_access_database(db_path):
-            return None
+# Поля форм правки (для сравнения при конфликте) и их названия в сообщении
+GROUP_FIELDS = {"group_name": "название", "description": "описание"}
+ATHLETE_FIELDS = {"name": "ФИО", "birth_date": "дата рождения", "phone": "телефон", "card_code": "номер карты"}
+
+
+def group_form(group):
+    return {"group_name": group.group_name or "", "description": group.description or ""}
+
+
+def athlete_form(athlete):
+    birth_date = athlete.birth_date.strftime("%Y-%m-%d") if athlete.birth_date else ""
+    return {"name": athlete.name or "", "birth_date": birth_date, "phone": athlete.phone or "",
+            "card_code": athlete.card_code or ""}
+
+
+# --- 2. GUI приложение ---
+SEARCH_DELAY_MS = 200  # пауза после нажатия клавиши перед поиском
+BACKUP_INTERVAL_MS = 15 * 60 * 1000  # автоматическая резервная копия во время работы
+CHECKIN_LOG_SIZE = 200  # строк в журнале стойки регистрации
+
+
+def date_entry(master, **options):
+    # tkcalendar (вместе с babel) грузится при первом календаре, а не при запуске
+    from tkcalendar import DateEntry
+    return DateEntry(master, **options)
+
 
-    conn_str = (
-        r'DRIVER={Microsoft Access Driver (*.mdb, *.accdb)};'
-        f'DBQ={db_path};'
-    )
-    try:
-        return pyodbc.connect(conn_str)
-    except Exception as e:
-        messagebox.showerror("Ошибка", f"Не удалось подключиться к БД: {str(e)}")
-        return None
-
-
-# --- 3. Функции работы с данными ---
-def load_groups():
-    conn = connect_db()
-    if not conn:
-        return []
-    try:
-        cursor = conn.cursor()
-        cursor.execute("SELECT group_id, group_name, description FROM Groups ORDER BY group_name")
-        return cursor.fetchall()
-    except Exception as e:
-        messagebox.showerror("Ошибка", f"Ошибка загрузки групп: {str(e)}")
-        return []
-    finally:
-        conn.close()
-
-
-def load_athletes(group_id=None):
-    conn = connect_db()
-    if not conn:
-        return []
-    try:
-        cursor = conn.cursor()
-        if group_id:
-            cursor.execute("""
-                SELECT athlete_id, name, birth_date, phone 
-                FROM Athletes 
-                WHERE current_group_id = ? 
-                ORDER BY name
-            """, (group_id,))
-        else:
-            cursor.execute("SELECT athlete_id, name, birth_date, phone FROM Athletes ORDER BY name")
-        return cursor.fetchall()
-    except Exception as e:
-        messagebox.showerror("Ошибка", f"Ошибка загрузки спортсменов: {str(e)}")
-        return []
-    finally:
-        conn.close()
-
-
-def add_group(name, description):
-    conn = connect_db()
-    if not conn:
-        return False
-    try:
-        cursor = conn.cursor()
-        cursor.execute("INSERT INTO Groups (group_name, description) VALUES (?, ?)", (name, description))
-        conn.commit()
-        return True
-    except Exception as e:
-        messagebox.showerror("Ошибка", f"Ошибка добавления группы: {str(e)}")
-        return False
-    finally:
-        conn.close()
-
-
-def update_group(group_id, name, description):
-    conn = connect_db()
-    if not conn:
-        return False
-    try:
-        cursor = conn.cursor()
-        cursor.execute("""
-            UPDATE Groups 
-            SET group_name = ?, description = ? 
-            WHERE group_id = ?
-        """, (name, description, group_id))
-        conn.commit()
-        return True
-    except Exception as e:
-        messagebox.showerror("Ошибка", f"Ошибка обновления группы: {str(e)}")
-        return False
-    finally:
-        conn.close()
-
-
-def delete_group(group_id):
-    conn = connect_db()
-    if not conn:
-        return False
-    try:
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM Groups WHERE group_id = ?", (group_id,))
-        conn.commit()
-        return True
-    except Exception as e:
-        messagebox.showerror("Ошибка", f"Ошибка удаления группы: {str(e)}")
-        return False
-    finally:
-        conn.close()
-
-
-def add_athlete(name, birth_date, phone, group_id):
-    conn = connect_db()
-    if not conn:
-        return False
-    try:
-        cursor = conn.cursor()
-        cursor.execute("""
-            INSERT INTO Athletes (name, birth_date, phone, current_group_id) 
-            VALUES (?, ?, ?, ?)
-        """, (name, birth_date, phone, group_id))
-        conn.commit()
-        return True
-    except Exception as e:
-        messagebox.showerror("Ошибка", f"Ошибка добавления спортсмена: {str(e)}")
-        return False
-    finally:
-        conn.close()
-
-
-def update_athlete(athlete_id, name, birth_date, phone, group_id):
-    conn = connect_db()
-    if not conn:
-        return False
-    try:
-        cursor = conn.cursor()
-        cursor.execute("""
-            UPDATE Athletes 
-            SET name = ?, birth_date = ?, phone = ?, current_group_id = ? 
-            WHERE athlete_id = ?
-        """, (name, birth_date, phone, group_id, athlete_id))
-        conn.commit()
-        return True
-    except Exception as e:
-        messagebox.showerror("Ошибка", f"Ошибка обновления спортсмена: {str(e)}")
-        return False
-    finally:
-        conn.close()
-
-
-def delete_athlete(athlete_id):
-    conn = connect_db()
-    if not conn:
-        return False
-    try:
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM Athletes WHERE athlete_id = ?", (athlete_id,))
-        conn.commit()
-        return True
-    except Exception as e:
-        messagebox.showerror("Ошибка", f"Ошибка удаления спортсмена: {str(e)}")
-        return False
-    finally:
-        conn.close()
-
-
-def mark_payment(athlete_id, month_year):
-    conn = connect_db()
-    if not conn:
-        return False
-    try:
-        cursor = conn.cursor()
-        cursor.execute("""
-            INSERT INTO Payments (athlete_id, month_year, paid) 
-            VALUES (?, ?, ?)
-        """, (athlete_id, month_year, True))
-        conn.commit()
-        return True
-    except pyodbc.IntegrityError:
-        messagebox.showwarning("Ошибка", "Оплата за этот месяц уже зарегистрирована")
-        return False
-    except Exception as e:
-        messagebox.showerror("Ошибка", f"Ошибка отметки оплаты: {str(e)}")
-        return False
-    finally:
-        conn.close()
-
-
-def get_payments_by_month(month_year, group_id=None):
-    conn = connect_db()
-    if not conn:
-        return []
-    try:
-        cursor = conn.cursor()
-        if group_id:
-            cursor.execute("""
-                SELECT A.athlete_id, A.name, 
-                       CASE WHEN P.paid = True THEN 'Да' ELSE 'Нет' END as paid
-                FROM Athletes A
-                LEFT JOIN Payments P ON A.athlete_id = P.athlete_id AND P.month_year = ?
-                WHERE A.current_group_id = ?
-                ORDER BY A.name
-            """, (month_year, group_id))
-        else:
-            cursor.execute("""
-                SELECT A.athlete_id, A.name, 
-                       CASE WHEN P.paid = True THEN 'Да' ELSE 'Нет' END as paid
-                FROM Athletes A
-                LEFT JOIN Payments P ON A.athlete_id = P.athlete_id AND P.month_year = ?
-                ORDER BY A.name
-            """, (month_year,))
-        return cursor.fetchall()
-    except Exception as e:
-        messagebox.showerror("Ошибка", f"Ошибка загрузки платежей: {str(e)}")
-        return []
-    finally:
-        conn.close()
-
-
-def get_payment_stats(year):
-    conn = connect_db()
-    if not conn:
-        return []
-    try:
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT 
-                SUBSTRING(month_year, 6, 2) as month,
-                COUNT(*) as payment_count
-            FROM Payments
-            WHERE SUBSTRING(month_year, 1, 4) = ? AND paid = True
-            GROUP BY SUBSTRING(month_year, 6, 2)
-            ORDER BY month
-        """, (year,))
-        return cursor.fetchall()
-    except Exception as e:
-        messagebox.showerror("Ошибка", f"Ошибка загрузки статистики: {str(e)}")
-        return []
-    finally:
-        conn.close()
-
-
-def get_all_athletes_for_payment(group_id):
-    conn = connect_db()
-    if not conn:
-        return []
-    try:
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT athlete_id, name 
-            FROM Athletes 
-            WHERE current_group_id = ?
-            ORDER BY name
-        """, (group_id,))
-        return cursor.fetchall()
-    except Exception as e:
-        messagebox.showerror("Ошибка", f"Ошибка загрузки спортсменов: {str(e)}")
-        return []
-    finally:
-        conn.close()
-
-
-# --- 4. GUI приложение ---
 class SportClubApp:
     def __init__(self, root):
         self.root = root
@@ -354,10 +85,23 @@ class SportClubApp:
 
         self.current_group_id = None
         self.current_group_name = ""
-
+        self.groups = []
+        self.combo_athletes = []
+        self.worker = worker.DbWorker(self.root, on_busy=self.show_busy)
+        self.search_index = search_index.SearchIndex()
+        self.index_requested = False
+        self.search_job = None
+        self.tab_loaders = {}
+        self.stale_tabs = set()
+
+        # При запуске читаются только группы; остальное — после их показа
+        # или при первом открытии вкладки (register_tab)
         self.create_widgets()
         self.load_groups()
-        self.update_stats()
+        self.root.bind("<F5>", lambda e: self.reload_all())
+        self.root.bind("<F2>", lambda e: self.focus_checkin())
+        self.root.bind("<F12>", lambda e: self.show_diagnostics())
+        self.root.after(BACKUP_INTERVAL_MS, self.auto_backup)
 
     def create_widgets(self):
         # Главный фрейм
@@ -392,9 +136,18 @@ class SportClubApp:
         # Вкладка статистики
         self.create_stats_tab()
 
-        # Статус бар
-        self.status_bar = tk.Label(self.root, text="Готово", bd=1, relief=tk.SUNKEN, anchor=tk.W)
-        self.status_bar.pack(fill=tk.X)
+        # Вкладка стойки регистрации
+        self.create_checkin_tab()
+
+        self.notebook.bind("<<NotebookTabChanged>>", lambda e: self.load_tab(self.notebook.select()))
+
+        # Статус бар: слева сообщения, справа индикатор фоновых запросов к БД
+        status_frame = tk.Frame(self.root, bd=1, relief=tk.SUNKEN)
+        status_frame.pack(fill=tk.X)
+        self.status_bar = tk.Label(status_frame, text="Готово", anchor=tk.W)
+        self.status_bar.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        self.busy_label = tk.Label(status_frame, text="", anchor=tk.E)
+        self.busy_label.pack(side=tk.RIGHT)
 
     def create_athletes_tab(self):
         tab = tk.Frame(self.notebook)
@@ -407,11 +160,15 @@ class SportClubApp:
         tk.Label(search_frame, text="Поиск:").pack(side=tk.LEFT)
         self.search_entry = tk.Entry(search_frame)
         self.search_entry.pack(side=tk.LEFT, padx=5, fill=tk.X, expand=True)
-        self.search_entry.bind('<KeyRelease>', lambda e: self.search_athletes())
+        self.search_entry.bind('<KeyRelease>', lambda e: self.schedule_search())
+        self.search_all_groups = tk.BooleanVar(value=False)
+        tk.Checkbutton(search_frame, text="Во всех группах", variable=self.search_all_groups,
+                       command=self.search_athletes).pack(side=tk.LEFT)
 
         # Таблица спортсменов
         columns = ("ID", "ФИО", "Дата рождения", "Телефон")
-        self.athletes_tree = ttk.Treeview(tab, columns=columns, show='headings', height=15)
+        self.athletes_tree = virtual_tree.VirtualTreeview(tab, columns, row_values=athlete_values,
+                                                          worker=self.worker, height=15)
 
         for col in columns:
             self.athletes_tree.heading(col, text=col)
@@ -448,7 +205,7 @@ class SportClubApp:
 
         # Таблица оплат
         columns = ("ФИО", "Оплачено")
-        self.payments_tree = ttk.Treeview(tab, columns=columns, show='headings', height=15)
+        self.payments_tree = ttk.Treeview(tab, columns=columns, show='headings', height=15, selectmode="extended")
 
         for col in columns:
             self.payments_tree.heading(col, text=col)
@@ -461,11 +218,15 @@ class SportClubApp:
         btn_frame.pack(fill=tk.X, pady=5)
 
         tk.Button(btn_frame, text="Отметить оплату", command=self.mark_payment).pack(side=tk.LEFT, padx=2)
+        tk.Button(btn_frame, text="Отметить выбранных", command=self.mark_selected_payments).pack(side=tk.LEFT, padx=2)
+        tk.Button(btn_frame, text="Выбрать неоплативших", command=self.select_unpaid).pack(side=tk.LEFT, padx=2)
         tk.Button(btn_frame, text="Обновить", command=self.update_payments).pack(side=tk.LEFT, padx=2)
 
     def create_stats_tab(self):
         tab = tk.Frame(self.notebook)
         self.notebook.add(tab, text="Статистика")
+        self.stats_tab = tab
+        self.register_tab(tab, self.update_stats)
 
         # Выбор года
         year_frame = tk.Frame(tab)
@@ -492,6 +253,57 @@ class SportClubApp:
 
         tk.Button(btn_frame, text="Обновить", command=self.update_stats).pack(side=tk.LEFT, padx=2)
 
+    def create_checkin_tab(self):
+        # Стойка регистрации: сканер карты (или ввод номера/телефона) + Enter
+        # отмечает оплату за текущий месяц без мыши и без выбора группы
+        tab = tk.Frame(self.notebook)
+        self.notebook.add(tab, text="Регистрация")
+        self.checkin_tab = tab
+        self.register_tab(tab, self.load_search_index)
+
+        entry_frame = tk.Frame(tab)
+        entry_frame.pack(fill=tk.X, padx=5, pady=5)
+
+        tk.Label(entry_frame, text="Карта / номер / телефон:").pack(side=tk.LEFT)
+        self.checkin_entry = tk.Entry(entry_frame, font=("Arial", 16))
+        self.checkin_entry.pack(side=tk.LEFT, padx=5, fill=tk.X, expand=True)
+        self.checkin_entry.bind('<Return>', lambda e: self.checkin())
+
+        tk.Label(tab, text="F2 — перейти к вводу. Оплата отмечается за текущий месяц.",
+                 anchor=tk.W).pack(fill=tk.X, padx=5)
+
+        # Журнал отметок, последние сверху
+        columns = ("Время", "ФИО", "Группа", "Результат")
+        self.checkin_tree = ttk.Treeview(tab, columns=columns, show='headings', height=15)
+
+        for col in columns:
+            self.checkin_tree.heading(col, text=col)
+            self.checkin_tree.column(col, width=80 if col == "Время" else 200)
+
+        self.checkin_tree.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+
+    # Вкладки с отложенной загрузкой
+    def register_tab(self, tab, loader):
+        # loader выполняется при первом показе вкладки, а после refresh_tab — при следующем
+        self.tab_loaders[str(tab)] = loader
+        self.stale_tabs.add(str(tab))
+
+    def load_tab(self, tab):
+        tab = str(tab)
+        if tab in self.stale_tabs:
+            self.stale_tabs.discard(tab)
+            self.tab_loaders[tab]()
+
+    def refresh_tab(self, tab):
+        # Данные вкладки устарели: открытая перечитывается сразу, скрытая — когда её откроют
+        self.stale_tabs.add(str(tab))
+        if self.notebook.select() == str(tab):
+            self.load_tab(tab)
+
+    def show_placeholder(self, tree, text="Загрузка..."):
+        tree.delete(*tree.get_children())
+        tree.insert("", tk.END, values=(text,))
+
     def update_month_combo(self):
         months = []
         current = datetime.now()
@@ -508,10 +320,16 @@ class SportClubApp:
         self.year_combo.set(str(current_year))
 
     def load_groups(self):
-        self.groups = load_groups()
+        self.worker.submit(load_groups, key="groups", label="группы", on_done=self.show_groups)
+
+    def show_groups(self, groups):
+        self.groups = groups
         self.group_listbox.delete(0, tk.END)
         for group in self.groups:
             self.group_listbox.insert(tk.END, group.group_name)
+        startup_profile.finish(self.root)
+        # Группы на экране — теперь в фоне можно строить индекс поиска
+        self.root.after_idle(self.load_search_index)
 
     def on_group_select(self, event):
         selection = self.group_listbox.curselection()
@@ -520,71 +338,130 @@ class SportClubApp:
 
         self.current_group_id = self.groups[selection[0]].group_id
         self.current_group_name = self.groups[selection[0]].group_name
-        self.update_athletes()
         self.update_payments()
-        self.update_athlete_combo()
         self.update_status(f"Выбрана группа: {self.current_group_name}")
 
     def update_athletes(self):
-        self.athletes_tree.delete(*self.athletes_tree.get_children())
-        athletes = load_athletes(self.current_group_id)
-        for athlete in athletes:
-            birth_date = athlete.birth_date.strftime("%d.%m.%Y") if athlete.birth_date else ""
-            self.athletes_tree.insert("", tk.END,
-                                      values=(athlete.athlete_id, athlete.name, birth_date, athlete.phone))
-
-    def update_athlete_combo(self):
-        athletes = get_all_athletes_for_payment(self.current_group_id)
+        self.search_athletes()
+
+    def show_athletes(self, athletes, query=""):
+        self.athletes_tree.set_source(virtual_tree.ListSource(a for a in athletes if query in a.name.lower()))
+
+    def show_athlete_combo(self, athletes):
+        self.combo_athletes = athletes
         self.athlete_combo['values'] = [a.name for a in athletes]
         if athletes:
             self.athlete_combo.current(0)
+        else:
+            self.athlete_combo.set("")
+
+    def schedule_search(self):
+        # Поиск запускается, когда пользователь перестал печатать
+        if self.search_job is not None:
+            self.root.after_cancel(self.search_job)
+        self.search_job = self.root.after(SEARCH_DELAY_MS, self.search_athletes)
 
     def search_athletes(self):
+        # Поиск и смена группы идут под одним ключом: устаревший запрос отменяется
+        self.search_job = None
         query = self.search_entry.get().lower()
-        if not query:
-            self.update_athletes()
+        if not query.strip():
+            # Весь список читается страницами по мере прокрутки
+            self.worker.cancel("athletes")
+            self.athletes_tree.set_source(athletes_source(self.current_group_id))
             return
-
-        self.athletes_tree.delete(*self.athletes_tree.get_children())
-        athletes = load_athletes(self.current_group_id)
-        for athlete in athletes:
-            if query in athlete.name.lower():
-                birth_date = athlete.birth_date.strftime("%d.%m.%Y") if athlete.birth_date else ""
-                self.athletes_tree.insert("", tk.END,
-                                          values=(athlete.athlete_id, athlete.name, birth_date, athlete.phone))
+        if self.search_index.ready:
+            # Поиск по индексу в памяти, без обращения к БД
+            self.worker.cancel("athletes")
+            group_id = None if self.search_all_groups.get() else self.current_group_id
+            self.athletes_tree.set_source(virtual_tree.ListSource(self.search_index.search(query, group_id)))
+            return
+        self.worker.submit(load_athletes, self.current_group_id, key="athletes", label="спортсмены",
+                           on_done=lambda athletes: self.show_athletes(athletes, query))
 
     def update_payments(self):
+        # Один запрос на группу: спортсмены, оплаты за месяц и список для выбора
         if not self.current_group_id:
             return
 
-        month = self.month_combo.get()
-        self.payments_tree.delete(*self.payments_tree.get_children())
+        self.worker.submit(get_group_snapshot, self.current_group_id, self.month_combo.get(),
+                           key="group", label="группа", on_done=self.show_group_snapshot)
+
+    def refresh_group(self):
+        # После изменений: снимок группы, а при поиске или без группы — и список спортсменов
+        if not self.current_group_id or self.search_entry.get().strip():
+            self.update_athletes()
+        self.update_payments()
+
+    def show_group_snapshot(self, rows):
+        if not self.search_entry.get().strip():
+            self.worker.cancel("athletes")
+            self.athletes_tree.set_source(virtual_tree.ListSource(rows))
+        self.show_payments(rows)
+        self.show_athlete_combo(rows)
 
-        payments = get_payments_by_month(month, self.current_group_id)
+    def show_payments(self, payments):
+        self.payments_tree.delete(*self.payments_tree.get_children())
         for payment in payments:
-            self.payments_tree.insert("", tk.END,
+            self.payments_tree.insert("", tk.END, iid=payment.athlete_id,
                                       values=(payment.name, payment.paid))
 
     def update_stats(self):
-        year = self.year_combo.get()
-        self.stats_tree.delete(*self.stats_tree.get_children())
+        self.show_placeholder(self.stats_tree)
+        self.worker.submit(get_payment_stats, self.year_combo.get(), key="stats", label="статистика",
+                           on_done=self.show_stats)
 
-        stats = get_payment_stats(year)
+    def show_stats(self, stats):
+        self.stats_tree.delete(*self.stats_tree.get_children())
         month_names = [
             "Январь", "Февраль", "Март", "Апрель", "Май", "Июнь",
             "Июль", "Август", "Сентябрь", "Октябрь", "Ноябрь", "Декабрь"
         ]
 
         for stat in stats:
-            month_num = int(stat.month)
+            month_num = periods.period_month(stat.period)
             if 1 <= month_num <= 12:
                 month_name = month_names[month_num - 1]
                 self.stats_tree.insert("", tk.END,
                                        values=(month_name, stat.payment_count))
 
+    def reload_all(self):
+        # F5: сбросить кэш и перечитать всё из БД (например, после правок с другой машины)
+        DB_CACHE.clear()
+        self.load_groups()
+        self.refresh_group()
+        self.refresh_tab(self.stats_tab)
+        self.load_search_index(reload=True)
+
+    def load_search_index(self, reload=False):
+        if self.index_requested and not reload:
+            return
+        self.index_requested = True
+        self.worker.submit(load_all_athletes, key="index", label="индекс поиска", on_done=self.search_index.load)
+
+    def auto_backup(self):
+        # Снимок снимается без остановки работы (ConnectionPool.snapshot)
+        def done(result):
+            if result:
+                self.update_status(backup_store.describe(result))
+
+        if THIN_CLIENT:
+            return  # резервные копии делает сервер, владеющий БД
+        if DB_BACKEND.exists():
+            self.worker.submit(backup_database, DB_POOL, key="backup", label="резервная копия", on_done=done)
+        self.root.after(BACKUP_INTERVAL_MS, self.auto_backup)
+
     def update_status(self, message):
         self.status_bar.config(text=message)
 
+    def show_busy(self, labels):
+        if labels:
+            self.busy_label.config(text="⏳ Загрузка: " + ", ".join(dict.fromkeys(labels)))
+            self.root.config(cursor="watch")
+        else:
+            self.busy_label.config(text=str(DB_CACHE))
+            self.root.config(cursor="")
+
     # Диалоги и обработчики действий
     def add_group_dialog(self):
         dialog = tk.Toplevel(self.root)
@@ -631,7 +508,15 @@ class SportClubApp:
         tk.Label(dialog, text="Описание:").grid(row=1, column=0, padx=5, pady=5, sticky=tk.E)
         desc_entry = tk.Text(dialog, width=30, height=5)
         desc_entry.grid(row=1, column=1, padx=5, pady=5)
-        desc_entry.insert("1.0", group.description)
+        desc_entry.insert("1.0", group.description or "")
+
+        state = {"group": group}
+
+        def fill(values):
+            name_entry.delete(0, tk.END)
+            name_entry.insert(0, values["group_name"])
+            desc_entry.delete("1.0", tk.END)
+            desc_entry.insert("1.0", values["description"])
 
         def save():
             name = name_entry.get().strip()
@@ -641,7 +526,26 @@ class SportClubApp:
                 messagebox.showwarning("Ошибка", "Введите название группы")
                 return
 
-            if update_group(group.group_id, name, desc):
+            try:
+                saved = update_group(group.group_id, name, desc, state["group"].row_version)
+            except storage.ConflictError as e:
+                self.load_groups()
+                if e.current is None:
+                    messagebox.showwarning("Ошибка", "Группу удалили с другой стойки", parent=dialog)
+                    dialog.destroy()
+                    return
+                answer, merged = self.ask_conflict(dialog, "Группу", group_form(state["group"]),
+                                                   {"group_name": name, "description": desc},
+                                                   group_form(e.current), GROUP_FIELDS)
+                state["group"] = e.current
+                if answer is None:
+                    return
+                fill(merged if answer else group_form(e.current))
+                if answer:
+                    save()
+                return
+
+            if saved:
                 self.load_groups()
                 dialog.destroy()
 
@@ -660,9 +564,10 @@ class SportClubApp:
             return
 
         if delete_group(group.group_id):
+            self.search_index.remove_group(group.group_id)
             self.load_groups()
             self.current_group_id = None
-            self.athletes_tree.delete(*self.athletes_tree.get_children())
+            self.athletes_tree.clear()
             self.payments_tree.delete(*self.payments_tree.get_children())
             self.update_status(f"Группа '{group.group_name}' удалена")
 
@@ -679,28 +584,37 @@ class SportClubApp:
         name_entry.grid(row=0, column=1, padx=5, pady=5)
 
         tk.Label(dialog, text="Дата рождения:").grid(row=1, column=0, padx=5, pady=5, sticky=tk.E)
-        birth_entry = DateEntry(dialog, width=12, date_pattern='dd.MM.yyyy')
+        birth_entry = date_entry(dialog, width=12, date_pattern='dd.MM.yyyy')
         birth_entry.grid(row=1, column=1, padx=5, pady=5, sticky=tk.W)
 
         tk.Label(dialog, text="Телефон:").grid(row=2, column=0, padx=5, pady=5, sticky=tk.E)
         phone_entry = tk.Entry(dialog, width=30)
         phone_entry.grid(row=2, column=1, padx=5, pady=5)
 
+        tk.Label(dialog, text="Номер карты:").grid(row=3, column=0, padx=5, pady=5, sticky=tk.E)
+        card_entry = tk.Entry(dialog, width=30)
+        card_entry.grid(row=3, column=1, padx=5, pady=5)
+
         def save():
             name = name_entry.get().strip()
             birth = birth_entry.get_date().strftime("%Y-%m-%d")
             phone = phone_entry.get().strip()
+            card = card_entry.get().strip() or None
 
             if not name:
                 messagebox.showwarning("Ошибка", "Введите ФИО спортсмена")
                 return
+            if not self.check_card_code(card):
+                return
 
-            if add_athlete(name, birth, phone, self.current_group_id):
-                self.update_athletes()
-                self.update_athlete_combo()
+            athlete_id = add_athlete(name, birth, phone, self.current_group_id, card)
+            if athlete_id:
+                self.search_index.add(search_index.Athlete(athlete_id, name, birth_entry.get_date(), phone,
+                                                           self.current_group_id, card))
+                self.refresh_group()
                 dialog.destroy()
 
-        tk.Button(dialog, text="Сохранить", command=save).grid(row=3, column=1, pady=10)
+        tk.Button(dialog, text="Сохранить", command=save).grid(row=4, column=1, pady=10)
 
     def edit_athlete_dialog(self):
         selection = self.athletes_tree.selection()
@@ -708,10 +622,14 @@ class SportClubApp:
             messagebox.showwarning("Ошибка", "Выберите спортсмена для редактирования")
             return
 
+        # Форма заполняется из БД, а не из списка: список мог устареть
         athlete_id = self.athletes_tree.item(selection)['values'][0]
-        name = self.athletes_tree.item(selection)['values'][1]
-        birth = self.athletes_tree.item(selection)['values'][2]
-        phone = self.athletes_tree.item(selection)['values'][3]
+        self.worker.submit(get_athlete, athlete_id, label="спортсмен", on_done=self.show_edit_athlete_dialog)
+
+    def show_edit_athlete_dialog(self, athlete):
+        if athlete is None:
+            self.athlete_gone()
+            return
 
         dialog = tk.Toplevel(self.root)
         dialog.title("Изменить спортсмена")
@@ -719,37 +637,70 @@ class SportClubApp:
         tk.Label(dialog, text="ФИО:").grid(row=0, column=0, padx=5, pady=5, sticky=tk.E)
         name_entry = tk.Entry(dialog, width=30)
         name_entry.grid(row=0, column=1, padx=5, pady=5)
-        name_entry.insert(0, name)
 
         tk.Label(dialog, text="Дата рождения:").grid(row=1, column=0, padx=5, pady=5, sticky=tk.E)
-        birth_entry = DateEntry(dialog, width=12, date_pattern='dd.MM.yyyy')
+        birth_entry = date_entry(dialog, width=12, date_pattern='dd.MM.yyyy')
         birth_entry.grid(row=1, column=1, padx=5, pady=5, sticky=tk.W)
-        if birth:
-            try:
-                birth_entry.set_date(datetime.strptime(birth, "%d.%m.%Y"))
-            except:
-                pass
 
         tk.Label(dialog, text="Телефон:").grid(row=2, column=0, padx=5, pady=5, sticky=tk.E)
         phone_entry = tk.Entry(dialog, width=30)
         phone_entry.grid(row=2, column=1, padx=5, pady=5)
-        phone_entry.insert(0, phone)
+
+        tk.Label(dialog, text="Номер карты:").grid(row=3, column=0, padx=5, pady=5, sticky=tk.E)
+        card_entry = tk.Entry(dialog, width=30)
+        card_entry.grid(row=3, column=1, padx=5, pady=5)
+
+        state = {"athlete": athlete}
+
+        def fill(values):
+            name_entry.delete(0, tk.END)
+            name_entry.insert(0, values["name"])
+            if values["birth_date"]:
+                birth_entry.set_date(datetime.strptime(values["birth_date"], "%Y-%m-%d"))
+            phone_entry.delete(0, tk.END)
+            phone_entry.insert(0, values["phone"])
+            card_entry.delete(0, tk.END)
+            card_entry.insert(0, values["card_code"])
 
         def save():
-            new_name = name_entry.get().strip()
-            new_birth = birth_entry.get_date().strftime("%Y-%m-%d")
-            new_phone = phone_entry.get().strip()
+            original = state["athlete"]
+            mine = {"name": name_entry.get().strip(), "birth_date": birth_entry.get_date().strftime("%Y-%m-%d"),
+                    "phone": phone_entry.get().strip(), "card_code": card_entry.get().strip()}
+            new_card = search_index.normalize_card(mine["card_code"]) or None
 
-            if not new_name:
+            if not mine["name"]:
                 messagebox.showwarning("Ошибка", "Введите ФИО спортсмена")
                 return
+            if new_card != original.card_code and not self.check_card_code(new_card, original.athlete_id):
+                return
+
+            try:
+                saved = update_athlete(original.athlete_id, mine["name"], mine["birth_date"], mine["phone"],
+                                       original.current_group_id, new_card, original.row_version)
+            except storage.ConflictError as e:
+                if e.current is None:
+                    dialog.destroy()
+                    self.athlete_gone(original.athlete_id)
+                    return
+                answer, merged = self.ask_conflict(dialog, "Спортсмена", athlete_form(original), mine,
+                                                   athlete_form(e.current), ATHLETE_FIELDS)
+                state["athlete"] = e.current
+                if answer is None:
+                    return
+                fill(merged if answer else athlete_form(e.current))
+                if answer:
+                    save()
+                return
 
-            if update_athlete(athlete_id, new_name, new_birth, new_phone, self.current_group_id):
-                self.update_athletes()
-                self.update_athlete_combo()
+            if saved:
+                self.search_index.add(search_index.Athlete(
+                    original.athlete_id, mine["name"], birth_entry.get_date(), mine["phone"],
+                    original.current_group_id, new_card))
+                self.refresh_group()
                 dialog.destroy()
 
-        tk.Button(dialog, text="Сохранить", command=save).grid(row=3, column=1, pady=10)
+        fill(athlete_form(athlete))
+        tk.Button(dialog, text="Сохранить", command=save).grid(row=4, column=1, pady=10)
 
     def move_athlete_dialog(self):
         selection = self.athletes_tree.selection()
@@ -758,51 +709,86 @@ class SportClubApp:
             return
 
         athlete_id = self.athletes_tree.item(selection)['values'][0]
-        athlete_name = self.athletes_tree.item(selection)['values'][1]
+        self.worker.submit(get_athlete, athlete_id, label="спортсмен", on_done=self.show_move_athlete_dialog)
+
+    def show_move_athlete_dialog(self, athlete):
+        if athlete is None:
+            self.athlete_gone()
+            return
 
         dialog = tk.Toplevel(self.root)
         dialog.title("Перевести спортсмена")
 
-        tk.Label(dialog, text=f"Перевести {athlete_name} в:").pack(padx=10, pady=5)
+        tk.Label(dialog, text=f"Перевести {athlete.name} в:").pack(padx=10, pady=5)
 
         groups_listbox = tk.Listbox(dialog)
         groups_listbox.pack(padx=10, pady=5, fill=tk.BOTH, expand=True)
 
-        # Заполняем список всех групп, кроме текущей
-        for group in self.groups:
-            if group.group_id != self.current_group_id:
-                groups_listbox.insert(tk.END, group.group_name)
+        # Заполняем список всех групп, кроме той, где спортсмен сейчас
+        targets = [group for group in self.groups if group.group_id != athlete.current_group_id]
+        for group in targets:
+            groups_listbox.insert(tk.END, group.group_name)
+
+        state = {"athlete": athlete}
 
         def move():
             selection = groups_listbox.curselection()
             if not selection:
                 messagebox.showwarning("Ошибка", "Выберите группу для перевода")
                 return
+            selected_group = targets[selection[0]]
+            original = state["athlete"]
 
-            # Находим ID выбранной группы
-            selected_group = None
-            idx = 0
-            for group in self.groups:
-                if group.group_id != self.current_group_id:
-                    if idx == selection[0]:
-                        selected_group = group
-                        break
-                    idx += 1
-
-            if not selected_group:
+            try:
+                moved = move_athlete(original.athlete_id, selected_group.group_id, original.row_version)
+            except storage.ConflictError as e:
+                if e.current is None:
+                    dialog.destroy()
+                    self.athlete_gone(original.athlete_id)
+                    return
+                if e.current.current_group_id != original.current_group_id:
+                    messagebox.showwarning("Ошибка", f"Спортсмена {e.current.name} уже перевели с другой стойки "
+                                                     f"в группу {self.group_name(e.current.current_group_id)}",
+                                           parent=dialog)
+                    dialog.destroy()
+                    self.search_index.add(search_index.Athlete(*e.current[:6]))
+                    self.refresh_group()
+                    return
+                # С другой стойки поменяли не группу, а другие поля — переводим поверх
+                state["athlete"] = e.current
+                move()
                 return
 
-            if update_athlete(athlete_id, athlete_name,
-                              self.athletes_tree.item(selection)['values'][2],  # birth_date
-                              self.athletes_tree.item(selection)['values'][3],  # phone
-                              selected_group.group_id):
-                self.update_athletes()
-                self.update_athlete_combo()
-                self.update_status(f"Спортсмен {athlete_name} переведен в группу {selected_group.group_name}")
+            if moved:
+                self.search_index.update(original.athlete_id, current_group_id=selected_group.group_id)
+                self.refresh_group()
+                self.update_status(f"Спортсмен {original.name} переведен в группу {selected_group.group_name}")
                 dialog.destroy()
 
         tk.Button(dialog, text="Перевести", command=move).pack(pady=10)
 
+    def athlete_gone(self, athlete_id=None):
+        messagebox.showwarning("Ошибка", "Спортсмена удалили с другой стойки")
+        if athlete_id is not None:
+            self.search_index.remove(athlete_id)
+        self.refresh_group()
+
+    def ask_conflict(self, parent, what, original, mine, current, labels):
+        # Запись изменили с другой стойки, пока была открыта форма.
+        # -> (True — сохранить правки поверх новых данных, False — показать новые данные,
+        #     None — вернуться к форме; значения после слияния)
+        merged, conflicts = club_data.merge_changes(original, mine, current)
+        changed = [labels[field] for field in labels if current[field] != original[field]]
+        lines = [f"{what} изменили с другой стойки, пока была открыта форма.",
+                 f"Там изменено: {', '.join(changed) or 'ничего из полей формы'}."]
+        if conflicts:
+            lines.append(f"Вы тоже изменили: {', '.join(labels[field] for field in conflicts)} — "
+                         f"при сохранении останутся ваши значения.")
+        lines += ["", "Да — сохранить ваши правки поверх новых данных",
+                  "Нет — показать в форме новые данные", "Отмена — вернуться к форме"]
+        answer = messagebox.askyesnocancel("Конфликт правок", "\n".join(lines), parent=parent)
+        return answer, merged
+
     def delete_athlete(self):
         selection = self.athletes_tree.selection()
         if not selection:
@@ -816,9 +802,8 @@ class SportClubApp:
             return
 
         if delete_athlete(athlete_id):
-            self.update_athletes()
-            self.update_athlete_combo()
-            self.update_payments()
+            self.search_index.remove(athlete_id)
+            self.refresh_group()
             self.update_status(f"Спортсмен '{name}' удален")
 
     def mark_payment(self):
@@ -827,44 +812,181 @@ class SportClubApp:
             return
 
         month = self.month_combo.get()
-        athlete_name = self.athlete_combo.get()
+        index = self.athlete_combo.current()
 
-        if not athlete_name:
+        if index < 0:
             messagebox.showwarning("Ошибка", "Выберите спортсмена")
             return
 
-        # Находим ID спортсмена
-        conn = connect_db()
-        if not conn:
+        # id из снимка группы: без запроса по ФИО и без путаницы однофамильцев
+        athlete = self.combo_athletes[index]
+        if mark_payment(athlete.athlete_id, month):
+            self.update_payments()
+            self.refresh_tab(self.stats_tab)
+            self.update_status(f"Оплата для '{athlete.name}' за {month} отмечена")
+
+    def select_unpaid(self):
+        unpaid = [item for item in self.payments_tree.get_children()
+                  if self.payments_tree.item(item)['values'][1] != "Да"]
+        self.payments_tree.selection_set(unpaid)
+
+    def mark_selected_payments(self):
+        if not self.current_group_id:
+            messagebox.showwarning("Ошибка", "Выберите группу")
+            return
+
+        selection = self.payments_tree.selection()
+        if not selection:
+            messagebox.showwarning("Ошибка", "Выберите спортсменов в списке оплат")
             return
 
-        try:
-            cursor = conn.cursor()
-            cursor.execute("""
-                SELECT athlete_id 
-                FROM Athletes 
-                WHERE name = ? AND current_group_id = ?
-            """, (athlete_name, self.current_group_id))
-            result = cursor.fetchone()
-            if not result:
-                messagebox.showerror("Ошибка", "Спортсмен не найден")
+        month = self.month_combo.get()
+
+        def done(result):
+            marked, duplicates = result
+            if not marked and not duplicates:
                 return
+            self.update_payments()
+            self.refresh_tab(self.stats_tab)
+            message = f"Оплата за {month} отмечена: {len(marked)}"
+            if duplicates:
+                message += f", уже были оплачены: {len(duplicates)}"
+            self.update_status(message)
+
+        self.worker.submit(mark_payments_bulk, [int(item) for item in selection], month,
+                           label="отметка оплат", on_done=done)
+
+
+    # Стойка регистрации
+    def focus_checkin(self):
+        self.notebook.select(self.checkin_tab)
+        self.checkin_entry.focus_set()
+
+    def check_card_code(self, card, athlete_id=None):
+        # Одна карта — один спортсмен
+        owner = self.search_index.card_owner(card)
+        if owner is not None and owner.athlete_id != athlete_id:
+            messagebox.showwarning("Ошибка", f"Карта {card} уже выдана: {owner.name}")
+            return False
+        return True
+
+    def checkin(self):
+        text = self.checkin_entry.get().strip()
+        self.checkin_entry.delete(0, tk.END)
+        if not text:
+            return
+        if not self.search_index.ready:
+            self.log_checkin(text, "", "Список спортсменов ещё загружается")
+            return
 
-            athlete_id = result[0]
+        found = self.search_index.lookup(text)
+        if not found:
+            self.log_checkin(text, "", "Не найден")
+            return
+        if len(found) > 1:
+            # Совпадение по части телефона: показываем кандидатов, вводится их номер
+            for athlete in reversed(found[:10]):
+                self.log_checkin(athlete.name, self.group_name(athlete.current_group_id),
+                                 f"Уточните: номер {athlete.athlete_id}")
+            return
 
-            if mark_payment(athlete_id, month):
+        athlete = found[0]
+        month = datetime.now().strftime("%Y-%m")
+        self.worker.submit(mark_payments_bulk, [athlete.athlete_id], month, label="регистрация",
+                           on_done=lambda result: self.show_checkin(athlete, month, result))
+
+    def show_checkin(self, athlete, month, result):
+        marked, duplicates = result
+        group_name = self.group_name(athlete.current_group_id)
+        if marked:
+            self.log_checkin(athlete.name, group_name, f"Оплачено за {month}")
+            self.refresh_tab(self.stats_tab)
+            if athlete.current_group_id == self.current_group_id:
                 self.update_payments()
-                self.update_stats()
-                self.update_status(f"Оплата для '{athlete_name}' за {month} отмечена")
-        except Exception as e:
-            messagebox.showerror("Ошибка", str(e))
-        finally:
-            conn.close()
+        elif duplicates:
+            self.log_checkin(athlete.name, group_name, f"Уже оплачено за {month}")
+        else:
+            self.log_checkin(athlete.name, group_name, "Ошибка записи")
+
+    def log_checkin(self, name, group_name, result):
+        self.checkin_tree.insert("", 0, values=(datetime.now().strftime("%H:%M:%S"), name, group_name, result))
+        extra = self.checkin_tree.get_children()[CHECKIN_LOG_SIZE:]
+        if extra:
+            self.checkin_tree.delete(*extra)
+
+    def group_name(self, group_id):
+        for group in self.groups:
+            if group.group_id == group_id:
+                return group.group_name
+        return ""
+
+    def show_diagnostics(self):
+        # F12: самые затратные запросы к БД с запуска программы (у тонкого
+        # клиента — запросы сервера); медленные пишутся и в журнал
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Запросы к БД")
+        dialog.geometry("1000x450")
+        state = {"snapshot": None}
+
+        summary = tk.Label(dialog, anchor=tk.W, justify=tk.LEFT)
+        summary.pack(fill=tk.X, padx=5, pady=5)
+
+        columns = ("Запрос", "Вызовов", "Всего, мс", "Среднее", "p95", "Макс", "Строк", "Ошибок")
+        tree = ttk.Treeview(dialog, columns=columns, show='headings', height=15)
+        for col in columns:
+            tree.heading(col, text=col)
+            tree.column(col, width=70, anchor=tk.E)
+        tree.column("Запрос", width=480, anchor=tk.W)
+        tree.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+
+        def show(snapshot):
+            if not dialog.winfo_exists():
+                return
+            state["snapshot"] = snapshot
+            connects = snapshot["connects"]
+            text = (f"С {snapshot['since'].replace('T', ' ')}: подключений {connects['count']}, "
+                    f"в среднем {connects['mean_ms']:.1f} мс, максимум {connects['max_ms']:.1f} мс")
+            if snapshot["slow_log"]:
+                text += f"\nМедленные запросы (от {snapshot['slow_ms']:.0f} мс): {snapshot['slow_log']}"
+            summary.config(text=text)
+            tree.delete(*tree.get_children())
+            for q in snapshot["queries"]:
+                tree.insert("", tk.END, values=(q["query"], q["count"], f"{q['total_ms']:.1f}", f"{q['mean_ms']:.2f}",
+                                                f"{q['p95_ms']:.1f}", f"{q['max_ms']:.1f}", q["rows"], q["errors"]))
+
+        def refresh():
+            self.worker.submit(get_diagnostics, key="diagnostics", label="запросы к БД", on_done=show)
+
+        def reset():
+            self.worker.submit(reset_diagnostics, key="diagnostics", label="запросы к БД",
+                               on_done=lambda result: refresh())
+
+        def save():
+            if state["snapshot"] is None:
+                return
+            path = filedialog.asksaveasfilename(parent=dialog, defaultextension=".json",
+                                                filetypes=[("JSON", "*.json")], initialfile="queries.json")
+            if not path:
+                return
+            try:
+                query_trace.save(state["snapshot"], path)
+            except OSError as e:
+                messagebox.showerror("Ошибка", f"Не удалось сохранить отчёт: {str(e)}", parent=dialog)
+
+        btn_frame = tk.Frame(dialog)
+        btn_frame.pack(fill=tk.X, pady=5)
+        tk.Button(btn_frame, text="Обновить", command=refresh).pack(side=tk.LEFT, padx=2)
+        tk.Button(btn_frame, text="Сбросить", command=reset).pack(side=tk.LEFT, padx=2)
+        tk.Button(btn_frame, text="Сохранить отчёт...", command=save).pack(side=tk.LEFT, padx=2)
+        refresh()
 
 
 # --- Запуск приложения ---
 if __name__ == "__main__":
+    startup_profile.handle_flag(__file__)
+    startup_profile.mark("модули загружены")
     root = tk.Tk()
     app = SportClubApp(root)
+    startup_profile.mark("окно построено")
     root.mainloop()
 
@@ -1,107 +1,51 @@
+import startup_profile  # первым: от него отсчитывается время запуска
 import os
-import pyodbc
-import win32com.client as win32
-from win32com.client import constants
+import sys
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
-import pandas as pd
 from datetime import datetime, timedelta
-import pythoncom
-from tkcalendar import DateEntry
 
+import exporter
+import migrations
+import payment_stats
+import payment_history
+import periods
+import storage
+import virtual_tree
 
-# --- 1. Создание .accdb ---
-def create_access_database(db_path):
-    if os.path.exists(db_path):
-        try:
-            os.remove(db_path)
-        except PermissionError:
-            messagebox.showerror("Ошибка", f"Файл {db_path} используется другим процессом.")
-            return False
 
-    try:
-        pythoncom.CoInitialize()
-        access_app = win32.Dispatch("Access.Application")
+# --- 1. Подключение к БД ---
+DB_BACKEND = storage.get_backend(os.path.dirname(os.path.abspath(__file__)), "database")
+DB_POOL = storage.get_pool(DB_BACKEND)
+_db_ready = False
 
-        try:
-            access_app.CloseCurrentDatabase()
-        except:
-            pass
-
-        access_app.NewCurrentDatabase(db_path)
-        db = access_app.CurrentDb()
-
-        # Таблица групп
-        sql_groups = """
-        CREATE TABLE Groups (
-            group_id AUTOINCREMENT PRIMARY KEY,
-            group_name TEXT,
-            description MEMO
-        );
-        """
-        db.Execute(sql_groups)
-
-        # Таблица спортсменов
-        sql_athletes = """
-        CREATE TABLE Athletes (
-            athlete_id AUTOINCREMENT PRIMARY KEY,
-            name TEXT,
-            birth_date DATETIME,
-            phone TEXT,
-            current_group_id LONG
-        );
-        """
-        db.Execute(sql_athletes)
-
-        # Таблица оплаты
-        sql_payments = """
-        CREATE TABLE Payments (
-            payment_id AUTOINCREMENT PRIMARY KEY,
-            athlete_id LONG,
-            month_year TEXT,
-            paid YESNO
-        );
-        """
-        db.Execute(sql_payments)
-
-        access_app.Quit()
-        del access_app
-        pythoncom.CoUninitialize()
-
-        print(f"База данных создана: {db_path}")
-        return True
 
-    except Exception as e:
-        print(f"Ошибка при создании БД: {e}")
-        try:
-            access_app.Quit()
-        except:
-            pass
-        pythoncom.CoUninitialize()
-        return False
-
-
-# --- 2. Подключение к БД ---
 def connect_db():
-    db_path = os.path.join(os.path.dirname(__file__), "database.accdb")
-    if not os.path.exists(db_path):
-        success = create_access_database(db_path)
-        if not success:
-            messagebox.showerror("Ошибка", "Не удалось создать базу данных.")
+    # Соединение берётся из пула; conn.close() возвращает его обратно
+    global _db_ready
+    if not _db_ready:
+        if not DB_BACKEND.exists():
+            try:
+                DB_BACKEND.create_database()
+            except Exception as e:
+                messagebox.showerror("Ошибка", f"Не удалось создать базу данных: {str(e)}")
+                return None
+        try:
+            report = migrations.upgrade(DB_POOL, measure=False)
+            if report:
+                print(report, file=sys.stderr)  # в консоль: отчёт об обновлении схемы
+        except Exception as e:
+            messagebox.showerror("Ошибка", f"Не удалось обновить схему БД: {str(e)}")
             return None
-
-    conn_str = (
-        r'DRIVER={Microsoft Access Driver (*.mdb, *.accdb)};'
-        f'DBQ={db_path};'
-    )
+        _db_ready = True
     try:
-        return pyodbc.connect(conn_str)
+        return DB_POOL.acquire()
     except Exception as e:
         messagebox.showerror("Ошибка подключения", str(e))
         return None
 
 
-# --- 3. Функции работы с БД ---
+# --- 2. Функции работы с БД ---
 def load_groups():
     conn = connect_db()
     cursor = conn.cursor()
@@ -124,13 +68,17 @@ def load_athletes(group_id=None):
 def add_group(name, desc):
     conn = connect_db()
     cursor = conn.cursor()
-    cursor.execute("INSERT INTO Groups (group_name, description) VALUES (?, ?)", (name, desc))
+    cursor.execute("INSERT INTO Groups (group_name, description, row_version) VALUES (?, ?, 0)", (name, desc))
     conn.commit()
     conn.close()
 
 def delete_group(gid):
     conn = connect_db()
     cursor = conn.cursor()
+    cursor.execute("DELETE FROM Payments WHERE athlete_id IN "
+                   "(SELECT athlete_id FROM Athletes WHERE current_group_id = ?)", (gid,))
+    cursor.execute("DELETE FROM Athletes WHERE current_group_id = ?", (gid,))
+    payment_stats.remove_group(cursor, gid)
     cursor.execute("DELETE FROM Groups WHERE group_id = ?", (gid,))
     conn.commit()
     conn.close()
@@ -138,7 +86,7 @@ def delete_group(gid):
 def add_athlete(name, birth, phone, gid):
     conn = connect_db()
     cursor = conn.cursor()
-    cursor.execute("INSERT INTO Athletes (name, birth_date, phone, current_group_id) VALUES (?, ?, ?, ?)",
+    cursor.execute("INSERT INTO Athletes (name, birth_date, phone, current_group_id, row_version) VALUES (?, ?, ?, ?, 0)",
                    (name, birth, phone, gid))
     conn.commit()
     conn.close()
@@ -146,13 +94,18 @@ def add_athlete(name, birth, phone, gid):
 def move_athlete(aid, new_gid):
     conn = connect_db()
     cursor = conn.cursor()
-    cursor.execute("UPDATE Athletes SET current_group_id = ? WHERE athlete_id = ?", (new_gid, aid))
+    old_gid = payment_stats.athlete_group(cursor, aid)
+    cursor.execute("UPDATE Athletes SET current_group_id = ?, row_version = row_version + 1 WHERE athlete_id = ?",
+                   (new_gid, aid))
+    payment_stats.move_athlete(cursor, aid, old_gid, new_gid)
     conn.commit()
     conn.close()
 
 def delete_athlete(aid):
     conn = connect_db()
     cursor = conn.cursor()
+    payment_stats.remove_athlete(cursor, aid, payment_stats.athlete_group(cursor, aid))
+    cursor.execute("DELETE FROM Payments WHERE athlete_id = ?", (aid,))
     cursor.execute("DELETE FROM Athletes WHERE athlete_id = ?", (aid,))
     conn.commit()
     conn.close()
@@ -160,35 +113,35 @@ def delete_athlete(aid):
 def mark_payment(aid, month):
     conn = connect_db()
     cursor = conn.cursor()
-    cursor.execute("SELECT * FROM Payments WHERE athlete_id = ? AND month_year = ?", (aid, month))
+    period = periods.month_key(month)
+    cursor.execute("SELECT payment_id FROM Payments WHERE athlete_id = ? AND period = ?", (aid, period))
     if cursor.fetchone():
         conn.close()
         return False  # Оплата уже есть
-    cursor.execute("INSERT INTO Payments (athlete_id, month_year, paid) VALUES (?, ?, ?)", (aid, month, True))
+    cursor.execute("INSERT INTO Payments (athlete_id, month_year, period, paid) VALUES (?, ?, ?, ?)",
+                   (aid, month, period, True))
+    payment_stats.add_payments(cursor, period, payment_stats.athlete_group(cursor, aid))
     conn.commit()
     conn.close()
     return True
 
 def get_all_payments_by_months(group_id=None):
     conn = connect_db()
-    cursor = conn.cursor()
-    query = """
-        SELECT P.month_year, A.name, G.group_name, P.paid 
-        FROM ((Payments AS P 
-        INNER JOIN Athletes AS A ON P.athlete_id = A.athlete_id)
-        INNER JOIN Groups AS G ON A.current_group_id = G.group_id)
-    """
-    params = []
-    if group_id:
-        query += " WHERE A.current_group_id = ?"
-        params.append(group_id)
+    try:
+        return payment_history.all_payments(conn, group_id)
+    finally:
+        conn.close()
 
-    query += " ORDER BY P.month_year DESC"
+def get_all_payments_page(group_id=None, after=None, page_size=payment_history.PAGE_SIZE):
+    # Страница истории после курсора (period, athlete_id) -> (строки, курсор следующей)
+    conn = connect_db()
+    try:
+        return payment_history.get_page(conn, group_id, after, page_size)
+    finally:
+        conn.close()
 
-    cursor.execute(query, params)
-    res = cursor.fetchall()
-    conn.close()
-    return res
+def payment_values(p):
+    return (p.month_year, p.name, p.group_name, "Да" if p.paid else "Нет")
 
 def get_payments_by_month(month, group_id):
     conn = connect_db()
@@ -196,39 +149,32 @@ def get_payments_by_month(month, group_id):
     cursor.execute("""
         SELECT A.name, P.paid 
         FROM (Payments AS P INNER JOIN Athletes AS A ON P.athlete_id = A.athlete_id)
-        WHERE P.month_year = ? AND A.current_group_id = ?
-    """, (month, group_id))
+        WHERE P.period = ? AND A.current_group_id = ?
+    """, (periods.month_key(month), group_id))
     res = cursor.fetchall()
     conn.close()
     return res
 
 def get_unpaid_athletes(month, group_id):
     conn = connect_db()
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT A.name FROM Athletes A
-        WHERE NOT EXISTS (
-            SELECT 1 FROM Payments P
-            WHERE P.athlete_id = A.athlete_id AND P.month_year = ?
-        ) AND A.current_group_id = ?
-    """, (month, group_id))
-    res = cursor.fetchall()
-    conn.close()
-    return [r.name for r in res]
+    try:
+        return payment_history.unpaid_names(conn, month, group_id)
+    finally:
+        conn.close()
 
 def export_to_excel(data, columns, filename):
-    df = pd.DataFrame(data, columns=columns)
-    df.to_excel(filename, index=False)
+    exporter.export_rows(filename, columns, data)
     messagebox.showinfo("Экспорт", f"Сохранено в {filename}")
 
 
-# --- 4. Интерфейс Tkinter ---
+# --- 3. Интерфейс Tkinter ---
 class SportClubApp:
     def __init__(self, root):
         self.root = root
         self.root.title("СпортКлуб — Управление")
 
         self.current_group_id = None
+        self.selector_athletes = []
 
         self.group_listbox = tk.Listbox(root)
         self.group_listbox.pack(side="left", fill="y", padx=5, pady=5)
@@ -318,33 +264,30 @@ class SportClubApp:
 
         tk.Button(filter_frame, text="Обновить", command=self.load_all_payments).grid(row=0, column=2)
 
-        self.tree_all_payments = ttk.Treeview(tab_all_payments,
-                                             columns=("Месяц", "Имя", "Группа", "Оплачено"),
-                                             show='headings')
+        self.tree_all_payments = virtual_tree.VirtualTreeview(tab_all_payments,
+                                                              ("Месяц", "Имя", "Группа", "Оплачено"),
+                                                              row_values=payment_values)
         for col in ("Месяц", "Имя", "Группа", "Оплачено"):
             self.tree_all_payments.heading(col, text=col)
         self.tree_all_payments.pack(fill="both", expand=True, padx=5, pady=5)
 
-        # Загрузка групп в выпадающий список фильтрации оплат
-        self.load_groups_for_filter()
-
-        # Привязка переключения вкладок
+        # Привязка переключения вкладок; список групп для фильтра оплат
+        # загружается при открытии вкладки "Все оплаты", а не при запуске
         self.notebook.bind("<<NotebookTabChanged>>", self.on_tab_change)
 
     def on_tab_change(self, event):
         current_tab = self.notebook.tab(self.notebook.select(), "text")
         if current_tab == "Оплата" and self.current_group_id:
-            athletes = load_athletes(self.current_group_id)
-            names = [a.name for a in athletes]
-            self.athlete_selector['values'] = names
-            if names:
-                self.athlete_selector.current(0)
+            self.show_athlete_names(load_athletes(self.current_group_id))
+        elif current_tab == "Все оплаты":
+            self.load_groups_for_filter()
 
     def load_groups(self):
         self.group_listbox.delete(0, tk.END)
         self.groups_data = load_groups()
         for g in self.groups_data:
             self.group_listbox.insert(tk.END, g.group_name)
+        startup_profile.finish(self.root)
 
     def on_group_select(self, event):
         selected = self.group_listbox.curselection()
@@ -356,11 +299,16 @@ class SportClubApp:
         self.load_athletes_in_group(group.group_id)
 
         # Обновляем список спортсменов для оплаты
-        athletes = load_athletes(self.current_group_id)
+        self.show_athlete_names(load_athletes(self.current_group_id))
+
+    def show_athlete_names(self, athletes):
+        self.selector_athletes = athletes
         names = [a.name for a in athletes]
         self.athlete_selector['values'] = names
         if names:
             self.athlete_selector.current(0)
+        else:
+            self.athlete_selector.set("")
 
     def load_athletes_in_group(self, group_id):
         self.tree_athletes.delete(*self.tree_athletes.get_children())
@@ -429,27 +377,16 @@ class SportClubApp:
         self.load_athletes_in_group(self.current_group_id)
 
     def mark_selected_payment(self):
-        selected_name = self.athlete_selector.get()
-        if not selected_name:
+        # id берётся из загруженного списка: однофамильцы не путаются
+        index = self.athlete_selector.current()
+        if index < 0:
             messagebox.showwarning("Ошибка", "Выберите спортсмена!")
             return
-        conn = connect_db()
-        cursor = conn.cursor()
-        cursor.execute("SELECT athlete_id FROM Athletes WHERE name = ?", (selected_name,))
-        row = cursor.fetchone()
-        if not row:
-            messagebox.showerror("Ошибка", "Спортсмен не найден!")
-            return
-        athlete_id = row.athlete_id
+        athlete_id = self.selector_athletes[index].athlete_id
         month = self.month_selector.get()
-        cursor.execute("SELECT * FROM Payments WHERE athlete_id = ? AND month_year = ?", (athlete_id, month))
-        if cursor.fetchone():
+        if not mark_payment(athlete_id, month):
             messagebox.showinfo("Информация", "Оплата уже отмечена.")
-            conn.close()
             return
-        cursor.execute("INSERT INTO Payments (athlete_id, month_year, paid) VALUES (?, ?, ?)", (athlete_id, month, True))
-        conn.commit()
-        conn.close()
         self.show_payments()
 
     def show_payments(self):
@@ -471,7 +408,7 @@ class SportClubApp:
     def export_payments(self):
         month = self.month_selector.get()
         payments = get_payments_by_month(month, self.current_group_id)
-        filename = filedialog.asksaveasfilename(defaultextension=".xlsx", filetypes=[("Excel", "*.xlsx")])
+        filename = filedialog.asksaveasfilename(defaultextension=".xlsx", filetypes=[("Excel", "*.xlsx"), ("CSV", "*.csv")])
         if filename:
             export_to_excel([(p.name, "Да" if p.paid else "Нет") for p in payments],
                             ["Имя", "Оплачено"], filename)
@@ -482,11 +419,8 @@ class SportClubApp:
         if group_name != 'Все':
             group_id = next((g.group_id for g in self.groups_data if g.group_name == group_name), None)
 
-        payments = get_all_payments_by_months(group_id)
-        self.tree_all_payments.delete(*self.tree_all_payments.get_children())
-        for p in payments:
-            paid_str = "Да" if p.paid else "Нет"
-            self.tree_all_payments.insert("", tk.END, values=(p.month_year, p.name, p.group_name, paid_str))
+        # В таблице живут только видимые строки, остальные читаются при прокрутке
+        self.tree_all_payments.set_source(payment_history.HistorySource(DB_POOL, group_id))
 
     def load_groups_for_filter(self):
         groups = load_groups()
@@ -510,6 +444,12 @@ class SportClubApp:
 
 # --- Вспомогательные функции ---
 
+def date_entry(master, **options):
+    # tkcalendar (вместе с babel) грузится при первом календаре, а не при запуске
+    from tkcalendar import DateEntry
+    return DateEntry(master, **options)
+
+
 def simple_input(prompt):
     result = []
 
@@ -543,7 +483,7 @@ def ask_name_birth_phone():
     entry_name.pack(padx=10, pady=5)
 
     tk.Label(dialog, text="Дата рождения:").pack(padx=10, pady=5)
-    cal = DateEntry(dialog, date_pattern='yyyy-mm-dd')
+    cal = date_entry(dialog, date_pattern='yyyy-mm-dd')
     cal.pack(padx=10, pady=5)
 
     tk.Label(dialog, text="Телефон:").pack(padx=10, pady=5)
@@ -586,16 +526,19 @@ def fill_month_selector():
 
 # --- Запуск приложения ---
 if __name__ == "__main__":
-    db_path = os.path.join(os.path.dirname(__file__), "database.accdb")
-    print("Путь к БД:", db_path)
-
-    if not os.path.exists(db_path):
+    startup_profile.handle_flag(__file__)
+    startup_profile.mark("модули загружены")
+    print("Путь к БД:", DB_BACKEND.db_path)
+    if not DB_BACKEND.exists():
         print("Создаю новую базу данных...")
-        success = create_access_database(db_path)
-        if not success:
+        try:
+            DB_BACKEND.create_database()
+        except Exception as e:
+            print(f"Ошибка при создании БД: {e}")
             messagebox.showerror("Ошибка", "Не удалось создать базу данных.")
             exit(1)
 
     root = tk.Tk()
     app = SportClubApp(root)
+    startup_profile.mark("окно построено")
     root.mainloop()
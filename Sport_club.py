@@ -1,116 +1,66 @@
+import startup_profile  # первым: от него отсчитывается время запуска
 import os
-import pyodbc
+import sys
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
-import pandas as pd
 from datetime import datetime, timedelta
-from tkcalendar import DateEntry
-import pythoncom
-import win32com.client
-import shutil
-
-# --- 1. Создание .accdb ---
-def create_access_database(db_path):
-    if os.path.exists(db_path):
-        try:
-            os.remove(db_path)
-        except PermissionError:
-            messagebox.showerror("Ошибка", f"Файл {db_path} используется другим процессом.")
-            return False
+
+import backup_store
+import exporter
+import migrations
+import payment_history
+import payment_stats
+import periods
+import reports
+import storage
+import virtual_tree
+import worker
+
+# --- 1. Резервное копирование ---
+def backup_database(pool):
+    # Снимок работающей БД в backups/store: сохраняются только изменившиеся
+    # куски файла, старые снимки прореживаются (backup_store.py)
     try:
-        pythoncom.CoInitialize()
-        access_app = win32.Dispatch("Access.Application")
-        try:
-            access_app.CloseCurrentDatabase()
-        except:
-            pass
-        access_app.NewCurrentDatabase(db_path)
-        db = access_app.CurrentDb()
-
-        # Таблица групп
-        sql_groups = """
-        CREATE TABLE Groups (
-            group_id AUTOINCREMENT PRIMARY KEY,
-            group_name TEXT,
-            description MEMO
-        );
-        """
-        db.Execute(sql_groups)
-
-        # Таблица спортсменов
-        sql_athletes = """
-        CREATE TABLE Athletes (
-            athlete_id AUTOINCREMENT PRIMARY KEY,
-            name TEXT,
-            birth_date DATETIME,
-            phone TEXT,
-            current_group_id LONG
-        );
-        """
-        db.Execute(sql_athletes)
-
-        # Таблица оплаты
-        sql_payments = """
-        CREATE TABLE Payments (
-            payment_id AUTOINCREMENT PRIMARY KEY,
-            athlete_id LONG,
-            month_year TEXT,
-            paid YESNO
-        );
-        """
-        db.Execute(sql_payments)
-
-        access_app.Quit()
-        del access_app
-        pythoncom.CoUninitialize()
-        print(f"База данных создана: {db_path}")
-        return True
+        result = backup_store.backup_and_prune(pool)
+        print(backup_store.describe(result))
+        return result
     except Exception as e:
-        print(f"Ошибка при создании БД: {e}")
-        try:
-            access_app.Quit()
-        except:
-            pass
-        pythoncom.CoUninitialize()
+        worker.show_error("Ошибка", f"Не удалось создать резервную копию: {str(e)}")
         return False
 
 
-# --- 2. Резервное копирование ---
-def backup_database(db_path):
-    try:
-        backup_dir = os.path.join(os.path.dirname(db_path), "backups")
-        if not os.path.exists(backup_dir):
-            os.makedirs(backup_dir)
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        backup_path = os.path.join(backup_dir, f"backup_{timestamp}.accdb")
-        shutil.copy2(db_path, backup_path)
-        print(f"Создана резервная копия: {backup_path}")
-        return True
-    except Exception as e:
-        messagebox.showerror("Ошибка", f"Не удалось создать резервную копию: {str(e)}")
-        return False
+# --- 2. Подключение к БД ---
+DB_BACKEND = storage.get_backend(os.path.dirname(os.path.abspath(__file__)), "database")
+DB_POOL = storage.get_pool(DB_BACKEND)
+_db_ready = False
 
 
-# --- 3. Подключение к БД ---
 def connect_db():
-    db_path = os.path.join(os.path.dirname(__file__), "database.accdb")
-    if not os.path.exists(db_path):
-        success = create_access_database(db_path)
-        if not success:
-            messagebox.showerror("Ошибка", "Не удалось создать базу данных.")
+    # Соединение берётся из пула; conn.close() возвращает его обратно
+    global _db_ready
+    if not _db_ready:
+        if not DB_BACKEND.exists():
+            try:
+                DB_BACKEND.create_database()
+            except Exception as e:
+                worker.show_error("Ошибка", f"Не удалось создать базу данных: {str(e)}")
+                return None
+        try:
+            report = migrations.upgrade(DB_POOL, measure=False)
+            if report:
+                print(report, file=sys.stderr)  # в консоль: отчёт об обновлении схемы
+        except Exception as e:
+            worker.show_error("Ошибка", f"Не удалось обновить схему БД: {str(e)}")
             return None
-    conn_str = (
-        r'DRIVER={Microsoft Access Driver (*.mdb, *.accdb)};'
-        f'DBQ={db_path};'
-    )
+        _db_ready = True
     try:
-        return pyodbc.connect(conn_str)
+        return DB_POOL.acquire()
     except Exception as e:
-        messagebox.showerror("Ошибка подключения", str(e))
+        worker.show_error("Ошибка подключения", str(e))
         return None
 
 
-# --- 4. Функции работы с данными ---
+# --- 3. Функции работы с данными ---
 def load_groups():
     conn = connect_db()
     cursor = conn.cursor()
@@ -135,7 +85,7 @@ def load_athletes(group_id=None):
 def add_group(name, desc):
     conn = connect_db()
     cursor = conn.cursor()
-    cursor.execute("INSERT INTO Groups (group_name, description) VALUES (?, ?)", (name, desc))
+    cursor.execute("INSERT INTO Groups (group_name, description, row_version) VALUES (?, ?, 0)", (name, desc))
     conn.commit()
     conn.close()
 
@@ -143,6 +93,10 @@ def add_group(name, desc):
 def delete_group(gid):
     conn = connect_db()
     cursor = conn.cursor()
+    cursor.execute("DELETE FROM Payments WHERE athlete_id IN "
+                   "(SELECT athlete_id FROM Athletes WHERE current_group_id = ?)", (gid,))
+    cursor.execute("DELETE FROM Athletes WHERE current_group_id = ?", (gid,))
+    payment_stats.remove_group(cursor, gid)
     cursor.execute("DELETE FROM Groups WHERE group_id = ?", (gid,))
     conn.commit()
     conn.close()
@@ -151,7 +105,7 @@ def delete_group(gid):
 def add_athlete(name, birth, phone, gid):
     conn = connect_db()
     cursor = conn.cursor()
-    cursor.execute("INSERT INTO Athletes (name, birth_date, phone, current_group_id) VALUES (?, ?, ?, ?)",
+    cursor.execute("INSERT INTO Athletes (name, birth_date, phone, current_group_id, row_version) VALUES (?, ?, ?, ?, 0)",
                    (name, birth, phone, gid))
     conn.commit()
     conn.close()
@@ -160,7 +114,10 @@ def add_athlete(name, birth, phone, gid):
 def move_athlete(aid, new_gid):
     conn = connect_db()
     cursor = conn.cursor()
-    cursor.execute("UPDATE Athletes SET current_group_id = ? WHERE athlete_id = ?", (new_gid, aid))
+    old_gid = payment_stats.athlete_group(cursor, aid)
+    cursor.execute("UPDATE Athletes SET current_group_id = ?, row_version = row_version + 1 WHERE athlete_id = ?",
+                   (new_gid, aid))
+    payment_stats.move_athlete(cursor, aid, old_gid, new_gid)
     conn.commit()
     conn.close()
 
@@ -168,6 +125,8 @@ def move_athlete(aid, new_gid):
 def delete_athlete(aid):
     conn = connect_db()
     cursor = conn.cursor()
+    payment_stats.remove_athlete(cursor, aid, payment_stats.athlete_group(cursor, aid))
+    cursor.execute("DELETE FROM Payments WHERE athlete_id = ?", (aid,))
     cursor.execute("DELETE FROM Athletes WHERE athlete_id = ?", (aid,))
     conn.commit()
     conn.close()
@@ -176,11 +135,14 @@ def delete_athlete(aid):
 def mark_payment(aid, month):
     conn = connect_db()
     cursor = conn.cursor()
-    cursor.execute("SELECT * FROM Payments WHERE athlete_id = ? AND month_year = ?", (aid, month))
+    period = periods.month_key(month)
+    cursor.execute("SELECT payment_id FROM Payments WHERE athlete_id = ? AND period = ?", (aid, period))
     if cursor.fetchone():
         conn.close()
         return False  # Оплата уже есть
-    cursor.execute("INSERT INTO Payments (athlete_id, month_year, paid) VALUES (?, ?, ?)", (aid, month, True))
+    cursor.execute("INSERT INTO Payments (athlete_id, month_year, period, paid) VALUES (?, ?, ?, ?)",
+                   (aid, month, period, True))
+    payment_stats.add_payments(cursor, period, payment_stats.athlete_group(cursor, aid))
     conn.commit()
     conn.close()
     return True
@@ -188,22 +150,23 @@ def mark_payment(aid, month):
 
 def get_all_payments_by_months(group_id=None):
     conn = connect_db()
-    cursor = conn.cursor()
-    query = """
-        SELECT P.month_year, A.name, G.group_name, P.paid 
-        FROM ((Payments AS P 
-        INNER JOIN Athletes AS A ON P.athlete_id = A.athlete_id)
-        INNER JOIN Groups AS G ON A.current_group_id = G.group_id)
-    """
-    params = []
-    if group_id:
-        query += " WHERE A.current_group_id = ?"
-        params.append(group_id)
-    query += " ORDER BY P.month_year DESC"
-    cursor.execute(query, params)
-    res = cursor.fetchall()
-    conn.close()
-    return res
+    try:
+        return payment_history.all_payments(conn, group_id)
+    finally:
+        conn.close()
+
+
+def get_all_payments_page(group_id=None, after=None, page_size=payment_history.PAGE_SIZE):
+    # Страница истории после курсора (period, athlete_id) -> (строки, курсор следующей)
+    conn = connect_db()
+    try:
+        return payment_history.get_page(conn, group_id, after, page_size)
+    finally:
+        conn.close()
+
+
+def payment_values(p):
+    return (p.month_year, p.name, p.group_name, "Да" if p.paid else "Нет")
 
 
 def get_payments_by_month(month, group_id):
@@ -212,8 +175,8 @@ def get_payments_by_month(month, group_id):
     cursor.execute("""
         SELECT A.name, P.paid 
         FROM (Payments AS P INNER JOIN Athletes AS A ON P.athlete_id = A.athlete_id)
-        WHERE P.month_year = ? AND A.current_group_id = ?
-    """, (month, group_id))
+        WHERE P.period = ? AND A.current_group_id = ?
+    """, (periods.month_key(month), group_id))
     res = cursor.fetchall()
     conn.close()
     return res
@@ -221,17 +184,10 @@ def get_payments_by_month(month, group_id):
 
 def get_unpaid_athletes(month, group_id):
     conn = connect_db()
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT A.name FROM Athletes A
-        WHERE NOT EXISTS (
-            SELECT 1 FROM Payments P
-            WHERE P.athlete_id = A.athlete_id AND P.month_year = ?
-        ) AND A.current_group_id = ?
-    """, (month, group_id))
-    res = cursor.fetchall()
-    conn.close()
-    return [r.name for r in res]
+    try:
+        return payment_history.unpaid_names(conn, month, group_id)
+    finally:
+        conn.close()
 
 
 def get_payment_stats(year):
@@ -239,14 +195,12 @@ def get_payment_stats(year):
     cursor = conn.cursor()
     try:
         cursor.execute("""
-            SELECT 
-                SUBSTR(month_year, 7, 2) AS month,
-                COUNT(*) AS count
-            FROM Payments
-            WHERE SUBSTR(month_year, 1, 4) = ? AND paid = True
-            GROUP BY SUBSTR(month_year, 7, 2)
-            ORDER BY month
-        """, (year,))
+            SELECT period, SUM(payment_count) AS count
+            FROM PaymentStats
+            WHERE period BETWEEN ? AND ?
+            GROUP BY period
+            ORDER BY period
+        """, periods.year_range(year))
         result = cursor.fetchall()
         conn.close()
         return result
@@ -257,21 +211,17 @@ def get_payment_stats(year):
 
 
 def export_to_excel(data, columns, filename):
-    df = pd.DataFrame(data, columns=columns)
-    df.to_excel(filename, index=False)
+    exporter.export_rows(filename, columns, data)
     messagebox.showinfo("Экспорт", f"Сохранено в {filename}")
 
 
 def export_all_to_excel(data_dict, filename):
-    with pd.ExcelWriter(filename, engine='xlsxwriter') as writer:
-        for sheet_name, (data, columns) in data_dict.items():
-            if data:
-                df = pd.DataFrame(data, columns=columns)
-                df.to_excel(writer, sheet_name=sheet_name[:31], index=False)
+    exporter.export_sheets(filename, [(sheet_name, columns, [data])
+                                      for sheet_name, (data, columns) in data_dict.items() if data])
     messagebox.showinfo("Экспорт", f"Данные сохранены в {filename}")
 
 
-# --- 5. Интерфейс Tkinter ---
+# --- 4. Интерфейс Tkinter ---
 class SportClubApp:
     def __init__(self, root):
         self.root = root
@@ -280,6 +230,12 @@ class SportClubApp:
 
         self.current_group_id = None
         self.groups_data = []
+        self.selector_athletes = []
+        self.worker = worker.DbWorker(root, on_busy=self.show_busy)
+
+        # Строка состояния: индикатор фоновых запросов к БД
+        self.status_bar = tk.Label(root, text="Готово", bd=1, relief=tk.SUNKEN, anchor=tk.W)
+        self.status_bar.pack(side="bottom", fill="x")
 
         # Список групп
         self.group_listbox = tk.Listbox(root)
@@ -355,30 +311,36 @@ class SportClubApp:
 
         filter_frame = tk.Frame(tab_all_payments)
         filter_frame.pack(pady=10)
+        self.filter_frame = filter_frame
 
         tk.Label(filter_frame, text="Группа:").grid(row=0, column=0)
         self.all_payments_group = ttk.Combobox(filter_frame, state="readonly")
         self.all_payments_group.grid(row=0, column=1)
 
+        # Календари (tkcalendar и babel) создаются при первом показе вкладки
+        # (create_date_pickers), а не при запуске
         tk.Label(filter_frame, text="С:").grid(row=0, column=2, padx=(10, 0))
-        self.date_from = DateEntry(filter_frame, date_pattern='yyyy-mm-dd', width=10)
-        self.date_from.grid(row=0, column=3)
-
         tk.Label(filter_frame, text="По:").grid(row=0, column=4, padx=(10, 0))
-        self.date_to = DateEntry(filter_frame, date_pattern='yyyy-mm-dd', width=10)
-        self.date_to.grid(row=0, column=5)
+        self.date_from = self.date_to = None
+
+        # Период не задан явно: пока флажок стоит, даты не учитываются
+        self.all_time = tk.BooleanVar(value=True)
+        tk.Checkbutton(filter_frame, text="За всё время", variable=self.all_time,
+                       command=self.on_all_time_toggle).grid(row=0, column=6, padx=(10, 0))
 
-        tk.Button(filter_frame, text="Обновить", command=self.load_all_payments).grid(row=0, column=6, padx=10)
+        tk.Button(filter_frame, text="Обновить", command=self.load_all_payments).grid(row=0, column=7, padx=10)
 
-        self.tree_all_payments = ttk.Treeview(tab_all_payments,
-                                             columns=("Месяц", "Имя", "Группа", "Оплачено"),
-                                             show='headings')
+        self.tree_all_payments = virtual_tree.VirtualTreeview(tab_all_payments,
+                                                              ("Месяц", "Имя", "Группа", "Оплачено"),
+                                                              row_values=payment_values, worker=self.worker)
         for col in ("Месяц", "Имя", "Группа", "Оплачено"):
             self.tree_all_payments.heading(col, text=col)
         self.tree_all_payments.pack(fill="both", expand=True, padx=5, pady=5)
 
         tk.Button(tab_all_payments, text="Экспорт всех данных в Excel",
                   command=self.export_all_data).pack(pady=5)
+        tk.Button(tab_all_payments, text="Экспорт истории оплат",
+                  command=self.export_payment_history).pack(pady=5)
 
         # Кнопка резервного копирования
         tk.Button(tab_all_payments, text="Сделать резервную копию", command=self.backup_current_db).pack(pady=5)
@@ -401,27 +363,60 @@ class SportClubApp:
         if current_tab == "Оплата" and self.current_group_id:
             self.load_athlete_names_for_payment()
         elif current_tab == "Все оплаты":
+            self.create_date_pickers()
             self.load_groups_for_filter()
 
+    def create_date_pickers(self):
+        if self.date_from is not None:
+            return
+        self.date_from = date_entry(self.filter_frame, date_pattern='yyyy-mm-dd', width=10)
+        self.date_from.grid(row=0, column=3)
+        self.date_to = date_entry(self.filter_frame, date_pattern='yyyy-mm-dd', width=10)
+        self.date_to.grid(row=0, column=5)
+        self.on_all_time_toggle()
+
+    def show_busy(self, labels):
+        if labels:
+            self.status_bar.config(text="⏳ " + ", ".join(dict.fromkeys(labels)) + "...")
+            self.root.config(cursor="watch")
+        else:
+            self.status_bar.config(text="Готово")
+            self.root.config(cursor="")
+
     def load_groups(self):
+        self.worker.submit(load_groups, key="groups", label="Загрузка групп", on_done=self.show_groups)
+
+    def show_groups(self, groups):
         self.group_listbox.delete(0, tk.END)
-        self.groups_data = load_groups()
+        self.groups_data = groups
         for g in self.groups_data:
             self.group_listbox.insert(tk.END, g.group_name)
+        startup_profile.finish(self.root)
+
+    def load_athletes_in_group(self, group_id, query=""):
+        # Новый запрос (другая группа или поиск) отменяет ещё не показанный старый
+        self.worker.submit(load_athletes, group_id, key="athletes", label="Загрузка спортсменов",
+                           on_done=lambda athletes: self.show_athletes(athletes, query))
 
-    def load_athletes_in_group(self, group_id):
+    def show_athletes(self, athletes, query=""):
         self.tree_athletes.delete(*self.tree_athletes.get_children())
-        athletes = load_athletes(group_id)
         for a in athletes:
-            birth = a.birth_date.strftime("%d.%m.%Y") if a.birth_date else ""
-            self.tree_athletes.insert("", tk.END, values=(a.athlete_id, a.name, birth, a.phone))
+            if query in a.name.lower():
+                birth = a.birth_date.strftime("%d.%m.%Y") if a.birth_date else ""
+                self.tree_athletes.insert("", tk.END, values=(a.athlete_id, a.name, birth, a.phone))
 
     def load_athlete_names_for_payment(self):
-        athletes = load_athletes(self.current_group_id)
+        self.worker.submit(load_athletes, self.current_group_id, key="athlete_names",
+                           on_done=self.show_athlete_names)
+
+    def show_athlete_names(self, athletes):
+        self.selector_athletes = athletes
         names = [a.name for a in athletes]
         self.athlete_selector['values'] = names
         if names:
             self.athlete_selector.current(0)
+        else:
+            self.athlete_selector.set("")
 
     def add_new_group(self):
         name = simple_input("Введите название группы:")
@@ -481,32 +476,29 @@ class SportClubApp:
         self.load_athletes_in_group(self.current_group_id)
 
     def mark_selected_payment(self):
-        selected_name = self.athlete_selector.get()
-        if not selected_name:
+        # id берётся из загруженного списка: однофамильцы не путаются
+        index = self.athlete_selector.current()
+        if index < 0:
             messagebox.showwarning("Ошибка", "Выберите спортсмена!")
             return
-        conn = connect_db()
-        cursor = conn.cursor()
-        cursor.execute("SELECT athlete_id FROM Athletes WHERE name = ?", (selected_name,))
-        row = cursor.fetchone()
-        if not row:
-            messagebox.showerror("Ошибка", "Спортсмен не найден!")
-            return
-        athlete_id = row[0]
+        athlete_id = self.selector_athletes[index].athlete_id
         month = self.month_selector.get()
-        cursor.execute("SELECT * FROM Payments WHERE athlete_id = ? AND month_year = ?", (athlete_id, month))
-        if cursor.fetchone():
+        if not mark_payment(athlete_id, month):
             messagebox.showinfo("Информация", "Оплата уже отмечена.")
             return
-        cursor.execute("INSERT INTO Payments (athlete_id, month_year, paid) VALUES (?, ?, ?)", (athlete_id, month, True))
-        conn.commit()
-        conn.close()
         self.show_payments()
 
     def show_payments(self):
         month = self.month_selector.get()
-        payments = get_payments_by_month(month, self.current_group_id)
-        unpaid = get_unpaid_athletes(month, self.current_group_id)
+        group_id = self.current_group_id
+
+        def load():
+            return get_payments_by_month(month, group_id), get_unpaid_athletes(month, group_id)
+
+        self.worker.submit(load, key="payments", label="Загрузка оплат", on_done=self.fill_payments)
+
+    def fill_payments(self, result):
+        payments, unpaid = result
         self.tree_payments.delete(*self.tree_payments.get_children())
         for p in payments:
             self.tree_payments.insert("", tk.END, values=(p.name, "Да" if p.paid else "Нет"))
@@ -515,130 +507,108 @@ class SportClubApp:
 
     def export_payments(self):
         month = self.month_selector.get()
-        payments = get_payments_by_month(month, self.current_group_id)
-        filename = filedialog.asksaveasfilename(defaultextension=".xlsx", filetypes=[("Excel", "*.xlsx")])
-        if filename:
-            export_to_excel([(p.name, "Да" if p.paid else "Нет") for p in payments],
-                            ["Имя", "Оплачено"], filename)
+        group_id = self.current_group_id
+        filename = filedialog.asksaveasfilename(defaultextension=".xlsx", filetypes=[("Excel", "*.xlsx"), ("CSV", "*.csv")])
+        if not filename:
+            return
 
-    def load_all_payments(self):
+        def export():
+            payments = get_payments_by_month(month, group_id)
+            exporter.export_rows(filename, ["Имя", "Оплачено"],
+                                 [(p.name, "Да" if p.paid else "Нет") for p in payments])
+
+        self.worker.submit(export, label="Экспорт",
+                           on_done=lambda _: messagebox.showinfo("Экспорт", f"Сохранено в {filename}"))
+
+    def filter_group_id(self):
         group_name = self.all_payments_group.get()
-        group_id = None
         if group_name != 'Все':
             group = next((g for g in self.groups_data if g.group_name == group_name), None)
             if group:
-                group_id = group.group_id
+                return group.group_id
+        return None
 
-        date_from = self.date_from.get_date().strftime("%Y-%m")
-        date_to = self.date_to.get_date().strftime("%Y-%m")
+    def on_all_time_toggle(self):
+        if self.date_from is None:
+            return
+        state = "disabled" if self.all_time.get() else "normal"
+        self.date_from.config(state=state)
+        self.date_to.config(state=state)
 
-        conn = connect_db()
-        cursor = conn.cursor()
-        query = """
-            SELECT P.month_year, A.name, G.group_name, P.paid 
-            FROM ((Payments AS P 
-            INNER JOIN Athletes AS A ON P.athlete_id = A.athlete_id)
-            INNER JOIN Groups AS G ON A.current_group_id = G.group_id)
-            WHERE P.month_year BETWEEN ? AND ?
-        """
-        params = [date_from, date_to]
+    def filter_period(self):
+        # -> (с месяца, по месяц) как yyyymm или (None, None) при «За всё время»
+        if self.all_time.get() or self.date_from is None:
+            return None, None
+        return periods.month_key(self.date_from.get_date()), periods.month_key(self.date_to.get_date())
 
-        if group_id:
-            query += " AND A.current_group_id = ?"
-            params.append(group_id)
+    def load_all_payments(self):
+        group_id = self.filter_group_id()
+        period_from, period_to = self.filter_period()
 
-        query += " ORDER BY P.month_year DESC"
+        # Страницы читаются по ключу (period, athlete_id) по мере прокрутки
+        self.tree_all_payments.set_source(payment_history.HistorySource(DB_POOL, group_id, period_from, period_to))
 
-        try:
-            cursor.execute(query, params)
-            res = cursor.fetchall()
-            self.tree_all_payments.delete(*self.tree_all_payments.get_children())
-            for row in res:
-                paid_str = "Да" if row.paid else "Нет"
-                self.tree_all_payments.insert("", tk.END, values=(row.month_year, row.name, row.group_name, paid_str))
-        finally:
-            conn.close()
+    def export_payment_history(self):
+        filename = filedialog.asksaveasfilename(defaultextension=".xlsx",
+                                                filetypes=[("Excel", "*.xlsx"), ("CSV", "*.csv"),
+                                                           ("Parquet", "*.parquet")])
+        if not filename:
+            return
+        self.worker.submit(exporter.export_payment_history, DB_POOL, filename, self.filter_group_id(),
+                           *self.filter_period(), lambda total, elapsed: worker.check_cancelled(),
+                           label="Экспорт истории оплат",
+                           on_done=lambda total: messagebox.showinfo("Экспорт", f"Выгружено оплат: {total}\n{filename}"),
+                           on_error=lambda e: messagebox.showerror("Ошибка", f"Не удалось выгрузить оплаты:\n{str(e)}"))
 
     def load_groups_for_filter(self):
-        groups = load_groups()
+        self.worker.submit(load_groups, key="filter_groups", on_done=self.show_groups_for_filter)
+
+    def show_groups_for_filter(self, groups):
         names = [g.group_name for g in groups]
         self.all_payments_group['values'] = ['Все'] + names
         self.all_payments_group.set('Все')
 
     def export_all_data(self):
-        if not self.current_group_id:
-            messagebox.showwarning("Ошибка", "Выберите группу!")
-            return
-
+        # Отчёт строится запросами к БД по группе и периоду из фильтра вкладки
+        # «Все оплаты», как и выгрузка истории; без фильтра — весь клуб за всё время
         filename = filedialog.asksaveasfilename(defaultextension=".xlsx", filetypes=[("Excel", "*.xlsx")])
         if not filename:
             return
+        group_id = self.filter_group_id()
+        period = self.filter_period()
 
-        try:
-            with pd.ExcelWriter(filename, engine='xlsxwriter') as writer:
-                # Спортсмены
-                athletes = []
-                for item in self.tree_athletes.get_children():
-                    values = self.tree_athletes.item(item)['values']
-                    if len(values) >= 4:
-                        athletes.append({
-                            "ID": values[0],
-                            "ФИО": values[1],
-                            "Дата рождения": values[2],
-                            "Телефон": values[3]
-                        })
-                if athletes:
-                    df = pd.DataFrame(athletes)
-                    df.to_excel(writer, sheet_name="Спортсмены", index=False)
-
-                # Оплаты
-                payments = []
-                month = self.month_selector.get()
-                for item in self.tree_payments.get_children():
-                    values = self.tree_payments.item(item)['values']
-                    if len(values) >= 2:
-                        payments.append({"ФИО": values[0], "Оплачено": values[1], "Месяц": month})
-                if payments:
-                    df = pd.DataFrame(payments)
-                    df.to_excel(writer, sheet_name="Оплата", index=False)
-
-                # Статистика
-                stats = []
-                for item in self.stats_tree.get_children():
-                    values = self.stats_tree.item(item)['values']
-                    if len(values) >= 2:
-                        stats.append({"Месяц": values[0], "Количество оплат": values[1]})
-                if stats:
-                    df = pd.DataFrame(stats)
-                    df.to_excel(writer, sheet_name="Статистика", index=False)
-
-            messagebox.showinfo("Экспорт", f"Данные успешно сохранены в:\n{filename}")
+        def build():
+            period_from, period_to = period if period[0] is not None else reports.payment_months(DB_POOL, group_id)
+            return reports.build_report(DB_POOL, filename, group_id, period_from, period_to,
+                                        lambda total, elapsed: worker.check_cancelled())
 
-        except Exception as e:
-            messagebox.showerror("Ошибка", f"Не удалось сохранить файл:\n{str(e)}")
+        self.worker.submit(build, label="Экспорт всех данных",
+                           on_done=lambda total: messagebox.showinfo("Экспорт", f"Данные успешно сохранены в:\n{filename}"),
+                           on_error=lambda e: messagebox.showerror("Ошибка", f"Не удалось сохранить файл:\n{str(e)}"))
 
     def backup_current_db(self):
-        db_path = os.path.join(os.path.dirname(__file__), "database.accdb")
-        if os.path.exists(db_path):
-            if backup_database(db_path):
-                messagebox.showinfo("Резервная копия", "Резервная копия создана!")
-        else:
+        db_path = DB_BACKEND.db_path
+        if not os.path.exists(db_path):
             messagebox.showerror("Ошибка", "База данных не найдена.")
+            return
+
+        def done(result):
+            if result:
+                messagebox.showinfo("Резервная копия", backup_store.describe(result))
+
+        self.worker.submit(backup_database, DB_POOL, label="Резервное копирование", on_done=done)
 
     def search_athlete(self):
-        query = self.search_entry.get().strip().lower()
-        if not query:
-            self.load_athletes_in_group(self.current_group_id)
-            return
-        athletes = load_athletes(self.current_group_id)
-        filtered = [a for a in athletes if query in a.name.lower()]
-        self.tree_athletes.delete(*self.tree_athletes.get_children())
-        for a in filtered:
-            birth = a.birth_date.strftime("%d.%m.%Y") if a.birth_date else ""
-            self.tree_athletes.insert("", tk.END, values=(a.athlete_id, a.name, birth, a.phone))
+        self.load_athletes_in_group(self.current_group_id, self.search_entry.get().strip().lower())
 
 
 # --- Вспомогательные функции ---
+def date_entry(master, **options):
+    # tkcalendar (вместе с babel) грузится при первом календаре, а не при запуске
+    from tkcalendar import DateEntry
+    return DateEntry(master, **options)
+
+
 def simple_input(prompt):
     result = []
     def on_ok():
@@ -669,7 +639,7 @@ def ask_name_birth_phone():
     entry_name = tk.Entry(dialog, width=40)
     entry_name.pack(padx=10, pady=5)
     tk.Label(dialog, text="Дата рождения:").pack(padx=10, pady=5)
-    cal = DateEntry(dialog, date_pattern='yyyy-mm-dd')
+    cal = date_entry(dialog, date_pattern='yyyy-mm-dd')
     cal.pack(padx=10, pady=5)
     tk.Label(dialog, text="Телефон:").pack(padx=10, pady=5)
     entry_phone = tk.Entry(dialog, width=30)
@@ -709,17 +679,19 @@ def fill_month_selector():
 
 # --- Запуск приложения ---
 if __name__ == "__main__":
-    db_path = os.path.join(os.path.dirname(__file__), "database.accdb")
-    print("Путь к БД:", db_path)
-    if not os.path.exists(db_path):
+    startup_profile.handle_flag(__file__)
+    startup_profile.mark("модули загружены")
+    print("Путь к БД:", DB_BACKEND.db_path)
+    if not DB_BACKEND.exists():
         print("Создаю новую базу данных...")
-        success = create_access_database(db_path)
-        if not success:
+        try:
+            DB_BACKEND.create_database()
+        except Exception as e:
+            print(f"Ошибка при создании БД: {e}")
             messagebox.showerror("Ошибка", "Не удалось создать базу данных.")
             exit(1)
 
     root = tk.Tk()
     app = SportClubApp(root)
+    startup_profile.mark("окно построено")
     root.mainloop()
-
-
@@ -0,0 +1,300 @@
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+import zlib
+from collections import namedtuple
+from datetime import datetime
+
+import storage
+
+
+# Резервные копии без дублирования: файл БД режется на куски по содержимому
+# (границы ставит скользящий хэш, поэтому вставка в начало файла не сдвигает
+# все следующие куски), каждый кусок хранится один раз, сжатым, под именем
+# из своего SHA-256. Снимок — это манифест со списком кусков. Старые снимки
+# прореживаются по правилам хранения, ненужные куски удаляются.
+#
+# backups/store/chunks/ab/abcdef...   — сжатые куски
+# backups/store/snapshots/<id>.json   — манифесты снимков
+
+MIN_CHUNK = 4 * 1024
+AVG_CHUNK = 16 * 1024  # степень двойки: по ней строится маска
+MAX_CHUNK = 64 * 1024
+READ_SIZE = 1024 * 1024
+
+# Сколько снимков оставлять: последний за каждый из N часов, дней, месяцев
+KEEP_HOURLY = 24
+KEEP_DAILY = 30
+KEEP_MONTHLY = 12
+
+_MASK = AVG_CHUNK - 1
+# Таблица для gear-хэша: фиксированная, иначе границы кусков поедут между запусками
+_GEAR = [int.from_bytes(hashlib.sha256(bytes([i])).digest()[:4], "big") for i in range(256)]
+
+BackupResult = namedtuple("BackupResult", "snapshot_id size chunks new_chunks new_bytes elapsed store_bytes locked",
+                          defaults=(None, 0.0))
+PruneResult = namedtuple("PruneResult", "removed_snapshots removed_chunks freed_bytes")
+
+
+class BackupError(Exception):
+    pass
+
+
+# --- 1. Нарезка на куски ---
+def _cut(data, start, end):
+    # Граница куска: первое место после MIN_CHUNK, где младшие биты хэша нулевые
+    limit = min(end, start + MAX_CHUNK)
+    i = start + MIN_CHUNK
+    if i >= limit:
+        return limit
+    h = 0
+    gear = _GEAR
+    while i < limit:
+        h = ((h << 1) + gear[data[i]]) & 0xFFFFFFFF
+        i += 1
+        if not h & _MASK:
+            return i
+    return limit
+
+
+def chunks(stream):
+    # Куски файла по порядку; в памяти не больше READ_SIZE + MAX_CHUNK
+    buffer = b""
+    eof = False
+    while True:
+        if not eof and len(buffer) < MAX_CHUNK:
+            block = stream.read(READ_SIZE)
+            eof = not block
+            buffer += block
+        if not buffer:
+            return
+        start = 0
+        while len(buffer) - start >= MAX_CHUNK or (eof and start < len(buffer)):
+            end = _cut(buffer, start, len(buffer))
+            yield buffer[start:end]
+            start = end
+        buffer = buffer[start:]
+
+
+# --- 2. Хранилище ---
+class BackupStore:
+    def __init__(self, root):
+        self.root = root
+        self.chunks_dir = os.path.join(root, "chunks")
+        self.snapshots_dir = os.path.join(root, "snapshots")
+
+    def _chunk_path(self, digest):
+        return os.path.join(self.chunks_dir, digest[:2], digest)
+
+    def _manifest_path(self, snapshot_id):
+        return os.path.join(self.snapshots_dir, snapshot_id + ".json")
+
+    def _write(self, path, data):
+        # Через временный файл: оборванная запись не оставляет битый кусок
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def backup(self, path, created=None, source=None):
+        started = time.perf_counter()
+        created = created or datetime.now()
+        snapshot_id = created.strftime("%Y%m%d_%H%M%S")
+        n = 1
+        while os.path.exists(self._manifest_path(snapshot_id)):
+            snapshot_id = f"{created:%Y%m%d_%H%M%S}_{n}"
+            n += 1
+
+        digests = []
+        size = new_chunks = new_bytes = 0
+        file_hash = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in chunks(f):
+                digest = hashlib.sha256(chunk).hexdigest()
+                digests.append(digest)
+                size += len(chunk)
+                file_hash.update(chunk)
+                chunk_path = self._chunk_path(digest)
+                if not os.path.exists(chunk_path):
+                    packed = zlib.compress(chunk, 6)
+                    self._write(chunk_path, packed)
+                    new_chunks += 1
+                    new_bytes += len(packed)
+
+        manifest = {
+            "id": snapshot_id,
+            "created": created.isoformat(timespec="seconds"),
+            "source": source or os.path.basename(path),
+            "size": size,
+            "sha256": file_hash.hexdigest(),
+            "chunks": digests,
+        }
+        self._write(self._manifest_path(snapshot_id), json.dumps(manifest, indent=1).encode("utf-8"))
+        # Размер хранилища считает backup_and_prune — уже после прореживания
+        return BackupResult(snapshot_id, size, len(digests), new_chunks, new_bytes,
+                            time.perf_counter() - started)
+
+    def snapshots(self):
+        # Манифесты от старых к новым
+        if not os.path.isdir(self.snapshots_dir):
+            return []
+        result = []
+        for name in sorted(os.listdir(self.snapshots_dir)):
+            if name.endswith(".json"):
+                with open(os.path.join(self.snapshots_dir, name), encoding="utf-8") as f:
+                    result.append(json.load(f))
+        result.sort(key=lambda m: (m["created"], m["id"]))
+        return result
+
+    def restore(self, snapshot_id, target):
+        path = self._manifest_path(snapshot_id)
+        if not os.path.exists(path):
+            raise BackupError(f"снимок {snapshot_id} не найден")
+        with open(path, encoding="utf-8") as f:
+            manifest = json.load(f)
+
+        tmp_path = target + ".restore"
+        file_hash = hashlib.sha256()
+        try:
+            with open(tmp_path, "wb") as out:
+                for digest in manifest["chunks"]:
+                    try:
+                        with open(self._chunk_path(digest), "rb") as f:
+                            chunk = zlib.decompress(f.read())
+                    except (OSError, zlib.error) as e:
+                        raise BackupError(f"кусок {digest} повреждён или отсутствует: {e}")
+                    file_hash.update(chunk)
+                    out.write(chunk)
+            if file_hash.hexdigest() != manifest["sha256"]:
+                raise BackupError(f"контрольная сумма снимка {snapshot_id} не совпала")
+            os.replace(tmp_path, target)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return manifest
+
+    def prune(self, keep_hourly=KEEP_HOURLY, keep_daily=KEEP_DAILY, keep_monthly=KEEP_MONTHLY):
+        # Последний снимок каждого часа/дня/месяца в пределах лимита, плюс самый новый.
+        # Вызывается из того же потока, что и backup: иначе можно удалить кусок,
+        # на который ещё не записан манифест.
+        manifests = self.snapshots()
+        keep = {m["id"] for m in manifests[-1:]}
+        for pattern, limit in (("%Y%m%d%H", keep_hourly), ("%Y%m%d", keep_daily), ("%Y%m", keep_monthly)):
+            buckets = []
+            for m in reversed(manifests):
+                bucket = datetime.fromisoformat(m["created"]).strftime(pattern)
+                if bucket not in buckets:
+                    if len(buckets) == limit:
+                        break
+                    buckets.append(bucket)
+                    keep.add(m["id"])
+
+        removed = [m for m in manifests if m["id"] not in keep]
+        for m in removed:
+            os.remove(self._manifest_path(m["id"]))
+
+        used = set()
+        for m in manifests:
+            if m["id"] in keep:
+                used.update(m["chunks"])
+        removed_chunks = freed = 0
+        if removed and os.path.isdir(self.chunks_dir):
+            for prefix in os.listdir(self.chunks_dir):
+                folder = os.path.join(self.chunks_dir, prefix)
+                for digest in os.listdir(folder):
+                    if digest not in used:
+                        path = os.path.join(folder, digest)
+                        freed += os.path.getsize(path)
+                        os.remove(path)
+                        removed_chunks += 1
+        return PruneResult(len(removed), removed_chunks, freed)
+
+    def disk_usage(self):
+        total = 0
+        for folder, _, files in os.walk(self.root):
+            total += sum(os.path.getsize(os.path.join(folder, name)) for name in files)
+        return total
+
+
+def store_for(db_path):
+    return BackupStore(os.path.join(os.path.dirname(os.path.abspath(db_path)), "backups", "store"))
+
+
+def backup_and_prune(pool):
+    # Сначала согласованный снимок работающей БД во временный файл
+    # (ConnectionPool.snapshot), потом он режется на куски: приложение
+    # в это время продолжает писать в базу
+    db_path = pool.backend.db_path
+    store = store_for(db_path)
+    os.makedirs(store.root, exist_ok=True)
+    tmp_path = os.path.join(store.root, "snapshot" + os.path.splitext(db_path)[1] + ".tmp")
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    try:
+        locked = pool.snapshot(tmp_path)
+        result = store.backup(tmp_path, source=os.path.basename(db_path))
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    store.prune()
+    return result._replace(store_bytes=store.disk_usage(), locked=locked)
+
+
+def describe(result):
+    text = (f"Снимок {result.snapshot_id}: {result.size // 1024} КБ, новых данных "
+            f"{result.new_bytes // 1024} КБ ({result.new_chunks} из {result.chunks} кусков) "
+            f"за {result.elapsed:.2f} с; хранилище занимает {result.store_bytes // 1024} КБ")
+    if result.locked:
+        text += f"; запись была заблокирована {result.locked * 1000:.0f} мс"
+    return text
+
+
+# --- 3. Командная строка ---
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Резервные копии БД без дублирования")
+    parser.add_argument("--db", help="путь к файлу БД")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("backup", help="сделать снимок и удалить лишние старые")
+    commands.add_parser("list", help="список снимков")
+    restore = commands.add_parser("restore", help="восстановить снимок в файл")
+    restore.add_argument("snapshot")
+    restore.add_argument("target")
+    args = parser.parse_args(argv)
+
+    if args.db:
+        os.environ[storage.DB_PATH_ENV] = args.db
+        if args.db.lower().endswith(".accdb"):
+            os.environ.setdefault(storage.BACKEND_ENV, "access")
+    backend = storage.get_backend(os.path.dirname(os.path.abspath(__file__)), "sportclub")
+    db_path = backend.db_path
+    store = store_for(db_path)
+
+    if args.command == "backup":
+        try:
+            print(describe(backup_and_prune(storage.get_pool(backend))))
+        except storage.StorageError as e:
+            print(f"Ошибка: {e}", file=sys.stderr)
+            return 1
+    elif args.command == "list":
+        for m in store.snapshots():
+            print(f"{m['id']}  {m['created']}  {m['size'] // 1024} КБ  {m['source']}")
+        print(f"Хранилище: {store.disk_usage() // 1024} КБ")
+    else:
+        if os.path.abspath(args.target) == os.path.abspath(db_path):
+            print("Восстановление поверх открытой БД запрещено: укажите другой файл", file=sys.stderr)
+            return 2
+        try:
+            manifest = store.restore(args.snapshot, args.target)
+        except BackupError as e:
+            print(f"Ошибка: {e}", file=sys.stderr)
+            return 1
+        print(f"Снимок {manifest['id']} восстановлен в {args.target}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,281 @@
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import sys
+import time
+from datetime import date, datetime
+
+import migrations
+import payment_history
+import payment_stats
+import periods
+import storage
+
+
+# Замеры функций работы с БД на синтетических данных (SQLite):
+#
+#   python benchmark.py                                  — 20 групп по 100 человек, 3 года оплат
+#   python benchmark.py --groups 100 --athletes 300 --years 5   — около 1,6 млн оплат
+#   python benchmark.py --save bench/baseline.json       — запомнить результат как эталон
+#   python benchmark.py --baseline bench/baseline.json   — сравнить с эталоном
+#
+# Данные генерируются детерминированно (--seed) и сохраняются в bench/ под
+# именем из параметров: повторный запуск их не пересоздаёт. Замеры идут на
+# копии, поэтому отметки оплат не меняют исходный файл. Кэш чтения перед
+# каждым вызовом сбрасывается: меряется запрос к БД, а не попадание в кэш.
+# Код выхода 1 — p95 какой-то функции хуже эталона больше чем на --tolerance.
+
+BENCH_DIR = "bench"
+END_MONTH = "2024-12"  # последний месяц оплат: от даты запуска данные не зависят
+PAID_RATIO = 0.85
+BATCH_SIZE = 50000
+
+SURNAMES = ["Иванов", "Смирнов", "Кузнецов", "Попов", "Васильев", "Петров", "Соколов", "Михайлов",
+            "Новиков", "Фёдоров", "Морозов", "Волков", "Алексеев", "Лебедев", "Семёнов", "Егоров"]
+FIRST_NAMES = ["Александр", "Максим", "Иван", "Артём", "Дмитрий", "Никита", "Михаил", "Даниил",
+               "Егор", "Андрей", "Илья", "Кирилл", "Алексей", "Роман", "Сергей", "Матвей"]
+
+
+# --- 1. Синтетические данные ---
+def dataset_name(args):
+    return f"bench_g{args.groups}_a{args.athletes}_y{args.years}_s{args.seed}.db"
+
+
+def generate(db_path, groups, athletes_per_group, years, seed=1, end_month=END_MONTH):
+    # Схема — та же, что у рабочей БД: создание файла и все миграции
+    started = time.perf_counter()
+    rng = random.Random(seed)
+    backend = storage.SQLiteBackend(db_path)
+    backend.create_database()
+    pool = storage.ConnectionPool(backend)
+    migrations.upgrade(pool, measure=False)
+    pool.close_all()
+
+    end = periods.month_key(end_month)
+    months = [periods.add_months(end, -i) for i in range(years * 12 - 1, -1, -1)]
+
+    conn = backend.connect()
+    try:
+        conn.execute("PRAGMA synchronous=OFF")
+        cursor = conn.cursor()
+        cursor.executemany("INSERT INTO Groups (group_name, description, row_version) VALUES (?, ?, 0)",
+                           [(f"Группа {i + 1}", "") for i in range(groups)])
+
+        athletes = []
+        for group_id in range(1, groups + 1):
+            for _ in range(athletes_per_group):
+                n = len(athletes) + 1
+                birth = date(rng.randint(2000, 2018), rng.randint(1, 12), rng.randint(1, 28))
+                athletes.append((f"{rng.choice(SURNAMES)} {rng.choice(FIRST_NAMES)} {n}", birth.isoformat(),
+                                 f"+7 9{rng.randint(0, 99):02d} {rng.randint(0, 9999999):07d}", group_id,
+                                 f"C{n:07d}" if rng.random() < 0.5 else None))
+        cursor.executemany("""
+            INSERT INTO Athletes (name, birth_date, phone, current_group_id, card_code, row_version)
+            VALUES (?, ?, ?, ?, ?, 0)
+        """, athletes)
+
+        # Каждый месяц платит около PAID_RATIO спортсменов
+        batch = []
+        total = 0
+        for athlete_id in range(1, len(athletes) + 1):
+            for period in months:
+                if rng.random() < PAID_RATIO:
+                    batch.append((athlete_id, periods.month_label(period), period, True))
+            if len(batch) >= BATCH_SIZE:
+                cursor.executemany("INSERT INTO Payments (athlete_id, month_year, period, paid) VALUES (?, ?, ?, ?)",
+                                   batch)
+                total += len(batch)
+                batch = []
+        if batch:
+            cursor.executemany("INSERT INTO Payments (athlete_id, month_year, period, paid) VALUES (?, ?, ?, ?)",
+                               batch)
+            total += len(batch)
+        conn.commit()
+        payment_stats.rebuild(conn)
+        conn.execute("ANALYZE")
+    finally:
+        conn.close()
+    return {"groups": groups, "athletes": len(athletes), "payments": total,
+            "months": len(months), "seconds": round(time.perf_counter() - started, 2)}
+
+
+def prepare(args):
+    # -> путь к рабочей копии; исходный файл генерируется один раз
+    os.makedirs(args.dir, exist_ok=True)
+    template = os.path.join(args.dir, dataset_name(args))
+    if not os.path.exists(template):
+        print(f"Генерация {template}...", file=sys.stderr)
+        tmp_path = template + ".tmp"
+        for path in (tmp_path, tmp_path + "-wal", tmp_path + "-shm"):
+            if os.path.exists(path):
+                os.remove(path)
+        info = generate(tmp_path, args.groups, args.athletes, args.years, args.seed)
+        os.replace(tmp_path, template)
+        print(f"Готово за {info['seconds']} с: {info['athletes']} спортсменов, {info['payments']} оплат",
+              file=sys.stderr)
+
+    work = os.path.join(args.dir, "work.db")
+    for path in (work, work + "-wal", work + "-shm"):
+        if os.path.exists(path):
+            os.remove(path)
+    shutil.copyfile(template, work)
+    return work
+
+
+# --- 2. Замеры ---
+def percentile(values, p):
+    # Ближайший ранг: на малых выборках не выдумывает промежуточных значений
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+def build_cases(data, args):
+    # (имя, функция(rng), сколько повторов); аргументы выбираются из rng по очереди
+    end = periods.month_key(END_MONTH)
+    first = periods.add_months(end, -(args.years * 12 - 1))
+    groups = range(1, args.groups + 1)
+    athletes = args.groups * args.athletes
+
+    def month(rng):
+        return periods.month_label(periods.add_months(first, rng.randrange(args.years * 12)))
+
+    # Отметки — за месяцы после сгенерированных: каждый вызов пишет новую оплату
+    marks = iter((athlete_id, periods.month_label(periods.add_months(end, n)))
+                 for n in range(1, 1000) for athlete_id in range(1, athletes + 1))
+
+    cases = [
+        ("load_groups", lambda rng: data.load_groups(), args.repeat),
+        ("load_athletes", lambda rng: data.load_athletes(rng.choice(groups)), args.repeat),
+        ("load_all_athletes", lambda rng: data.load_all_athletes(), max(1, args.repeat // 10)),
+        ("roster_page", lambda rng: data.roster_page(rng.choice(groups), 0, 100), args.repeat),
+        ("get_group_snapshot", lambda rng: data.get_group_snapshot(rng.choice(groups), month(rng)), args.repeat),
+        ("get_payments_by_month", lambda rng: data.get_payments_by_month(month(rng), rng.choice(groups)),
+         args.repeat),
+        ("get_payment_stats", lambda rng: data.get_payment_stats(int(month(rng)[:4])), args.repeat),
+        ("mark_payment", lambda rng: data.mark_payment(*next(marks)), args.repeat),
+        ("mark_payments_bulk", lambda rng: data.mark_payments_bulk(
+            [next(marks)[0] for _ in range(20)], periods.month_label(periods.add_months(end, 999))), args.repeat),
+    ]
+
+    # Запросы вкладок "Все оплаты" и "Неоплатившие" SportClubApp.py/Sport_club.py
+    # (payment_history.py: без tkinter, на соединении из того же пула)
+    def on_conn(func, *func_args):
+        conn = data.DB_POOL.acquire()
+        try:
+            return func(conn, *func_args)
+        finally:
+            conn.close()
+
+    cases += [
+        ("get_unpaid_athletes", lambda rng: on_conn(payment_history.unpaid_names, month(rng), rng.choice(groups)),
+         args.repeat),
+        ("get_all_payments_by_months", lambda rng: on_conn(payment_history.all_payments, rng.choice(groups)),
+         max(1, args.repeat // 10)),
+    ]
+    return cases
+
+
+def run_case(data, func, repeat, seed):
+    rng = random.Random(seed)
+    timings = []
+    rows = 0
+    func(rng)  # прогрев: соединение, кэш операторов
+    for _ in range(repeat):
+        data.DB_CACHE.clear()
+        started = time.perf_counter()
+        result = func(rng)
+        timings.append(time.perf_counter() - started)
+        if isinstance(result, list):
+            rows += len(result)
+    return {
+        "n": repeat,
+        "p50_ms": round(percentile(timings, 50) * 1000, 3),
+        "p95_ms": round(percentile(timings, 95) * 1000, 3),
+        "mean_ms": round(sum(timings) / repeat * 1000, 3),
+        "ops_per_s": round(repeat / sum(timings), 1),
+        "rows": rows // repeat,
+    }
+
+
+# --- 3. Эталон ---
+def compare(results, baseline, tolerance):
+    # -> [(функция, p95 эталона, p95 сейчас)] для замедлившихся больше чем на tolerance
+    regressions = []
+    for name, result in results["results"].items():
+        before = baseline["results"].get(name)
+        if before and result["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            regressions.append((name, before["p95_ms"], result["p95_ms"]))
+    return regressions
+
+
+def print_report(results, baseline=None):
+    print(f"{'Функция':<28}{'p50, мс':>10}{'p95, мс':>10}{'оп/с':>10}{'строк':>9}"
+          + (f"{'p95 эталона':>14}{'изм.':>8}" if baseline else ""))
+    for name, r in results["results"].items():
+        line = f"{name:<28}{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}{r['ops_per_s']:>10.1f}{r['rows']:>9}"
+        before = baseline["results"].get(name) if baseline else None
+        if before:
+            line += f"{before['p95_ms']:>14.2f}{(r['p95_ms'] / before['p95_ms'] - 1) * 100:>+7.0f}%"
+        print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Замеры функций работы с БД на синтетических данных")
+    parser.add_argument("--groups", type=int, default=20)
+    parser.add_argument("--athletes", type=int, default=100, help="спортсменов в группе")
+    parser.add_argument("--years", type=int, default=3, help="лет ежемесячных оплат")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=50, help="вызовов каждой функции")
+    parser.add_argument("--only", nargs="+", metavar="ФУНКЦИЯ", help="замерить только эти функции")
+    parser.add_argument("--dir", default=BENCH_DIR, help="где хранить сгенерированные БД")
+    parser.add_argument("--save", help="записать результат в JSON (например, как эталон)")
+    parser.add_argument("--baseline", help="сравнить с сохранённым результатом")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="допустимое ухудшение p95 (0.2 = 20%%)")
+    args = parser.parse_args(argv)
+
+    work = prepare(args)
+    os.environ[storage.BACKEND_ENV] = "sqlite"
+    os.environ[storage.DB_PATH_ENV] = work
+    # club_data берёт путь к БД при импорте
+    import club_data
+    club_data.connect_db().close()
+
+    results = {
+        "dataset": {"groups": args.groups, "athletes": args.athletes, "years": args.years, "seed": args.seed},
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "results": {},
+    }
+    for n, (name, func, repeat) in enumerate(build_cases(club_data, args)):
+        if args.only and name not in args.only:
+            continue
+        results["results"][name] = run_case(club_data, func, repeat, args.seed + n)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline["dataset"] != results["dataset"]:
+            print(f"Внимание: эталон снят на других данных: {baseline['dataset']}", file=sys.stderr)
+    print_report(results, baseline)
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    if baseline:
+        regressions = compare(results, baseline, args.tolerance)
+        for name, before, after in regressions:
+            print(f"Замедление {name}: p95 {before:.2f} -> {after:.2f} мс", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,54 @@
+import os
+import threading
+import time
+
+
+# Кэш результатов чтения из БД. Ключ — кортеж, например ("athletes", group_id, ...).
+# Записи сбрасываются явно после изменений (invalidate по началу ключа), а TTL
+# ограничивает устаревание, когда базу на сетевом диске правят с других машин.
+TTL_ENV = "SPORTCLUB_CACHE_TTL"
+DEFAULT_TTL = 30.0
+
+
+class ReadCache:
+    def __init__(self, ttl=None):
+        self.ttl = ttl if ttl is not None else float(os.environ.get(TTL_ENV, DEFAULT_TTL))
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, loader):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            generation = self._generation
+
+        value = loader()
+        with self._lock:
+            # Если пока шёл запрос что-то изменилось, результат мог устареть — не сохраняем
+            if generation == self._generation:
+                self._entries[key] = (time.monotonic() + self.ttl, value)
+        return value
+
+    def invalidate(self, *prefixes):
+        with self._lock:
+            self._generation += 1
+            for key in list(self._entries):
+                if any(key[:len(prefix)] == prefix for prefix in prefixes):
+                    del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def __str__(self):
+        total = self.hits + self.misses
+        ratio = self.hits * 100 / total if total else 0
+        return f"Кэш: {self.hits} из {total} ({ratio:.0f}%)"
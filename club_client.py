@@ -0,0 +1,293 @@
+import json
+import os
+import sys
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import namedtuple
+from datetime import datetime
+
+import cache
+import storage
+
+
+# Тонкий клиент сервера club_server.py: те же функции, что в club_data,
+# но вместо соединения с БД — HTTP-запросы. Адрес сервера берётся из
+# SPORTCLUB_SERVER (например, http://192.168.1.10:8765), общий ключ — из
+# SPORTCLUB_TOKEN. Чтение кэшируется так же, как в club_data (cache.ReadCache).
+
+SERVER_ENV = "SPORTCLUB_SERVER"
+TOKEN_ENV = "SPORTCLUB_TOKEN"
+TIMEOUT = 15.0
+DATE_FIELDS = ("birth_date",)
+
+DB_CACHE = cache.ReadCache()
+
+
+class ServerError(Exception):
+    pass
+
+
+def show_error(title, message):
+    print(f"{title}: {message}", file=sys.stderr)
+
+
+def show_warning(title, message):
+    print(f"{title}: {message}", file=sys.stderr)
+
+
+# --- 1. Запросы к серверу ---
+def server_url():
+    url = os.environ.get(SERVER_ENV, "").strip()
+    return url.rstrip("/") if url else None
+
+
+_row_types = {}
+
+
+def _row(data):
+    # Строки приходят словарями; в окне к полям обращаются как к атрибутам
+    fields = tuple(data)
+    cls = _row_types.get(fields)
+    if cls is None:
+        cls = _row_types[fields] = namedtuple("Row", fields, rename=True)
+    values = [datetime.fromisoformat(data[f]) if f in DATE_FIELDS and data[f] else data[f] for f in fields]
+    return cls(*values)
+
+
+def request(method, path, query=None, body=None):
+    url = server_url() + path
+    if query:
+        url += "?" + urllib.parse.urlencode({k: v for k, v in query.items() if v is not None})
+    headers = {"Accept": "application/json"}
+    data = None
+    if body is not None:
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        headers["Content-Type"] = "application/json; charset=utf-8"
+    token = os.environ.get(TOKEN_ENV)
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url, data, headers, method=method),
+                                    timeout=TIMEOUT) as response:
+            return json.loads(response.read().decode("utf-8"))
+    except urllib.error.HTTPError as e:
+        try:
+            error = json.loads(e.read().decode("utf-8"))
+            message = error["error"]
+        except (ValueError, KeyError):
+            error, message = {}, f"HTTP {e.code}"
+        if e.code == 409:
+            # Запись изменили с другой стойки: окно предложит объединить правки
+            raise storage.ConflictError(message, _row(error["current"]) if error.get("current") else None)
+        raise ServerError(message)
+    except (urllib.error.URLError, OSError) as e:
+        raise ServerError(f"сервер {server_url()} недоступен: {getattr(e, 'reason', e)}")
+
+
+def _rows(key, path, query=None):
+    return DB_CACHE.get(key, lambda: [_row(r) for r in request("GET", path, query)])
+
+
+def invalidate_rosters(*group_ids):
+    DB_CACHE.invalidate(("athletes", None), *[("athletes", group_id) for group_id in group_ids],
+                        *[("snapshot", group_id) for group_id in group_ids])
+
+
+class RosterSource:
+    # Источник для virtual_tree.VirtualTreeview: страницы списка спортсменов с сервера
+    def __init__(self, group_id=None):
+        self.group_id = group_id or None
+        self.cache_key = ("athletes", self.group_id, "pages")
+
+    def count(self):
+        return DB_CACHE.get(self.cache_key + ("count",), lambda: request(
+            "GET", "/roster", {"group": self.group_id, "limit": 0})["total"])
+
+    def page(self, offset, limit):
+        return DB_CACHE.get(self.cache_key + ("page", offset, limit), lambda: [_row(r) for r in request(
+            "GET", "/roster", {"group": self.group_id, "offset": offset, "limit": limit})["rows"]])
+
+
+# --- 2. Функции работы с данными (как в club_data) ---
+def load_groups():
+    try:
+        return _rows(("groups",), "/groups")
+    except Exception as e:
+        show_error("Ошибка", f"Ошибка загрузки групп: {str(e)}")
+        return []
+
+
+def load_all_athletes():
+    try:
+        return [_row(r) for r in request("GET", "/athletes")]
+    except Exception as e:
+        show_error("Ошибка", f"Ошибка загрузки спортсменов: {str(e)}")
+        return []
+
+
+def get_athlete(athlete_id):
+    try:
+        athlete = request("GET", f"/athletes/{athlete_id}")
+        return _row(athlete) if athlete else None
+    except Exception as e:
+        show_error("Ошибка", f"Ошибка загрузки спортсмена: {str(e)}")
+        return None
+
+
+def load_athletes(group_id=None):
+    try:
+        return DB_CACHE.get(("athletes", group_id or None, "all"), lambda: [_row(r) for r in request(
+            "GET", "/roster", {"group": group_id or None})["rows"]])
+    except Exception as e:
+        show_error("Ошибка", f"Ошибка загрузки спортсменов: {str(e)}")
+        return []
+
+
+def add_group(name, description):
+    try:
+        request("POST", "/groups", body={"name": name, "description": description})
+        DB_CACHE.invalidate(("groups",))
+        return True
+    except Exception as e:
+        show_error("Ошибка", f"Ошибка добавления группы: {str(e)}")
+        return False
+
+
+def update_group(group_id, name, description, row_version=None):
+    try:
+        request("PUT", f"/groups/{group_id}",
+                body={"name": name, "description": description, "row_version": row_version})
+        DB_CACHE.invalidate(("groups",))
+        return True
+    except storage.ConflictError:
+        DB_CACHE.invalidate(("groups",))
+        raise
+    except Exception as e:
+        show_error("Ошибка", f"Ошибка обновления группы: {str(e)}")
+        return False
+
+
+def delete_group(group_id):
+    try:
+        request("DELETE", f"/groups/{group_id}")
+        DB_CACHE.invalidate(("groups",))
+        invalidate_rosters(group_id)
+        return True
+    except Exception as e:
+        show_error("Ошибка", f"Ошибка удаления группы: {str(e)}")
+        return False
+
+
+def _athlete_body(name, birth_date, phone, group_id):
+    # Дата рождения приходит строкой YYYY-MM-DD или датой
+    if hasattr(birth_date, "isoformat"):
+        birth_date = birth_date.isoformat()
+    return {"name": name, "birth_date": birth_date,
+            "phone": phone, "group_id": group_id}
+
+
+def add_athlete(name, birth_date, phone, group_id, card_code=None):
+    try:
+        body = dict(_athlete_body(name, birth_date, phone, group_id), card_code=card_code)
+        athlete_id = request("POST", "/athletes", body=body)["athlete_id"]
+        invalidate_rosters(group_id)
+        return athlete_id
+    except Exception as e:
+        show_error("Ошибка", f"Ошибка добавления спортсмена: {str(e)}")
+        return False
+
+
+def update_athlete(athlete_id, name, birth_date, phone, group_id, card_code=None, row_version=None):
+    try:
+        request("PUT", f"/athletes/{athlete_id}",
+                body=dict(_athlete_body(name, birth_date, phone, group_id), card_code=card_code,
+                          row_version=row_version))
+        return True
+    except storage.ConflictError:
+        raise
+    except Exception as e:
+        show_error("Ошибка", f"Ошибка обновления спортсмена: {str(e)}")
+        return False
+    finally:
+        # Прежнюю группу клиент не знает: сбрасываются все списки
+        DB_CACHE.invalidate(("athletes",), ("snapshot",))
+
+
+def move_athlete(athlete_id, group_id, row_version=None):
+    try:
+        request("PUT", f"/athletes/{athlete_id}/group", body={"group_id": group_id, "row_version": row_version})
+        return True
+    except storage.ConflictError:
+        raise
+    except Exception as e:
+        show_error("Ошибка", f"Ошибка перевода спортсмена: {str(e)}")
+        return False
+    finally:
+        DB_CACHE.invalidate(("athletes",), ("snapshot",))
+
+
+def set_card_code(athlete_id, card_code, row_version=None):
+    try:
+        request("PUT", f"/athletes/{athlete_id}/card", body={"card_code": card_code, "row_version": row_version})
+        return True
+    except storage.ConflictError:
+        raise
+    except Exception as e:
+        show_error("Ошибка", f"Ошибка сохранения номера карты: {str(e)}")
+        return False
+    finally:
+        DB_CACHE.invalidate(("athletes",), ("snapshot",))
+
+
+def delete_athlete(athlete_id):
+    try:
+        request("DELETE", f"/athletes/{athlete_id}")
+        DB_CACHE.invalidate(("athletes",), ("snapshot",))
+        return True
+    except Exception as e:
+        show_error("Ошибка", f"Ошибка удаления спортсмена: {str(e)}")
+        return False
+
+
+def mark_payment(athlete_id, month_year):
+    marked, duplicates = mark_payments_bulk([athlete_id], month_year)
+    if duplicates:
+        show_warning("Ошибка", "Оплата за этот месяц уже зарегистрирована")
+    return bool(marked)
+
+
+def mark_payments_bulk(athlete_ids, month_year):
+    # Сервер собирает отметки с разных стоек в общие транзакции
+    try:
+        result = request("POST", "/payments", body={"month": month_year, "athlete_ids": list(athlete_ids)})
+        DB_CACHE.invalidate(("snapshot",))
+        return result["marked"], result["already_paid"]
+    except Exception as e:
+        show_error("Ошибка", f"Ошибка отметки оплат: {str(e)}")
+        return [], []
+
+
+def get_group_snapshot(group_id, month_year):
+    try:
+        return _rows(("snapshot", group_id, month_year), "/payments", {"group": group_id, "month": month_year})
+    except Exception as e:
+        show_error("Ошибка", f"Ошибка загрузки группы: {str(e)}")
+        return []
+
+
+def get_payment_stats(year):
+    try:
+        return [_row(r) for r in request("GET", "/stats", {"year": year})]
+    except Exception as e:
+        show_error("Ошибка", f"Ошибка загрузки статистики: {str(e)}")
+        return []
+
+
+def get_diagnostics(limit=None):
+    # Учёт запросов ведёт сервер: у тонкого клиента своих запросов к БД нет
+    return request("GET", "/diagnostics", {"limit": limit})
+
+
+def reset_diagnostics():
+    request("DELETE", "/diagnostics")
@@ -0,0 +1,630 @@
+import os
+import sys
+
+import backup_store
+import cache
+import migrations
+import payment_stats
+import periods
+import query_trace
+import search_index
+import storage
+
+
+# Функции работы с БД клуба без tkinter: ими пользуются окно SportClub.py
+# и командная строка sportclub_cli.py. Ошибки и предупреждения передаются
+# в show_error/show_warning: по умолчанию печатаются в stderr, окно подменяет
+# их на сообщения на экране.
+
+def show_error(title, message):
+    print(f"{title}: {message}", file=sys.stderr)
+
+
+def show_warning(title, message):
+    print(f"{title}: {message}", file=sys.stderr)
+
+
+# --- 1. Резервное копирование БД ---
+def backup_database(pool):
+    # Снимок работающей БД в backups/store: сохраняются только изменившиеся
+    # куски файла, старые снимки прореживаются (backup_store.py)
+    try:
+        return backup_store.backup_and_prune(pool)
+    except Exception as e:
+        show_error("Ошибка", f"Не удалось создать резервную копию: {str(e)}")
+        return False
+
+
+# --- 2. Подключение к БД ---
+DB_BACKEND = storage.get_backend(os.path.dirname(os.path.abspath(__file__)), "sportclub")
+DB_POOL = storage.get_pool(DB_BACKEND)
+DB_CACHE = cache.ReadCache()
+_db_ready = False
+
+
+def connect_db():
+    # Соединение берётся из пула; conn.close() возвращает его обратно
+    global _db_ready
+    if not _db_ready:
+        if not DB_BACKEND.exists():
+            try:
+                DB_BACKEND.create_database()
+            except Exception as e:
+                show_error("Ошибка", f"Не удалось создать БД: {str(e)}")
+                return None
+        try:
+            report = migrations.upgrade(DB_POOL, measure=False)
+            if report:
+                print(report, file=sys.stderr)  # в консоль: отчёт об обновлении схемы
+        except Exception as e:
+            show_error("Ошибка", f"Не удалось обновить схему БД: {str(e)}")
+            return None
+        _db_ready = True
+
+    try:
+        return DB_POOL.acquire()
+    except Exception as e:
+        show_error("Ошибка", f"Не удалось подключиться к БД: {str(e)}")
+        return None
+
+
+# --- 3. Функции работы с данными ---
+def cached_query(key, sql, params=()):
+    # Чтение через кэш; ошибки не кэшируются и передаются вызывающему
+    def select():
+        conn = connect_db()
+        if not conn:
+            raise storage.StorageError("нет соединения с БД")
+        try:
+            cursor = conn.cursor()
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+        finally:
+            conn.close()
+    return DB_CACHE.get(key, select)
+
+
+def invalidate_rosters(*group_ids):
+    # Списки спортсменов групп и общий список (group_id = None)
+    DB_CACHE.invalidate(("athletes", None), *[("athletes", group_id) for group_id in group_ids],
+                        *[("snapshot", group_id) for group_id in group_ids])
+
+
+def load_groups():
+    try:
+        return cached_query(("groups",), """
+            SELECT group_id, group_name, description, row_version FROM Groups ORDER BY group_name
+        """)
+    except Exception as e:
+        show_error("Ошибка", f"Ошибка загрузки групп: {str(e)}")
+        return []
+
+
+def load_all_athletes():
+    # Все спортсмены клуба с группой — для индекса поиска
+    conn = connect_db()
+    if not conn:
+        return []
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT athlete_id, name, birth_date, phone, current_group_id, card_code FROM Athletes")
+        return cursor.fetchall()
+    except Exception as e:
+        show_error("Ошибка", f"Ошибка загрузки спортсменов: {str(e)}")
+        return []
+    finally:
+        conn.close()
+
+
+def load_athletes(group_id=None):
+    try:
+        if group_id:
+            return cached_query(("athletes", group_id, "all"), """
+                SELECT athlete_id, name, birth_date, phone 
+                FROM Athletes 
+                WHERE current_group_id = ? 
+                ORDER BY name
+            """, (group_id,))
+        return cached_query(("athletes", None, "all"),
+                            "SELECT athlete_id, name, birth_date, phone FROM Athletes ORDER BY name")
+    except Exception as e:
+        show_error("Ошибка", f"Ошибка загрузки спортсменов: {str(e)}")
+        return []
+
+
+def get_athlete(athlete_id):
+    # Спортсмен в нынешнем виде, мимо кэша — для диалогов правки; None, если его удалили
+    conn = connect_db()
+    if not conn:
+        return None
+    try:
+        return _get_athlete(conn.cursor(), athlete_id)
+    except Exception as e:
+        show_error("Ошибка", f"Ошибка загрузки спортсмена: {str(e)}")
+        return None
+    finally:
+        conn.close()
+
+
+def _get_athlete(cursor, athlete_id):
+    cursor.execute("""
+        SELECT athlete_id, name, birth_date, phone, current_group_id, card_code, row_version
+        FROM Athletes WHERE athlete_id = ?
+    """, (athlete_id,))
+    return cursor.fetchone()
+
+
+def _get_group(cursor, group_id):
+    cursor.execute("SELECT group_id, group_name, description, row_version FROM Groups WHERE group_id = ?",
+                   (group_id,))
+    return cursor.fetchone()
+
+
+def _versioned(sql, params, row_version):
+    # Правка из диалога передаёт row_version, с которым строка была прочитана:
+    # UPDATE сработает, только если с тех пор её никто не менял
+    if row_version is None:
+        return sql, params
+    return sql + " AND row_version = ?", (*params, row_version)
+
+
+def merge_changes(original, mine, current):
+    # Трёхстороннее слияние при конфликте (словари полей формы): поля, которые
+    # правил пользователь, берутся из формы, остальные — из нынешней строки.
+    # -> (значения полей, поля, изменённые и здесь, и на другой стойке по-разному)
+    merged = {}
+    conflicts = []
+    for field, ours in mine.items():
+        before, theirs = original[field], current[field]
+        if ours != before:
+            merged[field] = ours
+            if theirs != before and theirs != ours:
+                conflicts.append(field)
+        else:
+            merged[field] = theirs
+    return merged, conflicts
+
+
+def roster_query(group_id=None):
+    # Постраничная выборка для списка спортсменов; athlete_id делает порядок однозначным.
+    # -> (sql, params, count_sql); ключи кэша те же, что у virtual_tree.QuerySource
+    where, params = ("WHERE current_group_id = ?", [group_id]) if group_id else ("", [])
+    return (f"SELECT athlete_id, name, birth_date, phone FROM Athletes {where} ORDER BY name, athlete_id",
+            params, f"SELECT COUNT(*) FROM Athletes {where}")
+
+
+def roster_count(group_id=None):
+    _, params, count_sql = roster_query(group_id)
+    return cached_query(("athletes", group_id or None, "pages", "count"), count_sql, params)[0][0]
+
+
+def roster_page(group_id, offset, limit):
+    sql, params, _ = roster_query(group_id)
+
+    def select():
+        conn = connect_db()
+        if not conn:
+            raise storage.StorageError("нет соединения с БД")
+        try:
+            return DB_BACKEND.fetch_page(conn.cursor(), sql, params, offset, limit)
+        finally:
+            conn.close()
+    return DB_CACHE.get(("athletes", group_id or None, "pages", "page", offset, limit), select)
+
+
+def known_athletes(athlete_ids):
+    # Какие из athlete_ids есть в БД — проверка перед отметкой оплат
+    conn = connect_db()
+    if not conn:
+        return set()
+    try:
+        cursor = conn.cursor()
+        ids = list(dict.fromkeys(athlete_ids))
+        found = set()
+        for start in range(0, len(ids), 100):
+            chunk = ids[start:start + 100]
+            cursor.execute(f"SELECT athlete_id FROM Athletes WHERE athlete_id IN ({', '.join('?' * len(chunk))})",
+                           chunk)
+            found.update(row[0] for row in cursor.fetchall())
+        return found
+    except Exception as e:
+        show_error("Ошибка", f"Ошибка загрузки спортсменов: {str(e)}")
+        return set()
+    finally:
+        conn.close()
+
+
+def add_group(name, description):
+    conn = connect_db()
+    if not conn:
+        return False
+    try:
+        cursor = conn.cursor()
+        cursor.execute("INSERT INTO Groups (group_name, description, row_version) VALUES (?, ?, 0)",
+                       (name, description))
+        conn.commit()
+        DB_CACHE.invalidate(("groups",))
+        return True
+    except Exception as e:
+        show_error("Ошибка", f"Ошибка добавления группы: {str(e)}")
+        return False
+    finally:
+        conn.close()
+
+
+def update_group(group_id, name, description, row_version=None):
+    # При row_version, устаревшем к моменту записи, — storage.ConflictError
+    conn = connect_db()
+    if not conn:
+        return False
+    try:
+        cursor = conn.cursor()
+        cursor.execute(*_versioned("""
+            UPDATE Groups 
+            SET group_name = ?, description = ?, row_version = row_version + 1 
+            WHERE group_id = ?
+        """, (name, description, group_id), row_version))
+        if cursor.rowcount == 0:
+            conn.rollback()
+            DB_CACHE.invalidate(("groups",))
+            raise storage.ConflictError("Группу изменили или удалили с другой стойки", _get_group(cursor, group_id))
+        conn.commit()
+        DB_CACHE.invalidate(("groups",))
+        return True
+    except storage.ConflictError:
+        raise
+    except Exception as e:
+        show_error("Ошибка", f"Ошибка обновления группы: {str(e)}")
+        return False
+    finally:
+        conn.close()
+
+
+def delete_group(group_id):
+    conn = connect_db()
+    if not conn:
+        return False
+    try:
+        cursor = conn.cursor()
+        # Вместе с группой удаляются её спортсмены, их оплаты и статистика
+        cursor.execute("""
+            DELETE FROM Payments 
+            WHERE athlete_id IN (SELECT athlete_id FROM Athletes WHERE current_group_id = ?)
+        """, (group_id,))
+        cursor.execute("DELETE FROM Athletes WHERE current_group_id = ?", (group_id,))
+        payment_stats.remove_group(cursor, group_id)
+        cursor.execute("DELETE FROM Groups WHERE group_id = ?", (group_id,))
+        conn.commit()
+        DB_CACHE.invalidate(("groups",))
+        invalidate_rosters(group_id)
+        return True
+    except Exception as e:
+        show_error("Ошибка", f"Ошибка удаления группы: {str(e)}")
+        return False
+    finally:
+        conn.close()
+
+
+def _card_code(card_code):
+    # Номер хранится в том виде, в каком его сравнивает поиск по карте;
+    # пустой — NULL («карты нет»): уникальны только выданные карты
+    return search_index.normalize_card(card_code) or None
+
+
+def _card_taken(card_code):
+    return f"Карта {card_code} уже выдана другому спортсмену"
+
+
+def add_athlete(name, birth_date, phone, group_id, card_code=None):
+    card_code = _card_code(card_code)
+    conn = connect_db()
+    if not conn:
+        return False
+    try:
+        cursor = conn.cursor()
+        cursor.execute("""
+            INSERT INTO Athletes (name, birth_date, phone, current_group_id, card_code, row_version) 
+            VALUES (?, ?, ?, ?, ?, 0)
+        """, (name, birth_date, phone, group_id, card_code))
+        athlete_id = DB_BACKEND.last_insert_id(cursor)
+        conn.commit()
+        invalidate_rosters(group_id)
+        return athlete_id
+    except DB_BACKEND.IntegrityError:
+        conn.rollback()
+        show_warning("Ошибка", _card_taken(card_code))
+        return False
+    except Exception as e:
+        show_error("Ошибка", f"Ошибка добавления спортсмена: {str(e)}")
+        return False
+    finally:
+        conn.close()
+
+
+def _athlete_conflict(conn, athlete_id):
+    # Строка в нынешнем виде читается тем же соединением: второе из пула
+    # могло бы не найтись, пока вызывающий держит это
+    conn.rollback()
+    DB_CACHE.invalidate(("athletes",), ("snapshot",))
+    current = _get_athlete(conn.cursor(), athlete_id)
+    raise storage.ConflictError("Спортсмена изменили или удалили с другой стойки", current)
+
+
+def update_athlete(athlete_id, name, birth_date, phone, group_id, card_code=None, row_version=None):
+    # Все поля формы правки одним UPDATE; при row_version, устаревшем
+    # к моменту записи, — storage.ConflictError
+    card_code = _card_code(card_code)
+    conn = connect_db()
+    if not conn:
+        return False
+    try:
+        cursor = conn.cursor()
+        old_group_id = payment_stats.athlete_group(cursor, athlete_id)
+        cursor.execute(*_versioned("""
+            UPDATE Athletes 
+            SET name = ?, birth_date = ?, phone = ?, current_group_id = ?, card_code = ?,
+                row_version = row_version + 1 
+            WHERE athlete_id = ?
+        """, (name, birth_date, phone, group_id, card_code, athlete_id), row_version))
+        if cursor.rowcount == 0:
+            _athlete_conflict(conn, athlete_id)
+        payment_stats.move_athlete(cursor, athlete_id, old_group_id, group_id)
+        conn.commit()
+        invalidate_rosters(old_group_id, group_id)
+        return True
+    except storage.ConflictError:
+        raise
+    except DB_BACKEND.IntegrityError:
+        conn.rollback()
+        show_warning("Ошибка", _card_taken(card_code))
+        return False
+    except Exception as e:
+        show_error("Ошибка", f"Ошибка обновления спортсмена: {str(e)}")
+        return False
+    finally:
+        conn.close()
+
+
+def move_athlete(athlete_id, group_id, row_version=None):
+    # Перевод в другую группу меняет только группу: остальные поля не перезаписываются
+    conn = connect_db()
+    if not conn:
+        return False
+    try:
+        cursor = conn.cursor()
+        old_group_id = payment_stats.athlete_group(cursor, athlete_id)
+        cursor.execute(*_versioned("""
+            UPDATE Athletes SET current_group_id = ?, row_version = row_version + 1 WHERE athlete_id = ?
+        """, (group_id, athlete_id), row_version))
+        if cursor.rowcount == 0:
+            _athlete_conflict(conn, athlete_id)
+        payment_stats.move_athlete(cursor, athlete_id, old_group_id, group_id)
+        conn.commit()
+        invalidate_rosters(old_group_id, group_id)
+        return True
+    except storage.ConflictError:
+        raise
+    except Exception as e:
+        show_error("Ошибка", f"Ошибка перевода спортсмена: {str(e)}")
+        return False
+    finally:
+        conn.close()
+
+
+def set_card_code(athlete_id, card_code, row_version=None):
+    # Номер клубной карты для стойки регистрации; None — карты нет.
+    # При устаревшем row_version — storage.ConflictError
+    card_code = _card_code(card_code)
+    conn = connect_db()
+    if not conn:
+        return False
+    try:
+        cursor = conn.cursor()
+        cursor.execute(*_versioned(
+            "UPDATE Athletes SET card_code = ?, row_version = row_version + 1 WHERE athlete_id = ?",
+            (card_code, athlete_id), row_version))
+        if cursor.rowcount == 0:
+            _athlete_conflict(conn, athlete_id)
+        group_id = payment_stats.athlete_group(cursor, athlete_id)
+        conn.commit()
+        invalidate_rosters(group_id)
+        return True
+    except storage.ConflictError:
+        raise
+    except DB_BACKEND.IntegrityError:
+        conn.rollback()
+        show_warning("Ошибка", _card_taken(card_code))
+        return False
+    except Exception as e:
+        show_error("Ошибка", f"Ошибка сохранения номера карты: {str(e)}")
+        return False
+    finally:
+        conn.close()
+
+
+def delete_athlete(athlete_id):
+    conn = connect_db()
+    if not conn:
+        return False
+    try:
+        cursor = conn.cursor()
+        group_id = payment_stats.athlete_group(cursor, athlete_id)
+        payment_stats.remove_athlete(cursor, athlete_id, group_id)
+        cursor.execute("DELETE FROM Payments WHERE athlete_id = ?", (athlete_id,))
+        cursor.execute("DELETE FROM Athletes WHERE athlete_id = ?", (athlete_id,))
+        conn.commit()
+        invalidate_rosters(group_id)
+        return True
+    except Exception as e:
+        show_error("Ошибка", f"Ошибка удаления спортсмена: {str(e)}")
+        return False
+    finally:
+        conn.close()
+
+
+def mark_payment(athlete_id, month_year):
+    conn = connect_db()
+    if not conn:
+        return False
+    try:
+        cursor = conn.cursor()
+        period = periods.month_key(month_year)
+        cursor.execute("""
+            INSERT INTO Payments (athlete_id, month_year, period, paid) 
+            VALUES (?, ?, ?, ?)
+        """, (athlete_id, month_year, period, True))
+        payment_stats.add_payments(cursor, period, payment_stats.athlete_group(cursor, athlete_id))
+        conn.commit()
+        DB_CACHE.invalidate(("snapshot",))
+        return True
+    except DB_BACKEND.IntegrityError:
+        show_warning("Ошибка", "Оплата за этот месяц уже зарегистрирована")
+        return False
+    except Exception as e:
+        show_error("Ошибка", f"Ошибка отметки оплаты: {str(e)}")
+        return False
+    finally:
+        conn.close()
+
+
+def _existing_payments(cursor, period, ids):
+    existing = set()
+    for start in range(0, len(ids), 100):
+        chunk = ids[start:start + 100]
+        cursor.execute(f"""
+            SELECT athlete_id FROM Payments 
+            WHERE period = ? AND athlete_id IN ({", ".join("?" * len(chunk))})
+        """, (period, *chunk))
+        existing.update(row[0] for row in cursor.fetchall())
+    return existing
+
+
+def mark_payments_bulk(athlete_ids, month_year):
+    # Отмечает оплату сразу нескольким спортсменам одной транзакцией.
+    # Возвращает (отмеченные id, id тех, у кого оплата уже была).
+    conn = connect_db()
+    if not conn:
+        return [], []
+    try:
+        cursor = conn.cursor()
+        period = periods.month_key(month_year)
+        ids = list(dict.fromkeys(athlete_ids))
+
+        # Между проверкой и вставкой оплату могла отметить другая стойка:
+        # тогда уникальный индекс (athlete_id, period) отклоняет пачку, и она
+        # повторяется один раз с перечитанными оплатами
+        for attempt in range(2):
+            existing = _existing_payments(cursor, period, ids)
+            new_ids = [aid for aid in ids if aid not in existing]
+            try:
+                if new_ids:
+                    cursor.executemany("""
+                        INSERT INTO Payments (athlete_id, month_year, period, paid) 
+                        VALUES (?, ?, ?, ?)
+                    """, [(aid, month_year, period, True) for aid in new_ids])
+                    payment_stats.add_athletes_payments(cursor, period, new_ids)
+                conn.commit()
+                break
+            except DB_BACKEND.IntegrityError:
+                conn.rollback()
+                if attempt:
+                    raise
+        DB_CACHE.invalidate(("snapshot",))
+        return new_ids, [aid for aid in ids if aid in existing]
+    except Exception as e:
+        show_error("Ошибка", f"Ошибка отметки оплат: {str(e)}")
+        return [], []
+    finally:
+        conn.close()
+
+
+def get_group_snapshot(group_id, month_year):
+    # Состав группы вместе с оплатой за месяц одним запросом: из него заполняются
+    # список спортсменов, таблица оплат и выбор спортсмена
+    period = periods.month_key(month_year)
+    try:
+        return cached_query(("snapshot", group_id, period), """
+            SELECT A.athlete_id, A.name, A.birth_date, A.phone,
+                   CASE WHEN P.paid = True THEN 'Да' ELSE 'Нет' END as paid
+            FROM Athletes A
+            LEFT JOIN Payments P ON A.athlete_id = P.athlete_id AND P.period = ?
+            WHERE A.current_group_id = ?
+            ORDER BY A.name, A.athlete_id
+        """, (period, group_id))
+    except Exception as e:
+        show_error("Ошибка", f"Ошибка загрузки группы: {str(e)}")
+        return []
+
+
+def get_payments_by_month(month_year, group_id=None):
+    conn = connect_db()
+    if not conn:
+        return []
+    try:
+        cursor = conn.cursor()
+        if group_id:
+            cursor.execute("""
+                SELECT A.athlete_id, A.name, 
+                       CASE WHEN P.paid = True THEN 'Да' ELSE 'Нет' END as paid
+                FROM Athletes A
+                LEFT JOIN Payments P ON A.athlete_id = P.athlete_id AND P.period = ?
+                WHERE A.current_group_id = ?
+                ORDER BY A.name
+            """, (periods.month_key(month_year), group_id))
+        else:
+            cursor.execute("""
+                SELECT A.athlete_id, A.name, 
+                       CASE WHEN P.paid = True THEN 'Да' ELSE 'Нет' END as paid
+                FROM Athletes A
+                LEFT JOIN Payments P ON A.athlete_id = P.athlete_id AND P.period = ?
+                ORDER BY A.name
+            """, (periods.month_key(month_year),))
+        return cursor.fetchall()
+    except Exception as e:
+        show_error("Ошибка", f"Ошибка загрузки платежей: {str(e)}")
+        return []
+    finally:
+        conn.close()
+
+
+def get_payment_stats(year):
+    conn = connect_db()
+    if not conn:
+        return []
+    try:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT period, SUM(payment_count) as payment_count
+            FROM PaymentStats
+            WHERE period BETWEEN ? AND ?
+            GROUP BY period
+            ORDER BY period
+        """, periods.year_range(year))
+        return cursor.fetchall()
+    except Exception as e:
+        show_error("Ошибка", f"Ошибка загрузки статистики: {str(e)}")
+        return []
+    finally:
+        conn.close()
+
+
+def get_all_athletes_for_payment(group_id):
+    try:
+        return cached_query(("athletes", group_id or None, "payment"), """
+            SELECT athlete_id, name 
+            FROM Athletes 
+            WHERE current_group_id = ?
+            ORDER BY name
+        """, (group_id,))
+    except Exception as e:
+        show_error("Ошибка", f"Ошибка загрузки спортсменов: {str(e)}")
+        return []
+
+
+# --- 4. Учёт запросов (query_trace) ---
+def get_diagnostics(limit=None):
+    return query_trace.TRACER.snapshot(limit)
+
+
+def reset_diagnostics():
+    query_trace.TRACER.reset()
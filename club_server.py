@@ -0,0 +1,445 @@
+import argparse
+import asyncio
+import hmac
+import json
+import os
+import re
+import sys
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from http import HTTPStatus
+
+import periods
+import storage
+
+
+# Сервер БД клуба для нескольких стоек: один процесс владеет базой,
+# окна (SportClub.py с SPORTCLUB_SERVER) ходят к нему по HTTP/JSON.
+#
+#   python club_server.py --host 0.0.0.0 --port 8765 --token секрет
+#
+#   GET    /groups                          список групп
+#   POST   /groups {name, description}
+#   PUT    /groups/<id> {name, description, row_version}
+#   DELETE /groups/<id>
+#   GET    /roster?group=&offset=&limit=    состав группы (без limit — целиком)
+#   GET    /athletes                        все спортсмены клуба (для поиска)
+#   GET    /athletes/<id>                   спортсмен в нынешнем виде (null, если удалён)
+#   POST   /athletes {name, birth_date, phone, group_id, card_code}
+#   PUT    /athletes/<id> {name, birth_date, phone, group_id, card_code, row_version}
+#   PUT    /athletes/<id>/group {group_id, row_version}   перевод в другую группу
+#   PUT    /athletes/<id>/card {card_code, row_version}
+#   DELETE /athletes/<id>
+#   GET    /payments?group=&month=          состав группы с оплатой за месяц
+#   POST   /payments {month, athlete_ids}   отметить оплату
+#   GET    /stats?year=                     число оплат по месяцам
+#   POST   /backup                          резервная копия
+#   GET    /status                          счётчики сервера
+#   GET    /diagnostics?limit=              самые затратные запросы к БД (query_trace)
+#   DELETE /diagnostics                     начать учёт запросов заново
+#
+# Чтение идёт параллельно в нескольких потоках, запись — в одном.
+# Отметки оплат, пришедшие почти одновременно с разных стоек, собираются
+# в пачку и записываются одной транзакцией. Правка с устаревшим row_version
+# отклоняется с кодом 409; в ответе — строка в нынешнем виде (current).
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+READ_THREADS = 4
+BATCH_WINDOW = 0.02  # с, сколько ждать следующих отметок перед записью пачки
+MAX_BODY = 1024 * 1024
+IDLE_TIMEOUT = 60  # с, сколько держать открытым соединение без запросов
+BACKUP_INTERVAL = 15 * 60  # с, автоматическая резервная копия
+
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        Exception.__init__(self, message)
+        self.status = status
+
+
+class DataError(Exception):
+    pass
+
+
+def _raise_error(title, message):
+    # Функции club_data при ошибке не печатают её, а прерывают запрос
+    raise DataError(message)
+
+
+def _raise_warning(title, message):
+    # Предупреждение club_data (повторная оплата, занятая карта) — ошибка запроса, 400
+    raise ValueError(message)
+
+
+def _json_default(value):
+    plain = storage.json_value(value)
+    if plain is value:
+        raise TypeError(f"{type(value).__name__} не сериализуется в JSON")
+    return plain
+
+
+def _dicts(rows):
+    return [storage.as_dict(row) for row in rows]
+
+
+def _int(values, name, default=None):
+    value = values.get(name, default)
+    if value is None or isinstance(value, int):
+        return value
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise HttpError(400, f"{name}: ожидается целое число")
+
+
+def _required(values, name):
+    value = values.get(name)
+    if value in (None, ""):
+        raise HttpError(400, f"не указано {name}")
+    return value
+
+
+def _month(values):
+    # Месяц приводится к виду YYYY-MM: по нему же собираются пачки отметок
+    value = _required(values, "month")
+    try:
+        return periods.month_label(periods.month_key(value))
+    except ValueError:
+        raise HttpError(400, f"неверный месяц: {value}")
+
+
+# --- 1. Пачки отметок оплат ---
+class PaymentBatcher:
+    def __init__(self, server):
+        self.server = server
+        self.queue = asyncio.Queue()
+        self.batches = 0
+        self.marks = 0
+
+    async def mark(self, month, athlete_ids):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((month, athlete_ids, future))
+        return await future
+
+    async def run(self):
+        # Пока пишется одна пачка, следующие отметки копятся в очереди
+        while True:
+            batch = [await self.queue.get()]
+            await asyncio.sleep(BATCH_WINDOW)
+            while not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            await self.flush(batch)
+
+    async def flush(self, batch):
+        by_month = {}
+        for month, athlete_ids, future in batch:
+            by_month.setdefault(month, []).append((list(dict.fromkeys(athlete_ids)), future))
+        for month, requests in by_month.items():
+            try:
+                marked, _ = await self.server.write(self.server.data.mark_payments_bulk,
+                                                    [i for ids, _ in requests for i in ids], month)
+            except Exception as e:
+                for _, future in requests:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self.batches += 1
+            self.marks += len(requests)
+            # Если одного спортсмена отметили с двух стоек, оплата засчитывается первой
+            fresh = set(marked)
+            for ids, future in requests:
+                mine = [i for i in ids if i in fresh]
+                fresh.difference_update(mine)
+                if not future.done():
+                    future.set_result((mine, [i for i in ids if i not in mine]))
+
+
+# --- 2. Сервер ---
+class ClubServer:
+    def __init__(self, data, token=None, read_threads=READ_THREADS):
+        self.data = data
+        self.token = token
+        self.readers = ThreadPoolExecutor(read_threads, thread_name_prefix="club-read")
+        self.writer = ThreadPoolExecutor(1, thread_name_prefix="club-write")
+        self.batcher = None
+        self.requests = 0
+        self.routes = [(method, re.compile(pattern), handler) for method, pattern, handler in (
+            ("GET", r"/groups", self.get_groups),
+            ("POST", r"/groups", self.post_group),
+            ("PUT", r"/groups/(\d+)", self.put_group),
+            ("DELETE", r"/groups/(\d+)", self.delete_group),
+            ("GET", r"/roster", self.get_roster),
+            ("GET", r"/athletes", self.get_athletes),
+            ("GET", r"/athletes/(\d+)", self.get_athlete),
+            ("POST", r"/athletes", self.post_athlete),
+            ("PUT", r"/athletes/(\d+)", self.put_athlete),
+            ("PUT", r"/athletes/(\d+)/group", self.put_athlete_group),
+            ("PUT", r"/athletes/(\d+)/card", self.put_card),
+            ("DELETE", r"/athletes/(\d+)", self.delete_athlete),
+            ("GET", r"/payments", self.get_payments),
+            ("POST", r"/payments", self.post_payments),
+            ("GET", r"/stats", self.get_stats),
+            ("POST", r"/backup", self.post_backup),
+            ("GET", r"/status", self.get_status),
+            ("GET", r"/diagnostics", self.get_diagnostics),
+            ("DELETE", r"/diagnostics", self.delete_diagnostics),
+        )]
+
+    async def read(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.readers, func, *args)
+
+    async def write(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.writer, func, *args)
+
+    # Обработчики: (параметры запроса, тело JSON, id из пути) -> данные для ответа
+    async def get_groups(self, query, body):
+        return _dicts(await self.read(self.data.load_groups))
+
+    async def post_group(self, query, body):
+        await self.write(self.data.add_group, _required(body, "name"), body.get("description", ""))
+        return {"ok": True}
+
+    async def put_group(self, query, body, group_id):
+        await self.write(self.data.update_group, int(group_id), _required(body, "name"), body.get("description", ""),
+                         _int(body, "row_version"))
+        return {"ok": True}
+
+    async def delete_group(self, query, body, group_id):
+        await self.write(self.data.delete_group, int(group_id))
+        return {"ok": True}
+
+    async def get_roster(self, query, body):
+        group_id = _int(query, "group")
+        limit = _int(query, "limit")
+        if limit is None:
+            rows = await self.read(self.data.load_athletes, group_id)
+            return {"total": len(rows), "rows": _dicts(rows)}
+        total = await self.read(self.data.roster_count, group_id)
+        rows = await self.read(self.data.roster_page, group_id, _int(query, "offset", 0), limit) if limit else []
+        return {"total": total, "rows": _dicts(rows)}
+
+    async def get_athletes(self, query, body):
+        return _dicts(await self.read(self.data.load_all_athletes))
+
+    async def get_athlete(self, query, body, athlete_id):
+        athlete = await self.read(self.data.get_athlete, int(athlete_id))
+        return storage.as_dict(athlete) if athlete is not None else None
+
+    async def post_athlete(self, query, body):
+        athlete_id = await self.write(self.data.add_athlete, _required(body, "name"), body.get("birth_date"),
+                                      body.get("phone"), _int(body, "group_id"), body.get("card_code"))
+        return {"athlete_id": athlete_id}
+
+    async def put_athlete(self, query, body, athlete_id):
+        await self.write(self.data.update_athlete, int(athlete_id), _required(body, "name"), body.get("birth_date"),
+                         body.get("phone"), _int(body, "group_id"), body.get("card_code"), _int(body, "row_version"))
+        return {"ok": True}
+
+    async def put_athlete_group(self, query, body, athlete_id):
+        group_id = _int(body, "group_id")
+        if group_id is None:
+            raise HttpError(400, "не указано group_id")
+        await self.write(self.data.move_athlete, int(athlete_id), group_id, _int(body, "row_version"))
+        return {"ok": True}
+
+    async def put_card(self, query, body, athlete_id):
+        await self.write(self.data.set_card_code, int(athlete_id), body.get("card_code"), _int(body, "row_version"))
+        return {"ok": True}
+
+    async def delete_athlete(self, query, body, athlete_id):
+        await self.write(self.data.delete_athlete, int(athlete_id))
+        return {"ok": True}
+
+    async def get_payments(self, query, body):
+        group_id = _int(query, "group")
+        if group_id is None:
+            raise HttpError(400, "не указано group")
+        return _dicts(await self.read(self.data.get_group_snapshot, group_id, _month(query)))
+
+    async def post_payments(self, query, body):
+        month = _month(body)
+        athlete_ids = body.get("athlete_ids")
+        if not isinstance(athlete_ids, list) or not all(isinstance(i, int) for i in athlete_ids):
+            raise HttpError(400, "athlete_ids: ожидается список целых чисел")
+        known = await self.read(self.data.known_athletes, athlete_ids)
+        unknown = [i for i in athlete_ids if i not in known]
+        if unknown:
+            raise HttpError(404, f"Нет спортсменов с id: {', '.join(map(str, unknown))}")
+        marked, duplicates = await self.batcher.mark(month, athlete_ids)
+        return {"month": month, "marked": marked, "already_paid": duplicates}
+
+    async def get_stats(self, query, body):
+        return _dicts(await self.read(self.data.get_payment_stats, _int(query, "year", datetime.now().year)))
+
+    async def post_backup(self, query, body):
+        result = await self.write(self.data.backup_database, self.data.DB_POOL)
+        return result._asdict()
+
+    async def get_status(self, query, body):
+        return {"requests": self.requests, "payment_batches": self.batcher.batches,
+                "payment_requests": self.batcher.marks, "cache": str(self.data.DB_CACHE)}
+
+    async def get_diagnostics(self, query, body):
+        return self.data.get_diagnostics(_int(query, "limit"))
+
+    async def delete_diagnostics(self, query, body):
+        self.data.reset_diagnostics()
+        return {"reset": True}
+
+    async def dispatch(self, method, target, headers, body):
+        if self.token and not hmac.compare_digest(headers.get("authorization", ""), f"Bearer {self.token}"):
+            raise HttpError(401, "неверный ключ доступа")
+        url = urllib.parse.urlsplit(target)
+        path = url.path.rstrip("/") or "/"
+        query = {key: values[-1] for key, values in urllib.parse.parse_qs(url.query).items()}
+        if body:
+            try:
+                body = json.loads(body.decode("utf-8"))
+            except ValueError:
+                raise HttpError(400, "тело запроса — не JSON")
+            if not isinstance(body, dict):
+                raise HttpError(400, "тело запроса должно быть объектом JSON")
+        else:
+            body = {}
+
+        path_found = False
+        for route_method, pattern, handler in self.routes:
+            match = pattern.fullmatch(path)
+            if match:
+                path_found = True
+                if route_method == method:
+                    return await handler(query, body, *match.groups())
+        if path_found:
+            raise HttpError(405, f"метод {method} не поддерживается для {path}")
+        raise HttpError(404, f"нет такого адреса: {path}")
+
+    async def respond(self, method, target, headers, body):
+        self.requests += 1
+        try:
+            return 200, await self.dispatch(method, target, headers, body)
+        except HttpError as e:
+            return e.status, {"error": str(e)}
+        except storage.ConflictError as e:
+            return 409, {"error": str(e), "current": storage.as_dict(e.current) if e.current is not None else None}
+        except ValueError as e:
+            return 400, {"error": str(e)}
+        except DataError as e:
+            return 500, {"error": str(e)}
+        except Exception as e:
+            print(f"{method} {target}: {e!r}", file=sys.stderr)
+            return 500, {"error": str(e)}
+
+    async def handle(self, reader, writer):
+        # HTTP/1.1 с keep-alive; каждая стойка держит своё соединение
+        try:
+            while True:
+                line = await asyncio.wait_for(reader.readline(), IDLE_TIMEOUT)
+                if not line.strip():
+                    break
+                parts = line.decode("latin-1").split()
+                if len(parts) != 3 or not parts[2].startswith("HTTP/"):
+                    await self.send(writer, 400, {"error": "неверная строка запроса"}, keep_alive=False)
+                    break
+                method, target, version = parts
+                headers = {}
+                while True:
+                    header = await reader.readline()
+                    if header in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = header.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                length = headers.get("content-length") or "0"
+                if not length.isdigit():
+                    status, payload = 400, {"error": "неверный Content-Length"}
+                    keep_alive = False
+                elif int(length) > MAX_BODY:
+                    status, payload = 413, {"error": "слишком большой запрос"}
+                    keep_alive = False
+                else:
+                    body = await reader.readexactly(int(length)) if int(length) else b""
+                    status, payload = await self.respond(method, target, headers, body)
+                    keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+
+                await self.send(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def send(self, writer, status, payload, keep_alive):
+        data = json.dumps(payload, ensure_ascii=False, default=_json_default).encode("utf-8")
+        writer.write((f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n"
+                      f"Content-Type: application/json; charset=utf-8\r\n"
+                      f"Content-Length: {len(data)}\r\n"
+                      f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n").encode("latin-1")
+                     + data)
+        await writer.drain()
+
+    async def auto_backup(self):
+        import backup_store
+        while True:
+            await asyncio.sleep(BACKUP_INTERVAL)
+            try:
+                result = await self.write(self.data.backup_database, self.data.DB_POOL)
+                print(backup_store.describe(result), flush=True)
+            except Exception as e:
+                print(f"Резервная копия не создана: {e}", file=sys.stderr, flush=True)
+
+    async def serve(self, host, port):
+        self.batcher = PaymentBatcher(self)
+        server = await asyncio.start_server(self.handle, host, port)
+        tasks = [asyncio.create_task(self.batcher.run()), asyncio.create_task(self.auto_backup())]
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for task in tasks:
+                task.cancel()
+            self.readers.shutdown(wait=False)
+            self.writer.shutdown(wait=True)
+
+
+# --- 3. Запуск ---
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Спортивный клуб: сервер БД для нескольких стоек")
+    parser.add_argument("--db", help="путь к файлу БД (по умолчанию sportclub.accdb/.db рядом с программой)")
+    parser.add_argument("--host", default=DEFAULT_HOST, help="адрес; 0.0.0.0 — принимать запросы из сети")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--token", default=os.environ.get("SPORTCLUB_TOKEN"),
+                        help="общий ключ доступа (по умолчанию из SPORTCLUB_TOKEN)")
+    parser.add_argument("--threads", type=int, default=READ_THREADS, help="потоков для чтения")
+    args = parser.parse_args(argv)
+
+    if args.db:
+        os.environ[storage.DB_PATH_ENV] = args.db
+        if args.db.lower().endswith(".accdb"):
+            os.environ.setdefault(storage.BACKEND_ENV, "access")
+
+    # Путь к БД club_data берёт при импорте, поэтому импорт — после разбора --db
+    import club_data
+    club_data.show_error = _raise_error
+    club_data.show_warning = _raise_warning
+
+    try:
+        club_data.connect_db().close()
+    except (DataError, storage.StorageError) as e:
+        print(f"Ошибка: {e}", file=sys.stderr)
+        return 1
+    if not args.token and args.host not in ("127.0.0.1", "localhost", "::1"):
+        print("Внимание: сервер доступен из сети без ключа (--token)", file=sys.stderr)
+
+    print(f"Сервер клуба: http://{args.host}:{args.port}, БД {club_data.DB_BACKEND.db_path}", flush=True)
+    try:
+        asyncio.run(ClubServer(club_data, args.token, args.threads).serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
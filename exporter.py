@@ -0,0 +1,211 @@
+import argparse
+import csv
+import os
+import sys
+import time
+
+import payment_history
+import storage
+
+
+# Строки читаются из курсора пачками (fetchmany) и сразу пишутся в файл,
+# поэтому память не зависит от объёма выгрузки.
+BATCH_SIZE = 5000
+
+
+# --- 1. Форматы файлов ---
+class XlsxWriter:
+    def __init__(self, filename):
+        import xlsxwriter
+        # constant_memory: каждая строка сбрасывается на диск сразу после записи
+        self.workbook = xlsxwriter.Workbook(filename, {
+            "constant_memory": True,
+            "default_date_format": "dd.mm.yyyy",
+        })
+        self.sheet = None
+        self.row = 0
+
+    def start_sheet(self, name, columns):
+        self.sheet = self.workbook.add_worksheet(name[:31])
+        self.sheet.write_row(0, 0, columns)
+        self.row = 1
+
+    def write_rows(self, rows):
+        for row in rows:
+            self.sheet.write_row(self.row, 0, row)
+            self.row += 1
+
+    def close(self):
+        self.workbook.close()
+
+
+class CsvWriter:
+    # Один лист на файл: для нескольких листов создаются файлы <имя>_<лист>.csv
+    def __init__(self, filename):
+        self.filename = filename
+        self.file = None
+        self.writer = None
+        self.sheets = 0
+
+    def start_sheet(self, name, columns):
+        if self.file:
+            self.file.close()
+        path = self.filename
+        if self.sheets:
+            base, ext = os.path.splitext(self.filename)
+            path = f"{base}_{name}{ext}"
+        self.sheets += 1
+        self.file = open(path, "w", newline="", encoding="utf-8-sig")
+        self.writer = csv.writer(self.file, delimiter=";")
+        self.writer.writerow(columns)
+
+    def write_rows(self, rows):
+        self.writer.writerows(rows)
+
+    def close(self):
+        if self.file:
+            self.file.close()
+
+
+class ParquetWriter:
+    # Требует pyarrow; каждая пачка строк пишется отдельной группой строк
+    def __init__(self, filename):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError("Для выгрузки в Parquet установите пакет pyarrow")
+        self.pa = pyarrow
+        self.pq = pyarrow.parquet
+        self.filename = filename
+        self.writer = None
+        self.columns = None
+        self.sheets = 0
+
+    def start_sheet(self, name, columns):
+        self.close()
+        path = self.filename
+        if self.sheets:
+            base, ext = os.path.splitext(self.filename)
+            path = f"{base}_{name}{ext}"
+        self.sheets += 1
+        self.path = path
+        self.columns = list(columns)
+
+    def write_rows(self, rows):
+        rows = list(rows)
+        if not rows:
+            return
+        table = self.pa.table({col: [row[i] for row in rows] for i, col in enumerate(self.columns)})
+        if self.writer is None:
+            self.writer = self.pq.ParquetWriter(self.path, table.schema)
+        self.writer.write_table(table)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+
+WRITERS = {
+    ".xlsx": XlsxWriter,
+    ".csv": CsvWriter,
+    ".parquet": ParquetWriter,
+}
+
+
+def open_writer(filename):
+    ext = os.path.splitext(filename)[1].lower()
+    if ext not in WRITERS:
+        raise ValueError(f"Неподдерживаемый формат файла: {ext}")
+    return WRITERS[ext](filename)
+
+
+# --- 2. Потоковая выгрузка ---
+def iter_batches(cursor, batch_size=BATCH_SIZE):
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            return
+        yield rows
+
+
+def export_sheets(filename, sheets, progress=None):
+    # sheets: [(имя листа, столбцы, источник строк)]; источник — итератор пачек строк
+    writer = open_writer(filename)
+    total = 0
+    started = time.perf_counter()
+    try:
+        for name, columns, batches in sheets:
+            writer.start_sheet(name, columns)
+            for rows in batches:
+                writer.write_rows(rows)
+                total += len(rows)
+                if progress:
+                    progress(total, time.perf_counter() - started)
+    finally:
+        writer.close()
+    return total
+
+
+def export_rows(filename, columns, rows, sheet_name="Данные"):
+    return export_sheets(filename, [(sheet_name, columns, [rows])])
+
+
+def export_query(pool, filename, sql, params, columns, sheet_name="Данные", progress=None):
+    conn = pool.acquire()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(sql, params)
+        return export_sheets(filename, [(sheet_name, columns, iter_batches(cursor))], progress)
+    finally:
+        conn.close()
+
+
+# --- 3. История оплат ---
+PAYMENT_HISTORY_COLUMNS = ["Месяц", "ФИО", "Группа", "Оплачено"]
+
+
+def _history_rows(pages):
+    for rows in pages:
+        yield [(r.month_year, r.name, r.group_name, "Да" if r.paid else "Нет") for r in rows]
+
+
+def export_payment_history(pool, filename, group_id=None, period_from=None, period_to=None, progress=None):
+    # Постранично по ключу (period, athlete_id): соединение не держится всю выгрузку
+    pages = payment_history.iter_pages(pool, group_id, BATCH_SIZE, period_from, period_to)
+    return export_sheets(filename, [("Оплаты", PAYMENT_HISTORY_COLUMNS, _history_rows(pages))], progress)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Выгрузка истории оплат в XLSX/CSV/Parquet")
+    parser.add_argument("file", help="файл результата: .xlsx, .csv или .parquet")
+    parser.add_argument("--db", help="путь к файлу БД")
+    parser.add_argument("--group", type=int, help="id группы")
+    parser.add_argument("--from", dest="period_from", help="с месяца, YYYY-MM")
+    parser.add_argument("--to", dest="period_to", help="по месяц, YYYY-MM")
+    args = parser.parse_args(argv)
+
+    if args.db:
+        os.environ[storage.DB_PATH_ENV] = args.db
+        if args.db.lower().endswith(".accdb"):
+            os.environ.setdefault(storage.BACKEND_ENV, "access")
+    backend = storage.get_backend(os.path.dirname(os.path.abspath(__file__)), "sportclub")
+    pool = storage.get_pool(backend)
+
+    last = [0]
+
+    def progress(total, elapsed):
+        if total - last[0] >= 100000:
+            last[0] = total
+            print(f"... {total} строк, {total / elapsed:.0f} строк/с")
+
+    started = time.perf_counter()
+    total = export_payment_history(pool, args.file, args.group, args.period_from, args.period_to, progress)
+    elapsed = time.perf_counter() - started
+    print(f"Выгружено {total} строк в {args.file} за {elapsed:.2f} с")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,325 @@
+import argparse
+import csv
+import os
+import sys
+import time
+from datetime import date, datetime
+
+import migrations
+import payment_stats
+import periods
+import storage
+
+
+# Заголовки столбцов во входном файле (регистр не важен)
+COLUMN_ALIASES = {
+    "group": ("group", "group_name", "группа"),
+    "name": ("name", "фио", "имя"),
+    "birth_date": ("birth_date", "birth", "дата рождения"),
+    "phone": ("phone", "телефон"),
+    "month": ("month", "month_year", "месяц", "оплата"),
+}
+
+
+# --- 1. Потоковое чтение файлов ---
+def _header_map(header):
+    mapping = {}
+    for index, title in enumerate(header):
+        title = str(title or "").strip().lower()
+        for field, aliases in COLUMN_ALIASES.items():
+            if title in aliases and field not in mapping:
+                mapping[field] = index
+    missing = [f for f in ("group", "name") if f not in mapping]
+    if missing:
+        raise ValueError(f"В файле нет обязательных столбцов: {', '.join(missing)}")
+    return mapping
+
+
+def iter_csv(path):
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        sample = f.read(4096)
+        f.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+        except csv.Error:
+            dialect = csv.excel
+        reader = csv.reader(f, dialect)
+        header = next(reader, None)
+        if header is None:
+            return
+        yield header
+        for row in reader:
+            yield row
+
+
+def iter_xlsx(path):
+    # read_only: openpyxl отдаёт строки по одной, не загружая лист целиком
+    from openpyxl import load_workbook
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        for row in workbook.active.iter_rows(values_only=True):
+            yield list(row)
+    finally:
+        workbook.close()
+
+
+def iter_rows(path):
+    if path.lower().endswith((".xlsx", ".xlsm")):
+        return iter_xlsx(path)
+    return iter_csv(path)
+
+
+# --- 2. Проверка строк ---
+def _parse_birth(value):
+    if value in (None, ""):
+        return None
+    if isinstance(value, (date, datetime)):
+        return value.strftime("%Y-%m-%d")
+    text = str(value).strip()
+    for fmt in ("%Y-%m-%d", "%d.%m.%Y", "%Y-%m-%d %H:%M:%S"):
+        try:
+            return datetime.strptime(text, fmt).strftime("%Y-%m-%d")
+        except ValueError:
+            pass
+    raise ValueError(f"неверная дата рождения: {text}")
+
+
+def _parse_months(value):
+    if value in (None, ""):
+        return []
+    if isinstance(value, (date, datetime)):
+        return [periods.month_key(value)]
+    keys = []
+    for part in str(value).replace(";", ",").split(","):
+        part = part.strip()
+        if part:
+            try:
+                keys.append(periods.month_key(part))
+            except (ValueError, IndexError):
+                raise ValueError(f"неверный месяц: {part}")
+    return keys
+
+
+def parse_row(row, mapping):
+    def cell(field):
+        index = mapping.get(field)
+        if index is None or index >= len(row) or row[index] is None:
+            return ""
+        return row[index]
+
+    name = str(cell("name")).strip()
+    group = str(cell("group")).strip()
+    if not name:
+        raise ValueError("не указано ФИО")
+    if not group:
+        raise ValueError("не указана группа")
+    return {
+        "name": name,
+        "group": group,
+        "birth_date": _parse_birth(cell("birth_date")),
+        "phone": str(cell("phone")).strip(),
+        "months": _parse_months(cell("month")),
+    }
+
+
+# --- 3. Импорт ---
+class ImportReport:
+    def __init__(self):
+        self.rows = 0
+        self.groups = 0
+        self.athletes = 0
+        self.payments = 0
+        self.duplicates = 0
+        self.rejected = 0
+        self.elapsed = 0.0
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+    def __str__(self):
+        return (f"Строк: {self.rows}, групп: {self.groups}, спортсменов: {self.athletes}, "
+                f"оплат: {self.payments}, повторных оплат: {self.duplicates}, отклонено: {self.rejected}\n"
+                f"Время: {self.elapsed:.2f} с, {self.rows_per_second:.0f} строк/с")
+
+
+class Importer:
+    def __init__(self, pool, batch_size=1000, dry_run=False, rejects_path=None):
+        self.pool = pool
+        self.backend = pool.backend
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self.rejects_path = rejects_path
+        self._rejects_file = None
+        self._rejects_writer = None
+        self._groups = {}
+        self._athletes = {}
+        self._existing_athletes = set()
+        self._fake_id = 0
+        self._dry_payments = set()
+
+    def _load_existing(self, conn):
+        cursor = conn.cursor()
+        cursor.execute("SELECT group_id, group_name FROM Groups")
+        for group_id, group_name in cursor.fetchall():
+            self._groups.setdefault((group_name or "").strip().lower(), group_id)
+        cursor.execute("SELECT athlete_id, name, birth_date, current_group_id FROM Athletes")
+        for athlete_id, name, birth_date, group_id in cursor.fetchall():
+            birth = birth_date.strftime("%Y-%m-%d") if isinstance(birth_date, (date, datetime)) else birth_date
+            key = ((name or "").strip().lower(), group_id, birth or None)
+            self._athletes.setdefault(key, athlete_id)
+            self._existing_athletes.add(athlete_id)
+
+    def _reject(self, header, row, reason, report):
+        report.rejected += 1
+        if self._rejects_writer is None:
+            self._rejects_file = open(self.rejects_path, "w", newline="", encoding="utf-8-sig")
+            self._rejects_writer = csv.writer(self._rejects_file, delimiter=";")
+            self._rejects_writer.writerow(["строка"] + list(header) + ["ошибка"])
+        self._rejects_writer.writerow([report.rows + 1] + ["" if v is None else v for v in row] + [reason])
+
+    def _new_id(self, cursor, sql, params):
+        if self.dry_run:
+            self._fake_id -= 1
+            return self._fake_id
+        cursor.execute(sql, params)
+        return self.backend.last_insert_id(cursor)
+
+    def _flush(self, conn, batch, report):
+        cursor = conn.cursor()
+        payments = []
+        created = []
+        for item in batch:
+            group_key = item["group"].lower()
+            group_id = self._groups.get(group_key)
+            if group_id is None:
+                group_id = self._new_id(cursor, "INSERT INTO Groups (group_name, description, row_version) VALUES (?, ?, 0)",
+                                        (item["group"], ""))
+                self._groups[group_key] = group_id
+                report.groups += 1
+
+            athlete_key = (item["name"].lower(), group_id, item["birth_date"])
+            athlete_id = self._athletes.get(athlete_key)
+            if athlete_id is None:
+                athlete_id = self._new_id(cursor, """
+                    INSERT INTO Athletes (name, birth_date, phone, current_group_id, row_version)
+                    VALUES (?, ?, ?, ?, 0)
+                """, (item["name"], item["birth_date"], item["phone"], group_id))
+                self._athletes[athlete_key] = athlete_id
+                created.append(athlete_id)
+                report.athletes += 1
+
+            for period in item["months"]:
+                payments.append((athlete_id, period, group_id))
+
+        # Уже существующие оплаты пропускаем: в БД проверяем только спортсменов,
+        # заведённых до этой пачки (у новых оплат в БД быть не может)
+        seen = set(self._dry_payments)
+        known = sorted({aid for aid, _, _ in payments if aid in self._existing_athletes})
+        for start in range(0, len(known), 100):
+            chunk = known[start:start + 100]
+            cursor.execute(f"""
+                SELECT athlete_id, period FROM Payments
+                WHERE athlete_id IN ({", ".join("?" * len(chunk))})
+            """, tuple(chunk))
+            seen.update((row[0], row[1]) for row in cursor.fetchall())
+
+        rows = []
+        stats = {}
+        for athlete_id, period, group_id in payments:
+            if (athlete_id, period) in seen:
+                report.duplicates += 1
+                continue
+            seen.add((athlete_id, period))
+            rows.append((athlete_id, periods.month_label(period), period, True))
+            stats[(period, group_id)] = stats.get((period, group_id), 0) + 1
+        report.payments += len(rows)
+
+        if self.dry_run:
+            self._dry_payments.update((r[0], r[2]) for r in rows)
+            return
+        if rows:
+            cursor.executemany("""
+                INSERT INTO Payments (athlete_id, month_year, period, paid)
+                VALUES (?, ?, ?, ?)
+            """, rows)
+            for (period, group_id), count in stats.items():
+                payment_stats.add_payments(cursor, period, group_id, count)
+        conn.commit()
+        self._existing_athletes.update(created)
+
+    def run(self, path, progress=None):
+        report = ImportReport()
+        started = time.perf_counter()
+        if self.rejects_path is None:
+            self.rejects_path = os.path.splitext(path)[0] + ".rejects.csv"
+
+        conn = self.pool.acquire()
+        try:
+            self._load_existing(conn)
+            rows = iter_rows(path)
+            header = next(rows, None)
+            if header is None:
+                return report
+            mapping = _header_map(header)
+
+            batch = []
+            flushes = 0
+            for row in rows:
+                if not any(v not in (None, "") for v in row):
+                    continue
+                try:
+                    batch.append(parse_row(row, mapping))
+                except ValueError as e:
+                    self._reject(header, row, str(e), report)
+                report.rows += 1
+
+                if len(batch) >= self.batch_size:
+                    self._flush(conn, batch, report)
+                    batch = []
+                    flushes += 1
+                    if progress and flushes % 10 == 0:
+                        report.elapsed = time.perf_counter() - started
+                        progress(report)
+            if batch:
+                self._flush(conn, batch, report)
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+            if self._rejects_file:
+                self._rejects_file.close()
+            report.elapsed = time.perf_counter() - started
+        return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Импорт спортсменов и оплат из CSV/XLSX")
+    parser.add_argument("file", help="CSV или XLSX со столбцами: группа, ФИО, дата рождения, телефон, месяц")
+    parser.add_argument("--db", help="путь к файлу БД")
+    parser.add_argument("--batch-size", type=int, default=1000, help="строк в одной транзакции")
+    parser.add_argument("--dry-run", action="store_true", help="только проверить файл, ничего не записывая")
+    parser.add_argument("--rejects", help="куда записать отклонённые строки (по умолчанию <файл>.rejects.csv)")
+    args = parser.parse_args(argv)
+
+    if args.db:
+        os.environ[storage.DB_PATH_ENV] = args.db
+        if args.db.lower().endswith(".accdb"):
+            os.environ.setdefault(storage.BACKEND_ENV, "access")
+    backend = storage.get_backend(os.path.dirname(os.path.abspath(__file__)), "sportclub")
+    if not backend.exists():
+        backend.create_database()
+    pool = storage.get_pool(backend)
+    migrations.upgrade(pool, measure=False)
+
+    importer = Importer(pool, batch_size=args.batch_size, dry_run=args.dry_run, rejects_path=args.rejects)
+    report = importer.run(args.file, progress=lambda r: print(f"... {r.rows} строк, {r.rows_per_second:.0f} строк/с"))
+    print(("Проверка без записи\n" if args.dry_run else "") + str(report))
+    if report.rejected:
+        print(f"Отклонённые строки: {importer.rejects_path}")
+    return 1 if report.rejected else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,314 @@
+import os
+import sys
+import time
+from datetime import datetime
+
+import payment_stats
+import periods
+import search_index
+import storage
+
+
+# --- 1. Шаги миграций ---
+def _create_index(table, name, columns, unique=False):
+    def step(conn, backend):
+        existing = backend.list_indexes(conn, table)
+        if name in existing:
+            return
+        # Не дублируем индекс, если такой же уже создан ограничением (NoDuplicatePayment)
+        for is_unique, cols in existing.values():
+            if [c.lower() for c in cols] == [c.lower() for c in columns] and (is_unique or not unique):
+                return
+        kind = "UNIQUE INDEX" if unique else "INDEX"
+        conn.cursor().execute(f"CREATE {kind} {name} ON {table} ({', '.join(columns)})")
+    return step
+
+
+def _remove_duplicate_payments(conn, backend):
+    # Перед уникальным индексом убираем повторные отметки, оставляя самую раннюю
+    conn.cursor().execute("""
+        DELETE FROM Payments
+        WHERE payment_id NOT IN (
+            SELECT MIN(payment_id) FROM Payments GROUP BY athlete_id, month_year
+        )
+    """)
+
+
+def _create_unique_index(table, name, column):
+    # Уникальность непустых значений: строк без значения может быть сколько угодно
+    def step(conn, backend):
+        if name not in backend.list_indexes(conn, table):
+            conn.cursor().execute(backend.unique_index_sql(table, name, column))
+    return step
+
+
+def _drop_index(table, name):
+    def step(conn, backend):
+        if name in backend.list_indexes(conn, table):
+            conn.cursor().execute(backend.drop_index_sql(table, name))
+    return step
+
+
+def _normalize_card_codes(conn, backend):
+    # Номер карты хранится так, как его сравнивает стойка регистрации
+    # (search_index.normalize_card), пустой — NULL («карты нет»). Карта,
+    # выданная нескольким спортсменам, остаётся у получившего её первым
+    notes = []
+    cursor = conn.cursor()
+    cursor.execute("SELECT athlete_id, name, card_code FROM Athletes WHERE card_code IS NOT NULL ORDER BY athlete_id")
+    owners = set()
+    updates = []
+    for athlete_id, name, card_code in cursor.fetchall():
+        code = search_index.normalize_card(card_code) or None
+        if code in owners:
+            notes.append(f"Снят повторный номер карты {card_code} у спортсмена {athlete_id} ({name})")
+            code = None
+        elif code is not None:
+            owners.add(code)
+        if code != card_code:
+            updates.append((code, athlete_id))
+    for start in range(0, len(updates), 1000):
+        conn.cursor().executemany("UPDATE Athletes SET card_code = ? WHERE athlete_id = ?",
+                                  updates[start:start + 1000])
+    return notes
+
+
+def _has_column(conn, table, column):
+    try:
+        conn.cursor().execute(f"SELECT {column} FROM {table} WHERE 1 = 0")
+        return True
+    except Exception:
+        conn.rollback()
+        return False
+
+
+def _add_column(table, column, column_type):
+    def step(conn, backend):
+        if not _has_column(conn, table, column):
+            conn.cursor().execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+            conn.commit()
+    return step
+
+
+def _fill_column(table, column, value):
+    def step(conn, backend):
+        conn.cursor().execute(f"UPDATE {table} SET {column} = ? WHERE {column} IS NULL", (value,))
+        conn.commit()  # следующий _add_column при проверке столбца делает rollback
+    return step
+
+
+def _fill_payment_periods(conn, backend):
+    # Переводим текстовый "YYYY-MM" в целый ключ yyyymm пачками
+    cursor = conn.cursor()
+    cursor.execute("SELECT payment_id, month_year FROM Payments WHERE period IS NULL")
+    rows = cursor.fetchall()
+    notes = []
+    updates = []
+    for payment_id, month_year in rows:
+        try:
+            updates.append((periods.month_key(month_year), payment_id))
+        except (TypeError, ValueError):
+            notes.append(f"Пропущена оплата {payment_id}: неверный месяц {month_year!r}")
+    for start in range(0, len(updates), 1000):
+        conn.cursor().executemany("UPDATE Payments SET period = ? WHERE payment_id = ?",
+                                  updates[start:start + 1000])
+    return notes
+
+
+def _create_table(table, ddl):
+    def step(conn, backend):
+        if not backend.table_exists(conn, table):
+            conn.cursor().execute(ddl)
+            conn.commit()
+    return step
+
+
+def _rebuild_payment_stats(conn, backend):
+    payment_stats.rebuild(conn)
+
+
+# Версия, описание, шаги. Шаг — функция (conn, backend); может вернуть
+# список замечаний, они попадут в отчёт upgrade.
+MIGRATIONS = [
+    (1, "Индексы по группе, спортсмену и месяцу; уникальность оплаты", [
+        _create_index("Athletes", "idx_athletes_group", ["current_group_id"]),
+        _remove_duplicate_payments,
+        # Составной индекс обслуживает и поиск по одному athlete_id
+        _create_index("Payments", "ux_payments_athlete_month", ["athlete_id", "month_year"], unique=True),
+        _create_index("Payments", "idx_payments_month", ["month_year"]),
+    ]),
+    (2, "Целочисленный ключ периода оплаты (yyyymm)", [
+        _add_column("Payments", "period", "INTEGER"),
+        _fill_payment_periods,
+        _create_index("Payments", "ux_payments_athlete_period", ["athlete_id", "period"], unique=True),
+        _create_index("Payments", "idx_payments_period", ["period"]),
+    ]),
+    (3, "Готовая статистика оплат по периодам и группам (PaymentStats)", [
+        _create_table("PaymentStats", """
+            CREATE TABLE PaymentStats (
+                period INTEGER,
+                group_id INTEGER,
+                payment_count INTEGER
+            )
+        """),
+        _create_index("PaymentStats", "ux_payment_stats", ["period", "group_id"], unique=True),
+        _rebuild_payment_stats,
+    ]),
+    (4, "Индекс для постраничного чтения истории оплат", [
+        # Порядок ORDER BY period DESC, athlete_id берётся прямо из индекса
+        _create_index("Payments", "idx_payments_period_athlete", ["period DESC", "athlete_id"]),
+    ]),
+    (5, "Номер клубной карты спортсмена", [
+        _add_column("Athletes", "card_code", "TEXT(50)"),
+        _create_index("Athletes", "idx_athletes_card", ["card_code"]),
+    ]),
+    (6, "Номер версии строки групп и спортсменов (проверка правок с разных стоек)", [
+        _add_column("Groups", "row_version", "INTEGER"),
+        _fill_column("Groups", "row_version", 0),
+        _add_column("Athletes", "row_version", "INTEGER"),
+        _fill_column("Athletes", "row_version", 0),
+    ]),
+    (7, "Номер клубной карты уникален", [
+        _normalize_card_codes,
+        _create_unique_index("Athletes", "ux_athletes_card", "card_code"),
+        _drop_index("Athletes", "idx_athletes_card"),
+    ]),
+]
+
+
+# --- 2. Версия схемы ---
+def _ensure_version_table(conn, backend):
+    if not backend.table_exists(conn, "schema_version"):
+        conn.cursor().execute("""
+            CREATE TABLE schema_version (
+                version INTEGER,
+                description TEXT(255),
+                applied_at DATETIME
+            )
+        """)
+        conn.commit()
+
+
+def current_version(conn, backend):
+    _ensure_version_table(conn, backend)
+    cursor = conn.cursor()
+    cursor.execute("SELECT MAX(version) FROM schema_version")
+    row = cursor.fetchone()
+    return row[0] or 0
+
+
+def pending_migrations(conn, backend):
+    version = current_version(conn, backend)
+    return [m for m in MIGRATIONS if m[0] > version]
+
+
+# --- 3. Замеры основных запросов ---
+MAIN_QUERIES = [
+    ("Оплаты группы за месяц", """
+        SELECT A.athlete_id, A.name, P.paid
+        FROM Athletes A
+        LEFT JOIN Payments P ON A.athlete_id = P.athlete_id AND P.month_year = ?
+        WHERE A.current_group_id = ?
+    """, ("month", "group")),
+    ("Неоплатившие за месяц", """
+        SELECT A.name FROM Athletes A
+        WHERE NOT EXISTS (
+            SELECT 1 FROM Payments P
+            WHERE P.athlete_id = A.athlete_id AND P.month_year = ?
+        ) AND A.current_group_id = ?
+    """, ("month", "group")),
+    ("Спортсмены группы", """
+        SELECT athlete_id, name, birth_date, phone FROM Athletes WHERE current_group_id = ?
+    """, ("group",)),
+    ("Оплаты за месяц по всем группам", """
+        SELECT COUNT(*) FROM Payments WHERE month_year = ?
+    """, ("month",)),
+    ("Статистика за год", """
+        SELECT period, COUNT(*) FROM Payments
+        WHERE period BETWEEN ? AND ? AND paid = True
+        GROUP BY period
+    """, ("year_from", "year_to")),
+]
+
+
+def time_main_queries(conn, repeat=3):
+    cursor = conn.cursor()
+    cursor.execute("SELECT MAX(month_year) FROM Payments")
+    month = cursor.fetchone()[0] or datetime.now().strftime("%Y-%m")
+    cursor.execute("SELECT MIN(current_group_id) FROM Athletes")
+    group = cursor.fetchone()[0] or 0
+    year_from, year_to = periods.year_range(month[:4])
+    values = {"month": month, "group": group, "year_from": year_from, "year_to": year_to}
+
+    timings = {}
+    for title, sql, param_names in MAIN_QUERIES:
+        params = tuple(values[name] for name in param_names)
+        best = None
+        try:
+            for _ in range(repeat):
+                started = time.perf_counter()
+                cursor.execute(sql, params)
+                cursor.fetchall()
+                elapsed = time.perf_counter() - started
+                best = elapsed if best is None else min(best, elapsed)
+        except Exception:
+            # Запрос опирается на столбцы, которых ещё нет в старой схеме
+            conn.rollback()
+        timings[title] = best * 1000 if best is not None else None
+    return timings
+
+
+def format_timings(before, after):
+    def cell(value, width):
+        return f"{value:>{width}.2f}" if value is not None else f"{'—':>{width}}"
+
+    lines = [f"{'Запрос':<36}{'до, мс':>10}{'после, мс':>12}"]
+    for title in before:
+        lines.append(f"{title:<36}{cell(before[title], 10)}{cell(after.get(title), 12)}")
+    return "\n".join(lines)
+
+
+# --- 4. Применение миграций ---
+def upgrade(pool, measure=True):
+    # Ничего не печатает: возвращает отчёт (замечания шагов, применённые
+    # миграции и замеры) или None, если схема уже актуальна
+    conn = pool.acquire()
+    backend = pool.backend
+    try:
+        pending = pending_migrations(conn, backend)
+        if not pending:
+            return None
+
+        before = time_main_queries(conn) if measure else {}
+        lines = []
+        for version, description, steps in pending:
+            for step in steps:
+                lines.extend(step(conn, backend) or [])
+            conn.cursor().execute(
+                "INSERT INTO schema_version (version, description, applied_at) VALUES (?, ?, ?)",
+                (version, description, datetime.now()))
+            conn.commit()
+            lines.append(f"Миграция {version} применена: {description}")
+        if measure:
+            lines.append(format_timings(before, time_main_queries(conn)))
+        return "\n".join(lines)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    # python migrations.py [путь к БД] — обновить файл на месте и показать замеры
+    if len(sys.argv) > 1:
+        os.environ[storage.DB_PATH_ENV] = sys.argv[1]
+        if sys.argv[1].lower().endswith(".accdb"):
+            os.environ.setdefault(storage.BACKEND_ENV, "access")
+    backend = storage.get_backend(os.path.dirname(os.path.abspath(__file__)), "sportclub")
+    if not backend.exists():
+        print(f"Файл БД не найден: {backend.db_path}")
+        sys.exit(1)
+    pool = storage.get_pool(backend)
+    report = upgrade(pool)
+    print(report if report is not None else "Схема уже актуальна")
@@ -0,0 +1,149 @@
+import periods
+
+
+# История оплат читается страницами по ключу (period, athlete_id): следующая
+# страница начинается строго после последней строки предыдущей. Такой запрос
+# идёт по индексу (period, athlete_id) и не пересчитывает пропущенные строки,
+# как OFFSET, сколько бы страниц ни было пройдено.
+
+PAGE_SIZE = 200
+
+
+def _filters(group_id=None, period_from=None, period_to=None):
+    where = []
+    params = []
+    if period_from is not None:
+        where.append("P.period >= ?")
+        params.append(periods.month_key(period_from))
+    if period_to is not None:
+        where.append("P.period <= ?")
+        params.append(periods.month_key(period_to))
+    if group_id:
+        where.append("A.current_group_id = ?")
+        params.append(group_id)
+    return where, params
+
+
+def _from_clause(where):
+    return """
+        FROM ((Payments AS P
+        INNER JOIN Athletes AS A ON P.athlete_id = A.athlete_id)
+        INNER JOIN Groups AS G ON A.current_group_id = G.group_id)
+    """ + (" WHERE " + " AND ".join(where) if where else "")
+
+
+def history_query(group_id=None, after=None, period_from=None, period_to=None):
+    # after — курсор (period, athlete_id) последней строки предыдущей страницы
+    where, params = _filters(group_id, period_from, period_to)
+    if after is not None:
+        period, athlete_id = after
+        # Граница period <= ? даёт поиск по индексу, а не просмотр с начала
+        where.append("P.period <= ? AND (P.period < ? OR P.athlete_id > ?)")
+        params += [period, period, athlete_id]
+    sql = ("SELECT P.period, P.athlete_id, P.month_year, A.name, G.group_name, P.paid"
+           + _from_clause(where) + " ORDER BY P.period DESC, P.athlete_id")
+    return sql, params
+
+
+def page_query(backend, group_id=None, after=None, page_size=PAGE_SIZE, period_from=None, period_to=None):
+    sql, params = history_query(group_id, after, period_from, period_to)
+    return backend.limit_query(sql, page_size), params
+
+
+def count_query(group_id=None, period_from=None, period_to=None):
+    where, params = _filters(group_id, period_from, period_to)
+    return "SELECT COUNT(*)" + _from_clause(where), params
+
+
+def page_cursor(row):
+    return (row.period, row.athlete_id)
+
+
+def get_page(conn, group_id=None, after=None, page_size=PAGE_SIZE, period_from=None, period_to=None):
+    # -> (строки, курсор следующей страницы); курсор None — история закончилась
+    sql, params = page_query(conn.backend, group_id, after, page_size, period_from, period_to)
+    cursor = conn.cursor()
+    cursor.execute(sql, params)
+    rows = cursor.fetchall()
+    next_cursor = page_cursor(rows[-1]) if len(rows) == page_size else None
+    return rows, next_cursor
+
+
+def count(conn, group_id=None, period_from=None, period_to=None):
+    sql, params = count_query(group_id, period_from, period_to)
+    cursor = conn.cursor()
+    cursor.execute(sql, params)
+    return cursor.fetchone()[0]
+
+
+def all_payments(conn, group_id=None):
+    # Вся история одним запросом (выгрузка вкладки «Все оплаты» в Excel)
+    where, params = _filters(group_id)
+    cursor = conn.cursor()
+    cursor.execute("SELECT P.month_year, A.name, G.group_name, P.paid" + _from_clause(where)
+                   + " ORDER BY P.period DESC", params)
+    return cursor.fetchall()
+
+
+def unpaid_names(conn, month, group_id):
+    # ФИО спортсменов группы без оплаты за месяц
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT A.name FROM Athletes A
+        WHERE NOT EXISTS (
+            SELECT 1 FROM Payments P
+            WHERE P.athlete_id = A.athlete_id AND P.period = ?
+        ) AND A.current_group_id = ?
+    """, (periods.month_key(month), group_id))
+    return [r.name for r in cursor.fetchall()]
+
+
+def iter_pages(pool, group_id=None, page_size=PAGE_SIZE, period_from=None, period_to=None):
+    # Соединение берётся на одну страницу: между страницами база не заблокирована
+    after = None
+    while True:
+        conn = pool.acquire()
+        try:
+            rows, after = get_page(conn, group_id, after, page_size, period_from, period_to)
+        finally:
+            conn.close()
+        if rows:
+            yield rows
+        if after is None:
+            return
+
+
+class HistorySource:
+    # Источник для виртуального списка (count/page). Страницы подряд читаются
+    # по курсору конца предыдущей страницы; при прыжке прокруткой в середину
+    # списка — один раз через смещение, дальше снова по курсору.
+    def __init__(self, pool, group_id=None, period_from=None, period_to=None):
+        self.pool = pool
+        self.group_id = group_id
+        self.period_from = period_from
+        self.period_to = period_to
+        self._cursors = {0: None}
+
+    def count(self):
+        # Вызывается при каждой (пере)загрузке списка: старые курсоры сбрасываем
+        self._cursors = {0: None}
+        conn = self.pool.acquire()
+        try:
+            return count(conn, self.group_id, self.period_from, self.period_to)
+        finally:
+            conn.close()
+
+    def page(self, offset, limit):
+        conn = self.pool.acquire()
+        try:
+            if offset in self._cursors:
+                rows, _ = get_page(conn, self.group_id, self._cursors[offset], limit,
+                                   self.period_from, self.period_to)
+            else:
+                sql, params = history_query(self.group_id, None, self.period_from, self.period_to)
+                rows = self.pool.backend.fetch_page(conn.cursor(), sql, params, offset, limit)
+        finally:
+            conn.close()
+        if rows:
+            self._cursors[offset + len(rows)] = page_cursor(rows[-1])
+        return rows
@@ -0,0 +1,138 @@
+import os
+import sys
+
+import storage
+
+
+# Таблица PaymentStats хранит готовые счётчики оплат по (период, группа).
+# Она обновляется в той же транзакции, что и Payments, поэтому вкладка
+# "Статистика" читает десяток строк вместо полного прохода по оплатам.
+# Спортсмен без группы учитывается в group_id = 0.
+
+# --- 1. Инкрементальное обновление ---
+def add_payments(cursor, period, group_id, count=1):
+    group_id = group_id or 0
+    cursor.execute("""
+        UPDATE PaymentStats SET payment_count = payment_count + ?
+        WHERE period = ? AND group_id = ?
+    """, (count, period, group_id))
+    if cursor.rowcount == 0 and count > 0:
+        cursor.execute("INSERT INTO PaymentStats (period, group_id, payment_count) VALUES (?, ?, ?)",
+                       (period, group_id, count))
+    elif count < 0:
+        cursor.execute("DELETE FROM PaymentStats WHERE period = ? AND group_id = ? AND payment_count <= 0",
+                       (period, group_id))
+
+
+def add_athletes_payments(cursor, period, athlete_ids):
+    # Новые оплаты нескольких спортсменов за один период: один запрос на пачку id
+    counts = {}
+    ids = list(athlete_ids)
+    for start in range(0, len(ids), 100):
+        chunk = ids[start:start + 100]
+        cursor.execute(f"""
+            SELECT current_group_id FROM Athletes
+            WHERE athlete_id IN ({", ".join("?" * len(chunk))})
+        """, tuple(chunk))
+        for row in cursor.fetchall():
+            counts[row[0] or 0] = counts.get(row[0] or 0, 0) + 1
+    for group_id, count in counts.items():
+        add_payments(cursor, period, group_id, count)
+
+
+def _athlete_periods(cursor, athlete_id):
+    cursor.execute("""
+        SELECT period, COUNT(*) AS payment_count FROM Payments
+        WHERE athlete_id = ? AND paid = True
+        GROUP BY period
+    """, (athlete_id,))
+    return cursor.fetchall()
+
+
+def remove_athlete(cursor, athlete_id, group_id):
+    for row in _athlete_periods(cursor, athlete_id):
+        add_payments(cursor, row.period, group_id, -row.payment_count)
+
+
+def move_athlete(cursor, athlete_id, old_group_id, new_group_id):
+    if (old_group_id or 0) == (new_group_id or 0):
+        return
+    for row in _athlete_periods(cursor, athlete_id):
+        add_payments(cursor, row.period, old_group_id, -row.payment_count)
+        add_payments(cursor, row.period, new_group_id, row.payment_count)
+
+
+def remove_group(cursor, group_id):
+    cursor.execute("DELETE FROM PaymentStats WHERE group_id = ?", (group_id,))
+
+
+def athlete_group(cursor, athlete_id):
+    cursor.execute("SELECT current_group_id FROM Athletes WHERE athlete_id = ?", (athlete_id,))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+# --- 2. Полный пересчёт и сверка ---
+def _aggregate(cursor):
+    cursor.execute("""
+        SELECT P.period, A.current_group_id, COUNT(*) AS payment_count
+        FROM Payments AS P INNER JOIN Athletes AS A ON P.athlete_id = A.athlete_id
+        WHERE P.paid = True
+        GROUP BY P.period, A.current_group_id
+    """)
+    totals = {}
+    for period, group_id, count in cursor.fetchall():
+        key = (period, group_id or 0)
+        totals[key] = totals.get(key, 0) + count
+    return totals
+
+
+def rebuild(conn):
+    cursor = conn.cursor()
+    totals = _aggregate(cursor)
+    cursor.execute("DELETE FROM PaymentStats")
+    if totals:
+        cursor.executemany("INSERT INTO PaymentStats (period, group_id, payment_count) VALUES (?, ?, ?)",
+                           [(period, group_id, count) for (period, group_id), count in totals.items()])
+    conn.commit()
+    return len(totals)
+
+
+def verify(conn):
+    # Список расхождений: (период, группа, в PaymentStats, по факту)
+    cursor = conn.cursor()
+    expected = _aggregate(cursor)
+    cursor.execute("SELECT period, group_id, payment_count FROM PaymentStats")
+    stored = {(period, group_id): count for period, group_id, count in cursor.fetchall()}
+    problems = []
+    for key in sorted(set(expected) | set(stored)):
+        if expected.get(key, 0) != stored.get(key, 0):
+            problems.append((key[0], key[1], stored.get(key, 0), expected.get(key, 0)))
+    return problems
+
+
+if __name__ == "__main__":
+    # python payment_stats.py rebuild|verify [путь к БД]
+    if len(sys.argv) < 2 or sys.argv[1] not in ("rebuild", "verify"):
+        print("Использование: python payment_stats.py rebuild|verify [путь к БД]")
+        sys.exit(2)
+    if len(sys.argv) > 2:
+        os.environ[storage.DB_PATH_ENV] = sys.argv[2]
+        if sys.argv[2].lower().endswith(".accdb"):
+            os.environ.setdefault(storage.BACKEND_ENV, "access")
+    import migrations
+    backend = storage.get_backend(os.path.dirname(os.path.abspath(__file__)), "sportclub")
+    pool = storage.get_pool(backend)
+    migrations.upgrade(pool, measure=False)
+    conn = pool.acquire()
+    try:
+        if sys.argv[1] == "rebuild":
+            print(f"Статистика пересчитана: {rebuild(conn)} строк")
+        else:
+            problems = verify(conn)
+            for period, group_id, stored, actual in problems:
+                print(f"{period} группа {group_id}: в таблице {stored}, по оплатам {actual}")
+            print("Расхождений нет" if not problems else f"Расхождений: {len(problems)}")
+            sys.exit(1 if problems else 0)
+    finally:
+        conn.close()
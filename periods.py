@@ -0,0 +1,40 @@
+import re
+from datetime import date, datetime
+
+
+# Период оплаты хранится целым числом yyyymm (2025-03 -> 202503):
+# такой ключ индексируется и сравнивается диапазоном без разбора строк.
+# Текст — только "YYYY-MM" или "YYYY-M" (хвост вроде "-15" у даты допустим)
+MONTH_RE = re.compile(r"^\s*(\d{4})-(\d{1,2})(?!\d)")
+
+
+def month_key(value):
+    if isinstance(value, int):
+        return value
+    if isinstance(value, (date, datetime)):
+        return value.year * 100 + value.month
+    match = MONTH_RE.match(str(value))
+    if match is None:
+        raise ValueError(f"Неверный месяц: {value}")
+    year, month = int(match.group(1)), int(match.group(2))
+    if not 1 <= month <= 12:
+        raise ValueError(f"Неверный месяц: {value}")
+    return year * 100 + month
+
+
+def month_label(period):
+    return f"{period // 100:04d}-{period % 100:02d}"
+
+
+def year_range(year):
+    year = int(year)
+    return year * 100 + 1, year * 100 + 12
+
+
+def period_month(period):
+    return period % 100
+
+
+def add_months(period, count):
+    index = (period // 100) * 12 + period % 100 - 1 + count
+    return (index // 12) * 100 + index % 12 + 1
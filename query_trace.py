@@ -0,0 +1,156 @@
+import bisect
+import json
+import os
+import re
+import threading
+from datetime import datetime
+from functools import lru_cache
+
+
+# Учёт запросов к БД: storage.PooledCursor сообщает сюда время каждого запроса
+# (выполнение вместе с чтением строк) и число строк, ConnectionPool — время
+# открытия соединения. Запросы группируются по шаблону: текст SQL без лишних
+# пробелов, литералов и длины списков IN (...). Запросы дольше порога
+# дописываются в журнал медленных запросов (без значений параметров:
+# в них ФИО и телефоны).
+#
+# SPORTCLUB_TRACE=0         — не вести учёт
+# SPORTCLUB_SLOW_MS=200     — порог медленного запроса, мс
+# SPORTCLUB_SLOW_LOG=путь   — журнал (по умолчанию slow_queries.log рядом с БД)
+
+TRACE_ENV = "SPORTCLUB_TRACE"
+SLOW_MS_ENV = "SPORTCLUB_SLOW_MS"
+SLOW_LOG_ENV = "SPORTCLUB_SLOW_LOG"
+DEFAULT_SLOW_MS = 200.0
+SLOW_LOG_NAME = "slow_queries.log"
+
+# Верхние границы корзин гистограммы, мс; последняя корзина — всё, что дольше
+BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+_WHITESPACE = re.compile(r"\s+")
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"(?<![\w.])\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\bIN \(\?(?:, \?)+\)", re.IGNORECASE)
+
+
+@lru_cache(maxsize=1024)
+def template(sql):
+    text = _WHITESPACE.sub(" ", sql).strip()
+    text = _STRING.sub("?", text)
+    text = _NUMBER.sub("?", text)
+    return _IN_LIST.sub("IN (?…)", text)
+
+
+class QueryStats:
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.rows = 0
+        self.buckets = [0] * (len(BUCKETS_MS) + 1)
+
+    def add(self, elapsed, rows=0, error=False):
+        ms = elapsed * 1000
+        self.count += 1
+        self.errors += error
+        self.total += ms
+        self.max = max(self.max, ms)
+        self.rows += rows
+        self.buckets[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+
+    def percentile(self, p):
+        # Верхняя граница корзины, в которую попал p-й процент вызовов
+        if not self.count:
+            return 0.0
+        need = p / 100 * self.count
+        seen = 0
+        for bound, n in zip(BUCKETS_MS, self.buckets):
+            seen += n
+            if seen >= need:
+                return min(float(bound), self.max)
+        return self.max
+
+    def as_dict(self):
+        return {
+            "query": self.name, "count": self.count, "errors": self.errors,
+            "total_ms": round(self.total, 3), "mean_ms": round(self.total / self.count, 3) if self.count else 0.0,
+            "p50_ms": self.percentile(50), "p95_ms": self.percentile(95), "max_ms": round(self.max, 3),
+            "rows": self.rows, "histogram": dict(zip([*map(str, BUCKETS_MS), "inf"], self.buckets)),
+        }
+
+
+class QueryTracer:
+    def __init__(self, enabled=None, slow_ms=None, slow_log=None):
+        self.enabled = os.environ.get(TRACE_ENV, "1") != "0" if enabled is None else enabled
+        self.slow_ms = float(os.environ.get(SLOW_MS_ENV, DEFAULT_SLOW_MS)) if slow_ms is None else slow_ms
+        self.slow_log = slow_log or os.environ.get(SLOW_LOG_ENV)
+        self._lock = threading.Lock()
+        self._log_lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._queries = {}
+            self._connects = QueryStats("открытие соединения")
+            self.since = datetime.now()
+
+    def set_default_log(self, directory):
+        # Вызывается из storage.get_pool: журнал — рядом с файлом БД
+        if self.slow_log is None:
+            self.slow_log = os.path.join(directory, SLOW_LOG_NAME)
+
+    def record(self, sql, elapsed, rows=0, error=False):
+        name = template(sql)
+        with self._lock:
+            stats = self._queries.get(name)
+            if stats is None:
+                stats = self._queries[name] = QueryStats(name)
+            stats.add(elapsed, rows, error)
+        if elapsed * 1000 >= self.slow_ms:
+            self._log_slow(name, elapsed, rows, error)
+
+    def record_connect(self, elapsed):
+        with self._lock:
+            self._connects.add(elapsed)
+
+    def _log_slow(self, name, elapsed, rows, error):
+        if not self.slow_log:
+            return
+        line = f"{datetime.now():%Y-%m-%d %H:%M:%S}\t{elapsed * 1000:.1f} мс\t{rows} строк\t"
+        line += ("ошибка\t" if error else "") + name + "\n"
+        try:
+            with self._log_lock, open(self.slow_log, "a", encoding="utf-8") as f:
+                f.write(line)
+        except OSError:
+            pass  # журнал не должен мешать работе
+
+    def snapshot(self, limit=None):
+        # -> словарь для JSON: запросы от самых затратных (по суммарному времени)
+        with self._lock:
+            queries = sorted((s.as_dict() for s in self._queries.values()), key=lambda q: -q["total_ms"])
+            connects = self._connects.as_dict()
+        return {"since": self.since.isoformat(timespec="seconds"), "slow_ms": self.slow_ms,
+                "slow_log": self.slow_log, "connects": connects, "queries": queries[:limit]}
+
+
+TRACER = QueryTracer()
+
+
+def format_report(snapshot, limit=15):
+    connects = snapshot["connects"]
+    lines = [f"Запросы с {snapshot['since']}; подключений: {connects['count']}, "
+             f"в среднем {connects['mean_ms']:.1f} мс, максимум {connects['max_ms']:.1f} мс",
+             f"{'всего, мс':>10}{'вызовов':>9}{'p50':>8}{'p95':>8}{'макс':>9}{'строк':>9}  запрос"]
+    for q in snapshot["queries"][:limit]:
+        lines.append(f"{q['total_ms']:>10.1f}{q['count']:>9}{q['p50_ms']:>8.1f}{q['p95_ms']:>8.1f}"
+                     f"{q['max_ms']:>9.1f}{q['rows']:>9}  {q['query'][:100]}")
+    if snapshot["slow_log"]:
+        lines.append(f"Медленные запросы (от {snapshot['slow_ms']:.0f} мс): {snapshot['slow_log']}")
+    return "\n".join(lines)
+
+
+def save(snapshot, path):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(snapshot, f, ensure_ascii=False, indent=2)
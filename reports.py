@@ -0,0 +1,164 @@
+import argparse
+import os
+import sys
+import time
+
+import exporter
+import periods
+import storage
+
+
+# Отчёт строится запросами к БД, а не из того, что показано в окне:
+# листы "Спортсмены", "Оплаты по месяцам" и "Статистика" для группы
+# (или всего клуба) за выбранный период.
+
+def month_range(period_from, period_to):
+    months = []
+    period = periods.month_key(period_from)
+    last = periods.month_key(period_to)
+    while period <= last:
+        months.append(period)
+        period = periods.add_months(period, 1)
+    return months
+
+
+def _group_filter(group_id, column="A.current_group_id"):
+    if group_id:
+        return f" AND {column} = ?", [group_id]
+    return "", []
+
+
+# --- 1. Листы отчёта ---
+def athletes_sheet(conn, group_id=None):
+    where, params = _group_filter(group_id)
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        SELECT A.athlete_id, A.name, A.birth_date, A.phone, G.group_name
+        FROM Athletes AS A LEFT JOIN Groups AS G ON A.current_group_id = G.group_id
+        WHERE 1 = 1{where}
+        ORDER BY A.name, A.athlete_id
+    """, params)
+    return ("Спортсмены", ["ID", "ФИО", "Дата рождения", "Телефон", "Группа"], exporter.iter_batches(cursor))
+
+
+def monthly_payments_sheet(conn, months, group_id=None):
+    # Сводная таблица: спортсмен × месяц. Один запрос (спортсмены с их оплатами
+    # за период) упорядочен по спортсмену, строки одного спортсмена сворачиваются
+    # на лету, без загрузки всех оплат в память
+    where, params = _group_filter(group_id)
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        SELECT A.athlete_id, A.name, G.group_name, P.period
+        FROM (Athletes AS A LEFT JOIN Groups AS G ON A.current_group_id = G.group_id)
+        LEFT JOIN (
+            SELECT athlete_id, period FROM Payments
+            WHERE period BETWEEN ? AND ? AND paid = True
+        ) AS P ON P.athlete_id = A.athlete_id
+        WHERE 1 = 1{where}
+        ORDER BY A.name, A.athlete_id
+    """, [months[0], months[-1]] + params)
+
+    column = {month: index for index, month in enumerate(months, 2)}
+
+    def batches():
+        current = None
+        for rows in exporter.iter_batches(cursor):
+            out = []
+            for athlete_id, name, group_name, period in rows:
+                if current is None or current[0] != athlete_id:
+                    if current is not None:
+                        out.append(current[1])
+                    current = (athlete_id, [name, group_name] + [""] * len(months))
+                if period is not None:
+                    current[1][column[period]] = "Да"
+            if out:
+                yield out
+        if current is not None:
+            yield [current[1]]
+
+    columns = ["ФИО", "Группа"] + [periods.month_label(m) for m in months]
+    return ("Оплаты по месяцам", columns, batches())
+
+
+def stats_sheet(conn, months, group_id=None):
+    where, params = _group_filter(group_id, "S.group_id")
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        SELECT S.period, G.group_name, S.payment_count
+        FROM PaymentStats AS S LEFT JOIN Groups AS G ON S.group_id = G.group_id
+        WHERE S.period BETWEEN ? AND ?{where}
+        ORDER BY S.period, G.group_name
+    """, [months[0], months[-1]] + params)
+
+    def batches():
+        for rows in exporter.iter_batches(cursor):
+            yield [(periods.month_label(period), group_name, count) for period, group_name, count in rows]
+
+    return ("Статистика", ["Месяц", "Группа", "Кол-во оплат"], batches())
+
+
+# --- 2. Сборка отчёта ---
+def payment_months(pool, group_id=None):
+    # Первый и последний месяц с оплатами (yyyymm) — период отчёта «за всё время»;
+    # (None, None), если оплат нет
+    where, params = _group_filter(group_id)
+    conn = pool.acquire()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT MIN(P.period), MAX(P.period)
+            FROM Payments AS P INNER JOIN Athletes AS A ON P.athlete_id = A.athlete_id
+            WHERE P.paid = True{where}
+        """, params)
+        first, last = cursor.fetchone()
+        return first, last
+    finally:
+        conn.close()
+
+
+def build_report(pool, filename, group_id=None, period_from=None, period_to=None, progress=None):
+    if period_to is None:
+        period_to = time.strftime("%Y-%m")
+    if period_from is None:
+        period_from = periods.add_months(periods.month_key(period_to), -11)
+    months = month_range(period_from, period_to)
+    if not months:
+        raise ValueError("Начало периода позже его конца")
+
+    conn = pool.acquire()
+    try:
+        # Запрос следующего листа выполняется только после записи предыдущего
+        factories = [
+            lambda: athletes_sheet(conn, group_id),
+            lambda: monthly_payments_sheet(conn, months, group_id),
+            lambda: stats_sheet(conn, months, group_id),
+        ]
+        return exporter.export_sheets(filename, (factory() for factory in factories), progress)
+    finally:
+        conn.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Отчёт по группе: спортсмены, оплаты по месяцам, статистика")
+    parser.add_argument("file", help="файл отчёта: .xlsx, .csv или .parquet")
+    parser.add_argument("--db", help="путь к файлу БД")
+    parser.add_argument("--group", type=int, help="id группы (по умолчанию — весь клуб)")
+    parser.add_argument("--from", dest="period_from", help="с месяца, YYYY-MM (по умолчанию — год назад)")
+    parser.add_argument("--to", dest="period_to", help="по месяц, YYYY-MM (по умолчанию — текущий)")
+    args = parser.parse_args(argv)
+
+    if args.db:
+        os.environ[storage.DB_PATH_ENV] = args.db
+        if args.db.lower().endswith(".accdb"):
+            os.environ.setdefault(storage.BACKEND_ENV, "access")
+    backend = storage.get_backend(os.path.dirname(os.path.abspath(__file__)), "sportclub")
+    pool = storage.get_pool(backend)
+
+    started = time.perf_counter()
+    total = build_report(pool, args.file, args.group, args.period_from, args.period_to)
+    print(f"Отчёт сохранён в {args.file}: {total} строк за {time.perf_counter() - started:.2f} с")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,151 @@
+import bisect
+import unicodedata
+from collections import namedtuple
+
+
+# Индекс поиска спортсменов по ФИО в памяти: триграммы для поиска подстроки
+# и отсортированный список слов для коротких запросов (по началу слова).
+# Для стойки регистрации — поиск по номеру карты, id и части телефона.
+# Обновляется вместе с изменениями в БД, поэтому поиск не ходит в базу.
+
+Athlete = namedtuple("Athlete", "athlete_id name birth_date phone current_group_id card_code",
+                     defaults=(None,))
+
+
+def normalize(text):
+    # Регистр, ё/е, й/и и латинские диакритики не различаются
+    text = unicodedata.normalize("NFKD", (text or "").casefold())
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return " ".join(text.split())
+
+
+def normalize_card(code):
+    return "".join(str(code or "").split()).casefold()
+
+
+def _digits(text):
+    return "".join(ch for ch in str(text or "") if ch.isdigit())
+
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class SearchIndex:
+    def __init__(self):
+        self.athletes = {}
+        self.ready = False
+        self._names = {}
+        self._groups = {}
+        self._trigrams = {}
+        self._words = []
+        self._cards = {}
+        self._phones = {}
+
+    def load(self, athletes):
+        self.athletes.clear()
+        self._names.clear()
+        self._groups.clear()
+        self._trigrams.clear()
+        self._words = []
+        self._cards.clear()
+        self._phones.clear()
+        for athlete in athletes:
+            self._add(Athlete(*athlete[:6]))
+        self._words.sort()
+        self.ready = True
+
+    def _add(self, athlete):
+        name = normalize(athlete.name)
+        self.athletes[athlete.athlete_id] = athlete
+        self._names[athlete.athlete_id] = name
+        self._groups.setdefault(athlete.current_group_id, set()).add(athlete.athlete_id)
+        if normalize_card(athlete.card_code):
+            self._cards[normalize_card(athlete.card_code)] = athlete.athlete_id
+        if _digits(athlete.phone):
+            self._phones[athlete.athlete_id] = _digits(athlete.phone)
+        for gram in _trigrams(f" {name} "):
+            self._trigrams.setdefault(gram, set()).add(athlete.athlete_id)
+        for word in name.split():
+            self._words.append((word, athlete.athlete_id))
+
+    def add(self, athlete):
+        self.remove(athlete.athlete_id)
+        name = normalize(athlete.name)
+        self._add(athlete)
+        for word in name.split():
+            # _add дописал слова в конец: переставляем на место
+            self._words.remove((word, athlete.athlete_id))
+            bisect.insort(self._words, (word, athlete.athlete_id))
+
+    def remove(self, athlete_id):
+        athlete = self.athletes.pop(athlete_id, None)
+        if athlete is None:
+            return
+        name = self._names.pop(athlete_id)
+        self._groups.get(athlete.current_group_id, set()).discard(athlete_id)
+        if self._cards.get(normalize_card(athlete.card_code)) == athlete_id:
+            del self._cards[normalize_card(athlete.card_code)]
+        self._phones.pop(athlete_id, None)
+        for gram in _trigrams(f" {name} "):
+            ids = self._trigrams.get(gram)
+            if ids is not None:
+                ids.discard(athlete_id)
+                if not ids:
+                    del self._trigrams[gram]
+        for word in name.split():
+            i = bisect.bisect_left(self._words, (word, athlete_id))
+            if i < len(self._words) and self._words[i] == (word, athlete_id):
+                del self._words[i]
+
+    def update(self, athlete_id, **fields):
+        athlete = self.athletes.get(athlete_id)
+        if athlete is not None:
+            self.add(athlete._replace(**fields))
+
+    def remove_group(self, group_id):
+        for athlete_id in list(self._groups.pop(group_id, ())):
+            self.remove(athlete_id)
+
+    def search(self, query, group_id=None):
+        # Спортсмены, в ФИО которых есть query; group_id=None — по всему клубу
+        query = normalize(query)
+        if not query:
+            return []
+        if len(query) < 3:
+            ids = set()
+            i = bisect.bisect_left(self._words, (query,))
+            while i < len(self._words) and self._words[i][0].startswith(query):
+                ids.add(self._words[i][1])
+                i += 1
+        else:
+            postings = sorted((self._trigrams.get(gram, set()) for gram in _trigrams(query)), key=len)
+            if group_id is not None:
+                postings.insert(0, self._groups.get(group_id, set()))
+            ids = set(postings[0]).intersection(*postings[1:])
+            ids = {i for i in ids if query in self._names[i]}
+        if group_id is not None:
+            ids &= self._groups.get(group_id, set())
+        found = [self.athletes[i] for i in ids]
+        found.sort(key=lambda a: (self._names[a.athlete_id], a.athlete_id))
+        return found
+
+    def card_owner(self, card_code):
+        athlete_id = self._cards.get(normalize_card(card_code))
+        return self.athletes.get(athlete_id)
+
+    def lookup(self, text):
+        # Стойка регистрации: номер карты, затем номер спортсмена (athlete_id),
+        # затем часть телефона (от 4 цифр). Возвращает всех подходящих.
+        text = str(text).strip()
+        athlete_id = self._cards.get(normalize_card(text))
+        if athlete_id is not None:
+            return [self.athletes[athlete_id]]
+        if text.isdigit() and int(text) in self.athletes:
+            return [self.athletes[int(text)]]
+        digits = _digits(text)
+        if len(digits) < 4:
+            return []
+        found = [self.athletes[i] for i, phone in self._phones.items() if digits in phone]
+        found.sort(key=lambda a: (self._names[a.athlete_id], a.athlete_id))
+        return found
@@ -0,0 +1,237 @@
+import argparse
+import csv
+import json
+import os
+import sys
+
+import periods
+import query_trace
+import search_index
+import storage
+
+
+# Работа с БД клуба без окна — для скриптов и заданий по расписанию:
+#
+#   python sportclub_cli.py groups
+#   python sportclub_cli.py athletes --group 3 --search иван --format csv
+#   python sportclub_cli.py payments 2024-05 --unpaid
+#   python sportclub_cli.py --format csv payments 2024-05 --unpaid
+#   python sportclub_cli.py payments 2024-05 --mark 12 15 18
+#   python sportclub_cli.py stats 2024
+#   python sportclub_cli.py export report.xlsx --from 2024-01 --to 2024-12
+#   python sportclub_cli.py backup
+#   python sportclub_cli.py import members.csv --dry-run
+#   python sportclub_cli.py --trace payments 2024-05 --unpaid
+#
+# --trace печатает в stderr самые затратные запросы к БД за время команды,
+# --trace-file файл.json сохраняет их в файл.
+# Результат — JSON (или CSV) в stdout, сообщения — в stderr.
+# Коды выхода: 0 — успешно, 1 — ошибка, 2 — неверные аргументы,
+# 3 — выполнено частично (отклонены строки импорта).
+
+EXIT_OK = 0
+EXIT_ERROR = 1
+EXIT_PARTIAL = 3  # 2 — неверные аргументы, его возвращает argparse
+
+
+class CliError(Exception):
+    pass
+
+
+def _raise_error(title, message):
+    # Функции club_data при ошибке не печатают её, а прерывают команду
+    raise CliError(message)
+
+
+# --- 1. Вывод ---
+def _plain(value, output_format):
+    if isinstance(value, list) and output_format == "csv":
+        return " ".join(map(str, value))
+    return storage.json_value(value)
+
+
+def write_output(result, output_format, stream=None):
+    stream = stream or sys.stdout
+    rows = [storage.as_dict(r) for r in result] if isinstance(result, list) else [storage.as_dict(result)]
+    rows = [{key: _plain(value, output_format) for key, value in row.items()} for row in rows]
+    if output_format == "csv":
+        if rows:
+            writer = csv.DictWriter(stream, fieldnames=list(rows[0]), lineterminator="\n")
+            writer.writeheader()
+            writer.writerows(rows)
+    else:
+        json.dump(rows if isinstance(result, list) else rows[0], stream, ensure_ascii=False, indent=2)
+        stream.write("\n")
+
+
+def write_trace(args):
+    # Учёт включён и без --trace; ключи только решают, куда его вывести
+    snapshot = query_trace.TRACER.snapshot()
+    if args.trace:
+        print(query_trace.format_report(snapshot), file=sys.stderr)
+    if args.trace_file:
+        query_trace.save(snapshot, args.trace_file)
+
+
+# --- 2. Команды ---
+def cmd_groups(data, args):
+    return data.load_groups()
+
+
+def cmd_athletes(data, args):
+    athletes = [search_index.Athlete(*a[:6]) for a in data.load_all_athletes()]
+    if args.search:
+        index = search_index.SearchIndex()
+        index.load(athletes)
+        athletes = index.search(args.search, args.group)
+    elif args.group:
+        athletes = [a for a in athletes if a.current_group_id == args.group]
+    athletes.sort(key=lambda a: (a.name or "", a.athlete_id))
+    return athletes
+
+
+def _month(value):
+    # Месяц приводится к виду YYYY-MM, как его хранит БД: 2024-5 -> 2024-05
+    try:
+        return periods.month_label(periods.month_key(value))
+    except ValueError:
+        raise CliError(f"Неверный месяц: {value} (ожидается YYYY-MM)")
+
+
+def cmd_payments(data, args):
+    args.month = _month(args.month)
+    if args.mark:
+        known = {a.athlete_id for a in data.load_all_athletes()}
+        unknown = [athlete_id for athlete_id in args.mark if athlete_id not in known]
+        if unknown:
+            raise CliError(f"Нет спортсменов с id: {', '.join(map(str, unknown))}")
+        marked, duplicates = data.mark_payments_bulk(args.mark, args.month)
+        return {"month": args.month, "marked": marked, "already_paid": duplicates}
+
+    rows = []
+    for group in data.load_groups():
+        if args.group and group.group_id != args.group:
+            continue
+        for athlete in data.get_group_snapshot(group.group_id, args.month):
+            paid = athlete.paid == "Да"
+            if args.unpaid and paid:
+                continue
+            rows.append({"athlete_id": athlete.athlete_id, "name": athlete.name,
+                         "group_id": group.group_id, "group_name": group.group_name,
+                         "month": args.month, "paid": paid})
+    return rows
+
+
+def cmd_stats(data, args):
+    return [{"month": periods.month_label(s.period), "payment_count": s.payment_count}
+            for s in data.get_payment_stats(args.year)]
+
+
+def cmd_export(data, args):
+    import reports
+    total = reports.build_report(data.DB_POOL, args.file, args.group, args.period_from, args.period_to)
+    return {"file": args.file, "rows": total}
+
+
+def cmd_backup(data, args):
+    result = data.backup_database(data.DB_POOL)
+    return result._asdict()
+
+
+def cmd_import(data, args):
+    import importer
+    job = importer.Importer(data.DB_POOL, batch_size=args.batch_size, dry_run=args.dry_run,
+                            rejects_path=args.rejects)
+    report = job.run(args.file)
+    result = {"file": args.file, "dry_run": args.dry_run, "rows": report.rows, "groups": report.groups,
+              "athletes": report.athletes, "payments": report.payments, "duplicates": report.duplicates,
+              "rejected": report.rejected, "elapsed": round(report.elapsed, 3)}
+    if report.rejected:
+        result["rejects_file"] = job.rejects_path
+    return result
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Спортивный клуб: работа с БД из командной строки")
+    parser.add_argument("--db", help="путь к файлу БД (по умолчанию sportclub.accdb/.db рядом с программой)")
+    parser.add_argument("--format", choices=("json", "csv"), default="json", help="формат вывода")
+    parser.add_argument("--trace", action="store_true", help="показать в stderr самые затратные запросы к БД")
+    parser.add_argument("--trace-file", metavar="FILE", help="сохранить учёт запросов к БД в JSON-файл")
+    # --format можно указать и после команды; SUPPRESS не даёт значению
+    # по умолчанию у команды затереть --format, указанный перед ней
+    output = argparse.ArgumentParser(add_help=False)
+    output.add_argument("--format", choices=("json", "csv"), default=argparse.SUPPRESS, help="формат вывода")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("groups", help="список групп", parents=[output]).set_defaults(func=cmd_groups)
+
+    athletes = commands.add_parser("athletes", help="список спортсменов", parents=[output])
+    athletes.add_argument("--group", type=int, help="id группы")
+    athletes.add_argument("--search", help="часть ФИО")
+    athletes.set_defaults(func=cmd_athletes)
+
+    payments = commands.add_parser("payments", help="оплаты за месяц или отметка оплат", parents=[output])
+    payments.add_argument("month", help="месяц, YYYY-MM")
+    payments.add_argument("--group", type=int, help="id группы")
+    payments.add_argument("--unpaid", action="store_true", help="только неоплатившие")
+    payments.add_argument("--mark", type=int, nargs="+", metavar="ID", help="отметить оплату этим спортсменам")
+    payments.set_defaults(func=cmd_payments)
+
+    stats = commands.add_parser("stats", help="число оплат по месяцам года", parents=[output])
+    stats.add_argument("year", type=int)
+    stats.set_defaults(func=cmd_stats)
+
+    export = commands.add_parser("export", help="отчёт: спортсмены, оплаты по месяцам, статистика", parents=[output])
+    export.add_argument("file", help="файл отчёта: .xlsx, .csv или .parquet")
+    export.add_argument("--group", type=int, help="id группы (по умолчанию — весь клуб)")
+    export.add_argument("--from", dest="period_from", help="с месяца, YYYY-MM")
+    export.add_argument("--to", dest="period_to", help="по месяц, YYYY-MM")
+    export.set_defaults(func=cmd_export)
+
+    commands.add_parser("backup", help="резервная копия БД", parents=[output]).set_defaults(func=cmd_backup)
+
+    import_ = commands.add_parser("import", help="импорт спортсменов и оплат из CSV/XLSX", parents=[output])
+    import_.add_argument("file")
+    import_.add_argument("--dry-run", action="store_true", help="только проверить файл")
+    import_.add_argument("--batch-size", type=int, default=1000, help="строк в одной транзакции")
+    import_.add_argument("--rejects", help="куда записать отклонённые строки")
+    import_.set_defaults(func=cmd_import)
+    return parser
+
+
+# --- 3. Запуск ---
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.db:
+        os.environ[storage.DB_PATH_ENV] = args.db
+        if args.db.lower().endswith(".accdb"):
+            os.environ.setdefault(storage.BACKEND_ENV, "access")
+
+    # Путь к БД club_data берёт при импорте, поэтому импорт — после разбора --db
+    import club_data
+    club_data.show_error = _raise_error
+
+    try:
+        if args.command != "import" and not club_data.DB_BACKEND.exists():
+            raise CliError(f"Файл БД не найден: {club_data.DB_BACKEND.db_path}")
+        club_data.connect_db().close()
+        result = args.func(club_data, args)
+    except (CliError, storage.StorageError, ValueError, OSError) as e:
+        print(f"Ошибка: {e}", file=sys.stderr)
+        return EXIT_ERROR
+    except ImportError as e:
+        # Необязательные модули: xlsxwriter, pyarrow (export), openpyxl (import)
+        message = f"не установлен модуль {e.name} (pip install {e.name})" if e.name else str(e)
+        print(f"Ошибка: {message}", file=sys.stderr)
+        return EXIT_ERROR
+    finally:
+        write_trace(args)
+
+    write_output(result, args.format)
+    if args.command == "import" and result["rejected"]:
+        return EXIT_PARTIAL
+    return EXIT_OK
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,86 @@
+import os
+import sys
+import time
+
+
+# Замер запуска: python SportClub.py --profile-startup перезапускает программу
+# с -X importtime, дожидается, пока на экране появится список групп, закрывает
+# окно и печатает, на что ушло время — самые долгие импорты и этапы запуска.
+
+PROFILE_FLAG = "--profile-startup"
+PROFILE_ENV = "SPORTCLUB_PROFILE_STARTUP"
+MARK_PREFIX = "startup-mark\t"
+TOP_IMPORTS = 15
+
+_started = time.perf_counter()
+_finished = False
+
+
+def active():
+    return os.environ.get(PROFILE_ENV) == "1"
+
+
+def mark(label):
+    # Этап запуска: время от импорта этого модуля (первая строка программы)
+    if active():
+        print(f"{MARK_PREFIX}{label}\t{time.perf_counter() - _started:.4f}", file=sys.stderr, flush=True)
+
+
+def finish(root):
+    # Вызывается после заполнения списка групп: в режиме замера закрывает окно
+    global _finished
+    if not active() or _finished:
+        return
+    _finished = True
+    root.update_idletasks()
+    mark("список групп на экране")
+    root.after_idle(root.destroy)
+
+
+def parse_importtime(lines):
+    # -> [(модуль, собственное время, с учётом вложенных, мкс)] для импортов верхнего уровня
+    import re
+    pattern = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)")
+    imports = []
+    for line in lines:
+        match = pattern.match(line)
+        if match and not match.group(3):
+            imports.append((match.group(4), int(match.group(1)), int(match.group(2))))
+    return imports
+
+
+def report(script, stderr, elapsed):
+    lines = stderr.splitlines()
+    imports = parse_importtime(lines)
+    marks = [line[len(MARK_PREFIX):].split("\t") for line in lines if line.startswith(MARK_PREFIX)]
+
+    print(f"Запуск {os.path.basename(script)}: {elapsed:.2f} с до закрытия окна")
+    print(f"Импорт модулей: {sum(total for _, _, total in imports) / 1e6:.3f} с")
+    print(f"{'Модуль':<40}{'всего, мс':>12}{'свой, мс':>12}")
+    for module, own, total in sorted(imports, key=lambda i: -i[2])[:TOP_IMPORTS]:
+        print(f"{module:<40}{total / 1000:>12.1f}{own / 1000:>12.1f}")
+    print("Этапы:")
+    for label, seconds in marks:
+        print(f"  {float(seconds):7.3f} с  {label}")
+    if not any(label == "список групп на экране" for label, _ in marks):
+        print("Окно не дошло до списка групп:")
+        print("\n".join(line for line in lines if not line.startswith(("import time:", MARK_PREFIX)))[-2000:])
+        return 1
+    return 0
+
+
+def main(script, argv=None):
+    # subprocess нужен только здесь: сам замер не должен удлинять запуск
+    import subprocess
+    argv = [arg for arg in (sys.argv[1:] if argv is None else argv) if arg != PROFILE_FLAG]
+    env = dict(os.environ, **{PROFILE_ENV: "1"})
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, "-X", "importtime", os.path.abspath(script), *argv],
+                            env=env, stderr=subprocess.PIPE, text=True, encoding="utf-8", errors="replace")
+    return report(script, result.stderr, time.perf_counter() - started)
+
+
+def handle_flag(script):
+    # В начале блока __main__: с --profile-startup вместо окна печатается отчёт
+    if PROFILE_FLAG in sys.argv:
+        sys.exit(main(script))
@@ -0,0 +1,669 @@
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from contextlib import contextmanager
+from datetime import date, datetime
+
+import query_trace
+
+
+# Движок выбирается переменной окружения: "access" или "sqlite".
+# По умолчанию на Windows используется Access, на остальных системах — SQLite.
+BACKEND_ENV = "SPORTCLUB_BACKEND"
+DB_PATH_ENV = "SPORTCLUB_DB"
+DEFAULT_BACKEND = "access" if os.name == "nt" else "sqlite"
+
+# Снимок SQLite копируется порциями по SNAPSHOT_PAGES страниц; если запись
+# с других соединений перезапускает копирование чаще SNAPSHOT_RESTARTS раз,
+# оставшееся копируется одним шагом
+SNAPSHOT_PAGES = 256
+SNAPSHOT_RESTARTS = 3
+
+
+# --- 1. Access (.accdb через ODBC) ---
+class AccessBackend:
+    name = "access"
+    extension = ".accdb"
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+
+    @property
+    def IntegrityError(self):
+        import pyodbc
+        return pyodbc.IntegrityError
+
+    def exists(self):
+        return os.path.exists(self.db_path)
+
+    def create_database(self):
+        import pythoncom
+        import win32com.client as win32
+
+        if os.path.exists(self.db_path):
+            os.remove(self.db_path)
+
+        pythoncom.CoInitialize()
+        try:
+            access_app = win32.Dispatch("Access.Application")
+            access_app.NewCurrentDatabase(self.db_path)
+            db = access_app.CurrentDb()
+
+            # Таблица групп
+            db.Execute("""
+            CREATE TABLE Groups (
+                group_id AUTOINCREMENT PRIMARY KEY,
+                group_name TEXT,
+                description MEMO
+            );
+            """)
+
+            # Таблица спортсменов
+            db.Execute("""
+            CREATE TABLE Athletes (
+                athlete_id AUTOINCREMENT PRIMARY KEY,
+                name TEXT,
+                birth_date DATETIME,
+                phone TEXT,
+                current_group_id LONG
+            );
+            """)
+
+            # Таблица оплаты
+            db.Execute("""
+            CREATE TABLE Payments (
+                payment_id AUTOINCREMENT PRIMARY KEY,
+                athlete_id LONG,
+                month_year TEXT,
+                paid YESNO,
+                CONSTRAINT NoDuplicatePayment UNIQUE (athlete_id, month_year)
+            );
+            """)
+
+            access_app.Quit()
+        finally:
+            pythoncom.CoUninitialize()
+
+    def connect(self):
+        import pyodbc
+        conn_str = (
+            r'DRIVER={Microsoft Access Driver (*.mdb, *.accdb)};'
+            f'DBQ={self.db_path};'
+        )
+        return pyodbc.connect(conn_str)
+
+    def last_insert_id(self, cursor):
+        cursor.execute("SELECT @@IDENTITY")
+        return int(cursor.fetchone()[0])
+
+    def limit_query(self, sql, limit):
+        # В Access нет LIMIT: первые строки отбираются через TOP
+        head, rest = sql.split("SELECT", 1)
+        return f"{head}SELECT TOP {int(limit)}{rest}"
+
+    def fetch_page(self, cursor, sql, params, offset, limit):
+        # В Access нет OFFSET: пропускаем строки на стороне драйвера
+        cursor.execute(sql, params)
+        if offset:
+            cursor.raw.skip(offset)
+        rows = cursor.fetchmany(limit)
+        cursor.close()  # остаток выборки не нужен (PooledCursor.close)
+        return rows
+
+    def snapshot(self, pool, target):
+        # Файл Access нельзя копировать, пока драйвер держит несброшенные страницы:
+        # закрываем свои соединения (это сбрасывает их на диск), на время
+        # копирования не выдаём новые и проверяем, что база не открыта с другой машины.
+        # Возвращает, сколько секунд запись была заблокирована.
+        with pool.exclusive():
+            started = time.perf_counter()
+            lock_path = os.path.splitext(self.db_path)[0] + ".laccdb"
+            if os.path.exists(lock_path):
+                raise StorageError("БД открыта в другой программе или на другом компьютере")
+            shutil.copy2(self.db_path, target)
+            return time.perf_counter() - started
+
+    def table_exists(self, conn, table):
+        return conn.raw.cursor().tables(table=table).fetchone() is not None
+
+    def list_indexes(self, conn, table):
+        # {имя индекса: (уникальный, [столбцы])}
+        indexes = {}
+        for row in conn.raw.cursor().statistics(table):
+            if row.index_name:
+                unique, columns = indexes.setdefault(row.index_name, (not row.non_unique, []))
+                columns.append(row.column_name)
+        return indexes
+
+    def unique_index_sql(self, table, name, column):
+        # Уникальный индекс, в котором не участвуют пустые (NULL) значения
+        return f"CREATE UNIQUE INDEX {name} ON {table} ({column}) WITH IGNORE NULL"
+
+    def drop_index_sql(self, table, name):
+        return f"DROP INDEX {name} ON {table}"
+
+
+# --- 2. SQLite (встроенный движок, режим WAL) ---
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS Groups (
+    group_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    group_name TEXT,
+    description TEXT
+);
+
+CREATE TABLE IF NOT EXISTS Athletes (
+    athlete_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT,
+    birth_date DATETIME,
+    phone TEXT,
+    current_group_id INTEGER
+);
+
+CREATE TABLE IF NOT EXISTS Payments (
+    payment_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    athlete_id INTEGER,
+    month_year TEXT,
+    paid BOOLEAN,
+    CONSTRAINT NoDuplicatePayment UNIQUE (athlete_id, month_year)
+);
+"""
+
+
+def _convert_datetime(value):
+    # Даты хранятся текстом; приводим к datetime, как это делает драйвер Access
+    text = value.decode("utf-8")
+    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d", "%d.%m.%Y"):
+        try:
+            return datetime.strptime(text, fmt)
+        except ValueError:
+            pass
+    return text
+
+
+sqlite3.register_converter("DATETIME", _convert_datetime)
+sqlite3.register_adapter(datetime, lambda d: d.strftime("%Y-%m-%d %H:%M:%S"))
+
+
+_row_classes = {}
+
+
+def _row_factory(cursor, row):
+    # Строки с доступом по имени столбца (row.name), как у pyodbc.Row
+    fields = tuple(d[0] for d in cursor.description)
+    cls = _row_classes.get(fields)
+    if cls is None:
+        cls = namedtuple("Row", fields, rename=True)
+        _row_classes[fields] = cls
+    return cls._make(row)
+
+
+class SQLiteBackend:
+    name = "sqlite"
+    extension = ".db"
+    IntegrityError = sqlite3.IntegrityError
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+
+    def exists(self):
+        return os.path.exists(self.db_path)
+
+    def create_database(self):
+        conn = self.connect()
+        try:
+            conn.executescript(SQLITE_SCHEMA)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def connect(self):
+        # Соединения живут в пуле и могут передаваться между потоками
+        conn = sqlite3.connect(self.db_path, detect_types=sqlite3.PARSE_DECLTYPES,
+                               check_same_thread=False, cached_statements=256)
+        conn.row_factory = _row_factory
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def last_insert_id(self, cursor):
+        return cursor.raw.lastrowid
+
+    def limit_query(self, sql, limit):
+        return f"{sql} LIMIT {int(limit)}"
+
+    def fetch_page(self, cursor, sql, params, offset, limit):
+        cursor.execute(f"{sql} LIMIT ? OFFSET ?", list(params) + [limit, offset])
+        return cursor.fetchall()
+
+    def snapshot(self, pool, target):
+        # Постраничная копия через backup API. В режиме WAL чтение не мешает
+        # записи, поэтому писатели не блокируются вовсе; копия соответствует
+        # одному зафиксированному состоянию базы.
+        class Restarted(Exception):
+            pass
+
+        state = {"remaining": None, "restarts": 0}
+
+        def progress(status, remaining, total):
+            if state["remaining"] is not None and remaining > state["remaining"]:
+                state["restarts"] += 1
+                if state["restarts"] > SNAPSHOT_RESTARTS:
+                    raise Restarted()
+            state["remaining"] = remaining
+
+        source = sqlite3.connect(self.db_path)
+        copy = sqlite3.connect(target)
+        try:
+            try:
+                source.backup(copy, pages=SNAPSHOT_PAGES, progress=progress)
+            except Restarted:
+                source.backup(copy)
+        finally:
+            copy.close()
+            source.close()
+        return 0.0
+
+    def table_exists(self, conn, table):
+        cursor = conn.raw.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,))
+        return cursor.fetchone() is not None
+
+    def list_indexes(self, conn, table):
+        indexes = {}
+        for row in conn.raw.execute(f"PRAGMA index_list({table})").fetchall():
+            columns = [info[2] for info in conn.raw.execute(f"PRAGMA index_info({row[1]})").fetchall()]
+            indexes[row[1]] = (bool(row[2]), columns)
+        return indexes
+
+    def unique_index_sql(self, table, name, column):
+        return f"CREATE UNIQUE INDEX {name} ON {table} ({column}) WHERE {column} IS NOT NULL AND {column} <> ''"
+
+    def drop_index_sql(self, table, name):
+        return f"DROP INDEX {name}"
+
+
+BACKENDS = {
+    AccessBackend.name: AccessBackend,
+    SQLiteBackend.name: SQLiteBackend,
+}
+
+
+# --- 3. Выбор движка ---
+def get_backend(base_dir, base_name, kind=None):
+    # base_name — имя файла БД без расширения ("sportclub", "database")
+    kind = (kind or os.environ.get(BACKEND_ENV) or DEFAULT_BACKEND).lower()
+    if kind not in BACKENDS:
+        raise ValueError(f"Неизвестный движок БД: {kind}")
+    backend_cls = BACKENDS[kind]
+    db_path = os.environ.get(DB_PATH_ENV) or os.path.join(base_dir, base_name + backend_cls.extension)
+    return backend_cls(db_path)
+
+
+# --- 4. Пул соединений ---
+class StorageError(Exception):
+    pass
+
+
+class ConflictError(StorageError):
+    # Запись изменили с другой стойки после того, как её прочитали:
+    # current — строка в нынешнем виде (None, если её удалили)
+    def __init__(self, message, current=None):
+        StorageError.__init__(self, message)
+        self.current = current
+
+
+class _PooledEntry:
+    # Физическое соединение и кэш подготовленных запросов к нему
+    def __init__(self, raw, statement_cache_size, tracer=None):
+        self.raw = raw
+        self.statements = OrderedDict()
+        self.statement_cache_size = statement_cache_size
+        self.pending = set()  # запросы, чьи строки могли остаться непрочитанными
+        self.tracer = tracer or query_trace.TRACER
+        self.last_used = time.monotonic()
+
+    def cursor_for(self, sql):
+        # pyodbc не готовит запрос повторно, если курсор исполняет тот же текст SQL,
+        # поэтому держим по курсору на каждый параметризованный запрос
+        cursor = self.statements.get(sql)
+        if cursor is not None:
+            self.statements.move_to_end(sql)
+            return cursor
+        cursor = self.raw.cursor()
+        self.statements[sql] = cursor
+        if len(self.statements) > self.statement_cache_size:
+            old_sql, old = self.statements.popitem(last=False)
+            self.pending.discard(old_sql)
+            try:
+                old.close()
+            except Exception:
+                pass
+        return cursor
+
+    def discard(self, sql):
+        self.pending.discard(sql)
+        cursor = self.statements.pop(sql, None)
+        if cursor is not None:
+            try:
+                cursor.close()
+            except Exception:
+                pass
+
+    def reset_pending(self):
+        # Недочитанный SELECT держит в SQLite транзакцию чтения: следующий
+        # владелец соединения не увидел бы записанного через другие соединения.
+        # Такие курсоры закрываем (SQLite всё равно кэширует запросы сам)
+        for sql in list(self.pending):
+            self.discard(sql)
+
+    def close(self):
+        for cursor in self.statements.values():
+            try:
+                cursor.close()
+            except Exception:
+                pass
+        self.statements.clear()
+        try:
+            self.raw.close()
+        except Exception:
+            pass
+
+
+class PooledCursor:
+    # Время запроса для query_trace считается от execute до последней прочитанной
+    # строки (SQLite выполняет SELECT по мере чтения) и записывается, когда строки
+    # кончились, курсор закрыт, выполняет следующий запрос или удалён
+    def __init__(self, entry):
+        self._entry = entry
+        self._cursor = None
+        self._sql = None
+        self._call = None  # [sql, затраченное время, строк] текущего запроса
+
+    def _run(self, method, sql, params):
+        self._finish()
+        self._cursor = self._entry.cursor_for(sql)
+        self._sql = sql
+        tracer = self._entry.tracer
+        started = time.perf_counter()
+        try:
+            getattr(self._cursor, method)(sql, params)
+        except Exception:
+            if tracer.enabled:
+                tracer.record(sql, time.perf_counter() - started, error=True)
+            raise
+        if self._cursor.description is not None:
+            self._entry.pending.add(sql)
+        if tracer.enabled:
+            # Для INSERT/UPDATE/DELETE строки — число изменённых
+            rows = max(self._cursor.rowcount, 0) if self._cursor.description is None else 0
+            self._call = [sql, time.perf_counter() - started, rows]
+        return self
+
+    def _fetched(self, started, rows, done):
+        if done:
+            self._entry.pending.discard(self._sql)
+        call = self._call
+        if call is not None:
+            call[1] += time.perf_counter() - started
+            call[2] += rows
+            if done:
+                self._finish()
+
+    def _finish(self):
+        call, self._call = self._call, None
+        if call is not None:
+            self._entry.tracer.record(*call)
+
+    def execute(self, sql, params=()):
+        return self._run("execute", sql, params)
+
+    def executemany(self, sql, seq_of_params):
+        return self._run("executemany", sql, seq_of_params)
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = self._cursor.fetchone()
+        self._fetched(started, row is not None, row is None)
+        return row
+
+    def fetchmany(self, size):
+        started = time.perf_counter()
+        rows = self._cursor.fetchmany(size)
+        self._fetched(started, len(rows), len(rows) < size)
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = self._cursor.fetchall()
+        self._fetched(started, len(rows), True)
+        return rows
+
+    def __iter__(self):
+        # Время между строками уходит на обработку у вызывающего — считаем только строки
+        for row in self._cursor:
+            if self._call is not None:
+                self._call[2] += 1
+            yield row
+        self._entry.pending.discard(self._sql)
+        self._finish()
+
+    @property
+    def description(self):
+        return self._cursor.description if self._cursor else None
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount if self._cursor else -1
+
+    @property
+    def raw(self):
+        return self._cursor
+
+    def close(self):
+        # Дочитанный курсор остаётся в кэше соединения для повторного
+        # использования, недочитанный закрывается (_PooledEntry.reset_pending)
+        self._finish()
+        if self._sql in self._entry.pending:
+            self._entry.discard(self._sql)
+        self._cursor = None
+
+    def __del__(self):
+        try:
+            self._finish()
+        except Exception:
+            pass
+
+
+class PooledConnection:
+    # Обёртка, которую возвращает connect_db(): close() возвращает соединение в пул
+    def __init__(self, pool, entry):
+        self._pool = pool
+        self._entry = entry
+
+    @property
+    def raw(self):
+        return self._entry.raw
+
+    @property
+    def backend(self):
+        return self._pool.backend
+
+    def cursor(self):
+        return PooledCursor(self._entry)
+
+    def execute(self, sql, params=()):
+        return self.cursor().execute(sql, params)
+
+    def commit(self):
+        self._entry.raw.commit()
+
+    def rollback(self):
+        self._entry.raw.rollback()
+
+    def close(self):
+        if self._entry is not None:
+            entry, self._entry = self._entry, None
+            self._pool.release(entry)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __del__(self):
+        # Забытое соединение всё равно вернётся в пул
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+class ConnectionPool:
+    def __init__(self, backend, max_size=4, timeout=10.0, health_check_interval=30.0,
+                 statement_cache_size=64, tracer=None):
+        self.backend = backend
+        self.max_size = max_size
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self.statement_cache_size = statement_cache_size
+        self.tracer = tracer or query_trace.TRACER
+        self._idle = []
+        self._size = 0
+        self._exclusive = False
+        self._cond = threading.Condition()
+
+    def _open(self):
+        started = time.perf_counter()
+        raw = self.backend.connect()
+        self.tracer.record_connect(time.perf_counter() - started)
+        return _PooledEntry(raw, self.statement_cache_size, self.tracer)
+
+    def _is_alive(self, entry):
+        try:
+            cursor = entry.raw.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchall()
+            cursor.close()
+            return True
+        except Exception:
+            return False
+
+    def acquire(self):
+        deadline = time.monotonic() + self.timeout
+        with self._cond:
+            while self._exclusive or (not self._idle and self._size >= self.max_size):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise StorageError("Нет свободных соединений с БД")
+                self._cond.wait(remaining)
+            entry = self._idle.pop() if self._idle else None
+            if entry is None:
+                self._size += 1
+
+        try:
+            if entry is None:
+                entry = self._open()
+            elif time.monotonic() - entry.last_used > self.health_check_interval and not self._is_alive(entry):
+                # Соединение отвалилось (сеть, файл на общем ресурсе) — переподключаемся
+                entry.close()
+                entry = self._open()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify_all()
+            raise
+        return PooledConnection(self, entry)
+
+    def release(self, entry):
+        try:
+            # Незафиксированные изменения и открытые выборки не должны
+            # утекать к следующему владельцу
+            entry.reset_pending()
+            entry.raw.rollback()
+        except Exception:
+            entry.close()
+            with self._cond:
+                self._size -= 1
+                self._cond.notify_all()
+            return
+        entry.last_used = time.monotonic()
+        with self._cond:
+            self._idle.append(entry)
+            self._cond.notify_all()
+
+    @contextmanager
+    def exclusive(self):
+        # Ждёт, пока все выданные соединения вернутся, закрывает их и не выдаёт
+        # новые до выхода из блока. Нельзя вызывать, держа соединение из пула.
+        deadline = time.monotonic() + self.timeout
+        with self._cond:
+            while self._exclusive:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise StorageError("БД занята: не дождались завершения запросов")
+                self._cond.wait(remaining)
+            # Новые соединения уже не выдаются; ждём возврата выданных
+            self._exclusive = True
+            while len(self._idle) < self._size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._exclusive = False
+                    self._cond.notify_all()
+                    raise StorageError("БД занята: не дождались завершения запросов")
+                self._cond.wait(remaining)
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+        try:
+            for entry in idle:
+                entry.close()
+            yield
+        finally:
+            with self._cond:
+                self._exclusive = False
+                self._cond.notify_all()
+
+    def snapshot(self, target):
+        # Согласованная копия БД в файл target, пока приложение продолжает работать
+        return self.backend.snapshot(self, target)
+
+    def close_all(self):
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+        for entry in idle:
+            entry.close()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(backend, **kwargs):
+    key = (backend.name, os.path.abspath(backend.db_path))
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = ConnectionPool(backend, **kwargs)
+            _pools[key] = pool
+            pool.tracer.set_default_log(os.path.dirname(os.path.abspath(backend.db_path)))
+        return pool
+
+
+# --- 5. Строки результатов для JSON и CSV (сервер, командная строка) ---
+def as_dict(row):
+    if isinstance(row, dict):
+        return row
+    if hasattr(row, "_asdict"):
+        return row._asdict()
+    # pyodbc.Row
+    return {column[0]: value for column, value in zip(row.cursor_description, row)}
+
+
+def json_value(value):
+    # Даты — строкой YYYY-MM-DD (club_client разбирает их обратно), остальное как есть
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
@@ -0,0 +1,33 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# club_data открывает БД при импорте, поэтому путь задаётся до импорта модулей
+# программы: тесты работают с отдельной базой SQLite во временном каталоге
+TMP_DIR = tempfile.mkdtemp(prefix="sportclub-tests-")
+os.environ["SPORTCLUB_BACKEND"] = "sqlite"
+os.environ["SPORTCLUB_DB"] = os.path.join(TMP_DIR, "sportclub.db")
+os.environ["SPORTCLUB_SLOW_LOG"] = os.path.join(TMP_DIR, "slow_queries.log")
+
+
+
+@pytest.fixture
+def club_db(monkeypatch):
+    # Пустая база club_data со схемой последней версии и пустой кэш.
+    # Командная строка и сервер подменяют show_error/show_warning — после теста
+    # прежние возвращаются
+    import club_data
+    monkeypatch.setattr(club_data, "show_error", club_data.show_error)
+    monkeypatch.setattr(club_data, "show_warning", club_data.show_warning)
+    conn = club_data.connect_db()
+    for table in ("Payments", "PaymentStats", "Athletes", "Groups"):
+        conn.execute(f"DELETE FROM {table}")
+    conn.commit()
+    conn.close()
+    club_data.DB_CACHE.clear()
+    return club_data
@@ -0,0 +1,72 @@
+import json
+import os
+import re
+import shlex
+
+import pytest
+
+import sportclub_cli
+from conftest import ROOT
+
+
+def documented_examples():
+    # Примеры из README.md и из шапки sportclub_cli.py
+    examples = []
+    for name in ("README.md", "sportclub_cli.py"):
+        with open(os.path.join(ROOT, name), encoding="utf-8") as f:
+            for line in f:
+                match = re.match(r"^#?\s*python sportclub_cli\.py (.+)$", line.rstrip())
+                if match:
+                    examples.append(match.group(1))
+    return examples
+
+
+@pytest.mark.parametrize("example", documented_examples())
+def test_documented_example_parses(example):
+    args = sportclub_cli.build_parser().parse_args(shlex.split(example))
+    assert args.func is not None
+
+
+def test_format_before_or_after_command():
+    parser = sportclub_cli.build_parser()
+    assert parser.parse_args(["--format", "csv", "groups"]).format == "csv"
+    assert parser.parse_args(["groups", "--format", "csv"]).format == "csv"
+    assert parser.parse_args(["groups"]).format == "json"
+
+
+@pytest.fixture
+def marked(club_db):
+    club_db.add_group("Младшая", "")
+    group_id = club_db.load_groups()[0].group_id
+    paid = club_db.add_athlete("Иванов Иван", None, "", group_id)
+    unpaid = club_db.add_athlete("Петров Пётр", None, "", group_id)
+    club_db.mark_payments_bulk([paid], "2024-05")
+    return paid, unpaid
+
+
+def test_unpaid_as_csv(marked, capsys):
+    assert sportclub_cli.main(["payments", "2024-5", "--unpaid", "--format", "csv"]) == sportclub_cli.EXIT_OK
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0] == "athlete_id,name,group_id,group_name,month,paid"
+    assert len(lines) == 2 and lines[1].startswith(f"{marked[1]},Петров Пётр,") and "2024-05" in lines[1]
+
+
+def test_mark_normalizes_month(marked, capsys):
+    assert sportclub_cli.main(["payments", "2024-5", "--mark", str(marked[1])]) == sportclub_cli.EXIT_OK
+    assert json.loads(capsys.readouterr().out) == {"month": "2024-05", "marked": [marked[1]], "already_paid": []}
+
+
+@pytest.mark.parametrize("month", ["2024-13", "май", "202412"])
+def test_bad_month_is_an_error(club_db, capsys, month):
+    assert sportclub_cli.main(["payments", month]) == sportclub_cli.EXIT_ERROR
+    assert "Неверный месяц" in capsys.readouterr().err
+
+
+def test_missing_export_module_is_an_error(club_db, tmp_path, capsys, monkeypatch):
+    import exporter
+
+    def missing(filename):
+        raise ModuleNotFoundError("No module named 'xlsxwriter'", name="xlsxwriter")
+    monkeypatch.setitem(exporter.WRITERS, ".xlsx", missing)
+    assert sportclub_cli.main(["export", str(tmp_path / "report.xlsx")]) == sportclub_cli.EXIT_ERROR
+    assert "не установлен модуль xlsxwriter" in capsys.readouterr().err
@@ -0,0 +1,147 @@
+import pytest
+
+import migrations
+import storage
+
+
+@pytest.fixture
+def warnings(club_db, monkeypatch):
+    shown = []
+    monkeypatch.setattr(club_db, "show_warning", lambda title, message: shown.append(message))
+    return shown
+
+
+@pytest.fixture
+def group_id(club_db):
+    assert club_db.add_group("Младшая", "")
+    return club_db.load_groups()[0].group_id
+
+
+def test_card_codes_are_unique(club_db, group_id, warnings):
+    first = club_db.add_athlete("Иванов Иван", None, "", group_id, "AB 12")
+    assert club_db.get_athlete(first).card_code == "ab12"
+    assert club_db.add_athlete("Петров Пётр", None, "", group_id, "ab12") is False
+    second = club_db.add_athlete("Петров Пётр", None, "", group_id)
+    assert club_db.set_card_code(second, "Ab12") is False
+    assert warnings == ["Карта ab12 уже выдана другому спортсмену"] * 2
+    assert club_db.get_athlete(second).card_code is None
+
+
+def test_many_athletes_without_card(club_db, group_id, warnings):
+    for name in ("Иванов", "Петров", "Сидоров"):
+        assert club_db.add_athlete(name, None, "", group_id, "")
+    athlete_id = club_db.add_athlete("Кузнецов", None, "", group_id, "77")
+    assert club_db.set_card_code(athlete_id, " ")
+    assert club_db.get_athlete(athlete_id).card_code is None
+    assert warnings == []
+
+
+def test_set_card_code_invalidates_rosters(club_db, group_id):
+    athlete_id = club_db.add_athlete("Иванов Иван", None, "", group_id)
+    club_db.load_athletes(group_id)
+    club_db.set_card_code(athlete_id, "42")
+    assert club_db.DB_CACHE.get(("athletes", group_id, "all"), lambda: "перечитано") == "перечитано"
+
+
+def test_set_card_code_checks_row_version(club_db, group_id):
+    athlete_id = club_db.add_athlete("Иванов Иван", None, "", group_id)
+    athlete = club_db.get_athlete(athlete_id)
+    assert club_db.set_card_code(athlete_id, "42", athlete.row_version)
+    with pytest.raises(storage.ConflictError) as conflict:
+        club_db.set_card_code(athlete_id, "43", athlete.row_version)
+    assert conflict.value.current.card_code == "42"
+
+
+def test_update_athlete_saves_card_in_one_versioned_update(club_db, group_id):
+    athlete_id = club_db.add_athlete("Иванов Иван", None, "", group_id)
+    athlete = club_db.get_athlete(athlete_id)
+    assert club_db.update_athlete(athlete_id, "Иванов И.", None, "1", group_id, "42", athlete.row_version)
+    saved = club_db.get_athlete(athlete_id)
+    assert (saved.name, saved.card_code, saved.row_version) == ("Иванов И.", "42", athlete.row_version + 1)
+
+
+def test_stale_update_athlete_is_a_conflict(club_db, group_id):
+    athlete_id = club_db.add_athlete("Иванов Иван", None, "", group_id)
+    athlete = club_db.get_athlete(athlete_id)
+    club_db.set_card_code(athlete_id, "42", athlete.row_version)
+    with pytest.raises(storage.ConflictError) as conflict:
+        club_db.update_athlete(athlete_id, "Иванов И.", None, "", group_id, None, athlete.row_version)
+    current = conflict.value.current
+    assert (current.name, current.card_code) == ("Иванов Иван", "42")
+    assert club_db.get_athlete(athlete_id).name == "Иванов Иван"
+
+
+def test_conflict_of_deleted_athlete_has_no_current_row(club_db, group_id):
+    athlete_id = club_db.add_athlete("Иванов Иван", None, "", group_id)
+    athlete = club_db.get_athlete(athlete_id)
+    club_db.delete_athlete(athlete_id)
+    with pytest.raises(storage.ConflictError) as conflict:
+        club_db.update_athlete(athlete_id, "Иванов И.", None, "", group_id, None, athlete.row_version)
+    assert conflict.value.current is None
+
+
+def test_conflict_with_one_pooled_connection(club_db, group_id, monkeypatch):
+    # Нынешняя строка читается тем же соединением, а не вторым из пула
+    athlete_id = club_db.add_athlete("Иванов Иван", None, "", group_id)
+    athlete = club_db.get_athlete(athlete_id)
+    club_db.DB_POOL.close_all()
+    monkeypatch.setattr(club_db.DB_POOL, "max_size", 1)
+    monkeypatch.setattr(club_db.DB_POOL, "timeout", 0.5)
+    club_db.set_card_code(athlete_id, "42")
+    with pytest.raises(storage.ConflictError):
+        club_db.update_athlete(athlete_id, "Иванов И.", None, "", group_id, None, athlete.row_version)
+
+
+def test_first_connect_upgrades_without_timing_queries(club_db, tmp_path, monkeypatch):
+    # Замеры до/после — только у python migrations.py, не при запуске программы
+    backend = storage.SQLiteBackend(str(tmp_path / "old.db"))
+    backend.create_database()
+    pool = storage.ConnectionPool(backend)
+    monkeypatch.setattr(club_db, "DB_BACKEND", backend)
+    monkeypatch.setattr(club_db, "DB_POOL", pool)
+    monkeypatch.setattr(club_db, "_db_ready", False)
+    monkeypatch.setattr(migrations, "time_main_queries", lambda conn: pytest.fail("замер при подключении"))
+    conn = club_db.connect_db()
+    try:
+        assert migrations.current_version(conn, backend) == migrations.MIGRATIONS[-1][0]
+    finally:
+        conn.close()
+        pool.close_all()
+
+
+def test_merge_changes_keeps_other_desk_edits(club_db):
+    original = {"name": "Иванов", "phone": "", "card_code": ""}
+    mine = {"name": "Иванов И.", "phone": "", "card_code": ""}
+    current = {"name": "Иванов", "phone": "555", "card_code": "42"}
+    assert club_db.merge_changes(original, mine, current) == (
+        {"name": "Иванов И.", "phone": "555", "card_code": "42"}, [])
+    current = dict(current, name="Иванов Иван")
+    assert club_db.merge_changes(original, mine, current)[1] == ["name"]
+
+
+def test_bulk_marking_survives_payment_from_other_desk(club_db, group_id, monkeypatch):
+    # Между проверкой и вставкой оплату одному из спортсменов отмечает другая стойка
+    ids = [club_db.add_athlete(name, None, "", group_id) for name in ("Иванов", "Петров", "Сидоров")]
+    existing_payments = club_db._existing_payments
+    calls = []
+
+    def other_desk_pays(cursor, period, athlete_ids):
+        existing = existing_payments(cursor, period, athlete_ids)
+        if not calls:
+            conn = club_db.DB_POOL.acquire()
+            conn.execute("INSERT INTO Payments (athlete_id, month_year, period, paid) VALUES (?, '2024-05', ?, 1)",
+                         (ids[1], period))
+            conn.commit()
+            conn.close()
+        calls.append(period)
+        return existing
+
+    monkeypatch.setattr(club_db, "_existing_payments", other_desk_pays)
+    assert club_db.mark_payments_bulk(ids, "2024-05") == ([ids[0], ids[2]], [ids[1]])
+    assert len(calls) == 2
+    conn = club_db.connect_db()
+    try:
+        paid = conn.execute("SELECT athlete_id FROM Payments WHERE period = 202405 ORDER BY athlete_id").fetchall()
+    finally:
+        conn.close()
+    assert [row[0] for row in paid] == ids
@@ -0,0 +1,63 @@
+import pytest
+
+import migrations
+import storage
+
+
+@pytest.fixture
+def pool(tmp_path):
+    # База в исходной схеме (SQLITE_SCHEMA), без миграций
+    backend = storage.SQLiteBackend(str(tmp_path / "club.db"))
+    backend.create_database()
+    pool = storage.ConnectionPool(backend)
+    yield pool
+    pool.close_all()
+
+
+def upgrade_to(pool, version, monkeypatch):
+    with monkeypatch.context() as patch:
+        patch.setattr(migrations, "MIGRATIONS", [m for m in migrations.MIGRATIONS if m[0] <= version])
+        migrations.upgrade(pool, measure=False)
+
+
+def test_upgrade_from_baseline_schema(pool, capsys):
+    conn = pool.acquire()
+    conn.execute("INSERT INTO Groups (group_name) VALUES ('Младшая')")
+    conn.execute("INSERT INTO Athletes (name, current_group_id) VALUES ('Иванов', 1)")
+    for month in ("2024-01", "2024-13"):
+        conn.execute("INSERT INTO Payments (athlete_id, month_year, paid) VALUES (1, ?, 1)", (month,))
+    conn.commit()
+    conn.close()
+
+    report = migrations.upgrade(pool)
+    assert capsys.readouterr().out == ""
+    latest = migrations.MIGRATIONS[-1][0]
+    assert f"Миграция {latest} применена" in report
+    assert "Пропущена оплата" in report
+    conn = pool.acquire()
+    try:
+        assert migrations.current_version(conn, pool.backend) == latest
+        assert conn.execute("SELECT COUNT(*) FROM Payments").fetchone()[0] == 2
+        assert {"card_code", "row_version"} <= {r[1] for r in conn.execute("PRAGMA table_info(Athletes)")}
+    finally:
+        conn.close()
+    assert migrations.upgrade(pool) is None
+
+
+def test_duplicate_cards_are_cleared_before_unique_index(pool, monkeypatch):
+    upgrade_to(pool, 6, monkeypatch)
+    conn = pool.acquire()
+    conn.execute("INSERT INTO Groups (group_name) VALUES ('Младшая')")
+    for name, card in (("Иванов", "AB 12"), ("Петров", "ab12"), ("Сидоров", ""), ("Кузнецов", "")):
+        conn.execute("INSERT INTO Athletes (name, current_group_id, card_code) VALUES (?, 1, ?)", (name, card))
+    conn.commit()
+    conn.close()
+
+    migrations.upgrade(pool, measure=False)
+    conn = pool.acquire()
+    cards = [tuple(r) for r in conn.execute("SELECT name, card_code FROM Athletes ORDER BY athlete_id").fetchall()]
+    indexes = pool.backend.list_indexes(conn, "Athletes")
+    conn.close()
+    assert cards == [("Иванов", "ab12"), ("Петров", None), ("Сидоров", None), ("Кузнецов", None)]
+    assert indexes["ux_athletes_card"] == (True, ["card_code"])
+    assert "idx_athletes_card" not in indexes
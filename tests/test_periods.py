@@ -0,0 +1,15 @@
+import pytest
+
+import periods
+
+
+def test_month_key_accepts_year_month():
+    assert periods.month_key("2024-12") == 202412
+    assert periods.month_key(" 2024-5 ") == 202405
+    assert periods.month_key("2024-05-15") == 202405
+
+
+@pytest.mark.parametrize("value", ["202412", "2024/5", "2024-123", "2024-13", "24-05", ""])
+def test_month_key_rejects_other_formats(value):
+    with pytest.raises(ValueError):
+        periods.month_key(value)
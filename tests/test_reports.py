@@ -0,0 +1,50 @@
+import csv
+
+import reports
+
+
+def test_full_period_report(club_db, tmp_path):
+    club_db.add_group("Младшая", "")
+    club_db.add_group("Старшая", "")
+    groups = {g.group_name: g.group_id for g in club_db.load_groups()}
+    young = club_db.add_athlete("Иванов Иван", None, "", groups["Младшая"])
+    old = club_db.add_athlete("Петров Пётр", None, "", groups["Старшая"])
+    club_db.mark_payments_bulk([young], "2021-03")
+    club_db.mark_payments_bulk([young, old], "2023-11")
+    club_db.mark_payments_bulk([old], "2024-02")
+
+    assert reports.payment_months(club_db.DB_POOL) == (202103, 202402)
+    assert reports.payment_months(club_db.DB_POOL, groups["Младшая"]) == (202103, 202311)
+    assert reports.payment_months(club_db.DB_POOL, -1) == (None, None)
+
+    filename = tmp_path / "report.csv"
+    reports.build_report(club_db.DB_POOL, str(filename), groups["Младшая"],
+                         *reports.payment_months(club_db.DB_POOL, groups["Младшая"]))
+    with open(tmp_path / "report_Оплаты по месяцам.csv", encoding="utf-8-sig") as f:
+        header = next(csv.reader(f, delimiter=";"))
+    months = [column for column in header if column[:2] == "20"]
+    assert (months[0], months[-1], len(months)) == ("2021-03", "2023-11", 33)
+
+
+def test_monthly_payments_sheet_rows(club_db):
+    club_db.add_group("Младшая", "")
+    group_id = club_db.load_groups()[0].group_id
+    first = club_db.add_athlete("Иванов Иван", None, "", group_id)
+    club_db.add_athlete("Петров Пётр", None, "", group_id)
+    third = club_db.add_athlete("Сидоров Сидор", None, "", group_id)
+    club_db.mark_payments_bulk([first, third], "2024-01")
+    club_db.mark_payments_bulk([first], "2024-03")
+    club_db.mark_payments_bulk([third], "2023-12")  # вне периода
+
+    conn = club_db.DB_POOL.acquire()
+    try:
+        title, columns, batches = reports.monthly_payments_sheet(conn, reports.month_range("2024-01", "2024-03"))
+        rows = [row for batch in batches for row in batch]
+    finally:
+        conn.close()
+    assert columns == ["ФИО", "Группа", "2024-01", "2024-02", "2024-03"]
+    assert rows == [
+        ["Иванов Иван", "Младшая", "Да", "", "Да"],
+        ["Петров Пётр", "Младшая", "", "", ""],
+        ["Сидоров Сидор", "Младшая", "Да", "", ""],
+    ]
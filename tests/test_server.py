@@ -0,0 +1,104 @@
+import asyncio
+import socket
+import threading
+
+import pytest
+
+import club_client
+import club_server
+import storage
+
+
+@pytest.fixture
+def server(club_db, monkeypatch):
+    # Сервер в отдельном потоке со своим циклом asyncio, порт выбирает система
+    monkeypatch.setattr(club_db, "show_error", club_server._raise_error)
+    monkeypatch.setattr(club_db, "show_warning", club_server._raise_warning)
+    club_server_obj = club_server.ClubServer(club_db, token="secret")
+    started = threading.Event()
+    state = {}
+
+    async def run():
+        club_server_obj.batcher = club_server.PaymentBatcher(club_server_obj)
+        batcher = asyncio.create_task(club_server_obj.batcher.run())
+        listener = await asyncio.start_server(club_server_obj.handle, "127.0.0.1", 0)
+        state["loop"] = asyncio.get_running_loop()
+        state["port"] = listener.sockets[0].getsockname()[1]
+        state["stop"] = asyncio.Event()
+        started.set()
+        async with listener:
+            await state["stop"].wait()
+        batcher.cancel()
+
+    thread = threading.Thread(target=asyncio.run, args=(run(),), daemon=True)
+    thread.start()
+    started.wait(5)
+    monkeypatch.setenv(club_client.SERVER_ENV, f"http://127.0.0.1:{state['port']}")
+    monkeypatch.setenv(club_client.TOKEN_ENV, "secret")
+    club_client.DB_CACHE.clear()
+    yield state
+    state["loop"].call_soon_threadsafe(state["stop"].set)
+    thread.join(5)
+    club_server_obj.readers.shutdown(wait=False)
+    club_server_obj.writer.shutdown(wait=True)
+
+
+def add_group(name):
+    assert club_client.add_group(name, "")
+    return next(g.group_id for g in club_client.load_groups() if g.group_name == name)
+
+
+def raw_request(port, data):
+    with socket.create_connection(("127.0.0.1", port), timeout=5) as sock:
+        sock.sendall(data)
+        return sock.recv(65536).decode("utf-8")
+
+
+def test_groups_and_athletes_round_trip(server):
+    group_id = add_group("Младшая")
+    athlete_id = club_client.add_athlete("Иванов Иван", None, "", group_id)
+    athlete = club_client.get_athlete(athlete_id)
+    assert athlete.name == "Иванов Иван"
+    assert [a.athlete_id for a in club_client.load_athletes(group_id)] == [athlete_id]
+
+
+def test_stale_row_version_is_a_conflict(server):
+    group_id = add_group("Младшая")
+    athlete_id = club_client.add_athlete("Иванов Иван", None, "", group_id)
+    athlete = club_client.get_athlete(athlete_id)
+    club_client.update_athlete(athlete_id, "Иванов И.", None, "1", group_id, "42", athlete.row_version)
+    with pytest.raises(storage.ConflictError) as conflict:
+        club_client.update_athlete(athlete_id, "Петров", None, "", group_id, None, athlete.row_version)
+    assert (conflict.value.current.name, conflict.value.current.card_code) == ("Иванов И.", "42")
+
+
+def test_payments_are_marked_once(server):
+    group_id = add_group("Младшая")
+    athlete_id = club_client.add_athlete("Иванов Иван", None, "", group_id)
+    assert club_client.mark_payments_bulk([athlete_id], "2024-5") == ([athlete_id], [])
+    assert club_client.mark_payments_bulk([athlete_id], "2024-05") == ([], [athlete_id])
+
+
+def test_reads_see_rows_written_by_other_connections(server, club_db):
+    group_id = add_group("Младшая")
+    club_client.add_athlete("Иванов Иван", None, "", group_id)
+    assert len(club_client.load_athletes(group_id)) == 1
+    # Запись мимо сервера (импорт, другая программа)
+    conn = storage.ConnectionPool(club_db.DB_BACKEND, max_size=1).acquire()
+    conn.execute("INSERT INTO Athletes (name, phone, current_group_id, row_version) VALUES ('Петров', '', ?, 0)",
+                 (group_id,))
+    conn.commit()
+    conn.close()
+    club_client.DB_CACHE.clear()
+    club_db.DB_CACHE.clear()
+    assert len(club_client.load_athletes(group_id)) == 2
+
+
+def test_token_is_required(server):
+    response = raw_request(server["port"], b"GET /groups HTTP/1.1\r\nHost: x\r\nConnection: close\r\n\r\n")
+    assert response.startswith("HTTP/1.1 401")
+
+
+@pytest.mark.parametrize("line", [b"GARBAGE\r\n\r\n", b"GET /groups\r\n\r\n"])
+def test_malformed_request_line_gets_400(server, line):
+    assert raw_request(server["port"], line).startswith("HTTP/1.1 400")
@@ -0,0 +1,81 @@
+import sqlite3
+
+import pytest
+
+import storage
+
+
+@pytest.fixture
+def pool(tmp_path):
+    # Одно соединение в пуле: каждый acquire получает то же физическое соединение
+    backend = storage.SQLiteBackend(str(tmp_path / "pool.db"))
+    pool = storage.ConnectionPool(backend, max_size=1)
+    conn = pool.acquire()
+    conn.execute("CREATE TABLE t (id INTEGER PRIMARY KEY)")
+    conn.execute("INSERT INTO t (id) VALUES (1), (2)")
+    conn.commit()
+    conn.close()
+    yield pool
+    pool.close_all()
+
+
+def insert_elsewhere(pool, row_id):
+    other = sqlite3.connect(pool.backend.db_path)
+    other.execute("INSERT INTO t (id) VALUES (?)", (row_id,))
+    other.commit()
+    other.close()
+
+
+def count(pool):
+    conn = pool.acquire()
+    try:
+        return conn.execute("SELECT COUNT(*) AS n FROM t").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_unread_select_does_not_pin_snapshot(pool):
+    conn = pool.acquire()
+    conn.execute("SELECT id FROM t ORDER BY id").fetchone()  # вторая строка не прочитана
+    conn.close()
+
+    insert_elsewhere(pool, 3)
+    assert count(pool) == 3
+
+
+def test_closed_cursor_does_not_pin_snapshot(pool):
+    conn = pool.acquire()
+    cursor = conn.cursor()
+    cursor.execute("SELECT id FROM t ORDER BY id")
+    cursor.fetchmany(1)
+    cursor.close()
+
+    insert_elsewhere(pool, 3)
+    assert conn.execute("SELECT COUNT(*) AS n FROM t").fetchone()[0] == 3
+    conn.close()
+
+
+def test_fetch_page_does_not_pin_snapshot(pool):
+    conn = pool.acquire()
+    rows = pool.backend.fetch_page(conn.cursor(), "SELECT id FROM t ORDER BY id", (), 0, 1)
+    conn.close()
+    assert [r.id for r in rows] == [1]
+
+    insert_elsewhere(pool, 3)
+    assert count(pool) == 3
+
+
+def test_read_statements_stay_cached(pool):
+    conn = pool.acquire()
+    conn.execute("SELECT id FROM t").fetchall()
+    conn.close()
+    conn = pool.acquire()
+    assert "SELECT id FROM t" in conn._entry.statements
+    conn.close()
+
+
+def test_release_rolls_back_uncommitted(pool):
+    conn = pool.acquire()
+    conn.execute("INSERT INTO t (id) VALUES (10)")
+    conn.close()
+    assert count(pool) == 2
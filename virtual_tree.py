@@ -0,0 +1,220 @@
+import tkinter as tk
+from collections import OrderedDict
+from tkinter import ttk
+
+
+# Виртуальный список поверх ttk.Treeview: в виджете живут только видимые
+# строки, остальные подгружаются страницами из источника при прокрутке.
+# Источник — объект с методами count() и page(offset, limit).
+
+PAGE_SIZE = 100
+CACHED_PAGES = 20
+
+
+# --- 1. Источники строк ---
+class ListSource:
+    # Готовый список (например, результаты поиска)
+    def __init__(self, rows):
+        self.rows = list(rows)
+
+    def count(self):
+        return len(self.rows)
+
+    def page(self, offset, limit):
+        return self.rows[offset:offset + limit]
+
+
+class QuerySource:
+    # sql должен быть упорядочен по уникальному ключу, иначе страницы
+    # будут пересекаться; count_sql — тот же запрос с COUNT(*) без ORDER BY.
+    # С cache (cache.ReadCache) страницы и число строк хранятся под cache_key.
+    def __init__(self, pool, sql, params=(), count_sql=None, cache=None, cache_key=None):
+        self.pool = pool
+        self.sql = sql
+        self.params = list(params)
+        self.count_sql = count_sql
+        self.cache = cache
+        self.cache_key = cache_key
+
+    def count(self):
+        if self.cache is not None:
+            return self.cache.get(self.cache_key + ("count",), self._count)
+        return self._count()
+
+    def page(self, offset, limit):
+        if self.cache is not None:
+            return self.cache.get(self.cache_key + ("page", offset, limit), lambda: self._page(offset, limit))
+        return self._page(offset, limit)
+
+    def _count(self):
+        conn = self.pool.acquire()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(self.count_sql, self.params)
+            return cursor.fetchone()[0]
+        finally:
+            conn.close()
+
+    def _page(self, offset, limit):
+        conn = self.pool.acquire()
+        try:
+            return self.pool.backend.fetch_page(conn.cursor(), self.sql, self.params, offset, limit)
+        finally:
+            conn.close()
+
+
+# --- 2. Виджет ---
+class VirtualTreeview(tk.Frame):
+    # Выделение действует в пределах видимых строк. Методы Treeview
+    # (selection, item, heading, column...) доступны напрямую.
+    def __init__(self, master, columns, row_values=None, row_iid=None, worker=None,
+                 page_size=PAGE_SIZE, **tree_options):
+        tk.Frame.__init__(self, master)
+        self.row_values = row_values or tuple
+        self.row_iid = row_iid
+        self.worker = worker
+        self.page_size = page_size
+
+        self.source = None
+        self.total = 0
+        self.first = 0
+        self.visible = 20
+        self._pages = OrderedDict()
+        self._loading = set()
+        self._generation = 0
+        self._rendering = False
+
+        self.tree = ttk.Treeview(self, columns=columns, show="headings", **tree_options)
+        self.scrollbar = ttk.Scrollbar(self, orient=tk.VERTICAL, command=self._on_scroll)
+        self.count_label = tk.Label(self, text="", anchor=tk.E)
+
+        self.count_label.pack(side=tk.BOTTOM, fill=tk.X)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+        self.tree.bind("<Configure>", self._on_resize)
+        self.tree.bind("<MouseWheel>", self._on_wheel)
+        self.tree.bind("<Button-4>", lambda e: self._scroll_to(self.first - 3))
+        self.tree.bind("<Button-5>", lambda e: self._scroll_to(self.first + 3))
+        self.tree.bind("<Prior>", lambda e: self._scroll_to(self.first - self.visible))
+        self.tree.bind("<Next>", lambda e: self._scroll_to(self.first + self.visible))
+        self.tree.bind("<Home>", lambda e: self._scroll_to(0))
+        self.tree.bind("<End>", lambda e: self._scroll_to(self.total))
+
+    def __getattr__(self, name):
+        if name == "tree" or name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.tree, name)
+
+    def set_source(self, source, keep_position=False):
+        self.source = source
+        self._generation += 1
+        self._pages.clear()
+        self._loading.clear()
+        if not keep_position:
+            self.first = 0
+        self.count_label.config(text="Загрузка...")
+        self._request(source.count, (), self._on_count)
+
+    def refresh(self):
+        # Перечитать тот же источник (после изменений в БД), не сбрасывая прокрутку
+        if self.source is not None:
+            self.set_source(self.source, keep_position=True)
+
+    def clear(self):
+        self.set_source(ListSource([]))
+
+    # Загрузка: через фоновый поток, если он есть, иначе сразу
+    def _request(self, func, args, on_done):
+        # Ответ для уже заменённого источника отбрасывается
+        generation = self._generation
+
+        def done(result):
+            if generation == self._generation:
+                on_done(result)
+
+        if self.worker is None:
+            done(func(*args))
+        else:
+            self.worker.submit(func, *args, on_done=done)
+
+    def _on_count(self, total):
+        self.total = total
+        self._scroll_to(self.first)
+
+    def _on_page(self, rows, index):
+        self._loading.discard(index)
+        self._pages[index] = rows
+        while len(self._pages) > CACHED_PAGES:
+            self._pages.popitem(last=False)
+        if not self._rendering:
+            self._render()
+
+    def _row(self, index):
+        page = self._pages.get(index // self.page_size)
+        if page is None:
+            return None
+        self._pages.move_to_end(index // self.page_size)
+        offset = index % self.page_size
+        return page[offset] if offset < len(page) else None
+
+    def _render(self):
+        last = min(self.first + self.visible, self.total)
+        self._rendering = True
+        try:
+            for index in range(self.first // self.page_size, (max(last, 1) - 1) // self.page_size + 1):
+                if index not in self._pages and index not in self._loading:
+                    self._loading.add(index)
+                    self._request(self.source.page, (index * self.page_size, self.page_size),
+                                  lambda rows, index=index: self._on_page(rows, index))
+        finally:
+            self._rendering = False
+
+        selected = set(self.tree.selection())
+        self.tree.delete(*self.tree.get_children())
+        for position in range(self.first, last):
+            row = self._row(position)
+            if row is None:
+                self.tree.insert("", tk.END, iid=f"loading-{position}", values=("...",))
+                continue
+            iid = str(self.row_iid(row)) if self.row_iid else str(position)
+            self.tree.insert("", tk.END, iid=iid, values=self.row_values(row))
+            if iid in selected:
+                self.tree.selection_add(iid)
+
+        if self.total:
+            self.scrollbar.set(self.first / self.total, last / self.total)
+            self.count_label.config(text=f"Строки {self.first + 1}–{last} из {self.total}")
+        else:
+            self.scrollbar.set(0, 1)
+            self.count_label.config(text="Нет данных")
+
+    def _scroll_to(self, first):
+        self.first = max(0, min(first, self.total - self.visible))
+        if self.source is not None:
+            self._render()
+        return "break"
+
+    def _on_scroll(self, action, amount, unit=None):
+        if action == "moveto":
+            self._scroll_to(int(float(amount) * self.total))
+        elif unit == "pages":
+            self._scroll_to(self.first + int(amount) * self.visible)
+        else:
+            self._scroll_to(self.first + int(amount))
+
+    def _on_wheel(self, event):
+        return self._scroll_to(self.first - (event.delta // 120 or (1 if event.delta > 0 else -1)) * 3)
+
+    def _on_resize(self, event):
+        # Число видимых строк считаем по высоте виджета и высоте строки
+        row_height = ttk.Style().lookup("Treeview", "rowheight") or 20
+        children = self.tree.get_children()
+        box = self.tree.bbox(children[0]) if children else None
+        header = 25
+        if box:
+            header, row_height = box[1], box[3]
+        visible = max(1, (event.height - header) // int(row_height))
+        if visible != self.visible:
+            self.visible = visible
+            self._scroll_to(self.first)
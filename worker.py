@@ -0,0 +1,153 @@
+import queue
+import threading
+from tkinter import messagebox
+
+
+# Запросы к БД выполняются в отдельном потоке, а результаты возвращаются
+# в поток Tk через root.after: окно не замирает, пока база на сетевом
+# диске отвечает. Поток один, поэтому запросы выполняются строго по очереди
+# (запись, а за ней перечитывание, никогда не меняются местами).
+
+POLL_MS = 50
+
+_errors = queue.Queue()
+_local = threading.local()
+
+
+class Cancelled(Exception):
+    pass
+
+
+def on_main_thread():
+    return threading.current_thread() is threading.main_thread()
+
+
+def show_error(title, message):
+    # Из потока БД окно показывать нельзя: сообщение покажет поток Tk
+    if on_main_thread():
+        messagebox.showerror(title, message)
+    else:
+        _errors.put((title, message))
+
+
+def check_cancelled():
+    # Долгие задания (выгрузки) вызывают это между пачками строк
+    task = getattr(_local, "task", None)
+    if task is not None and task.cancelled:
+        raise Cancelled()
+
+
+class Task:
+    def __init__(self, func, args, key, label, on_done, on_error):
+        self.func = func
+        self.args = args
+        self.key = key
+        self.label = label
+        self.on_done = on_done
+        self.on_error = on_error
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class DbWorker:
+    def __init__(self, root, on_busy=None):
+        self.root = root
+        self.on_busy = on_busy
+        self._requests = queue.Queue()
+        self._results = queue.Queue()
+        self._latest = {}
+        self._active = []
+        self._polling = False
+        self._thread = threading.Thread(target=self._run, name="db-worker", daemon=True)
+        self._thread.start()
+
+    def submit(self, func, *args, key=None, label="", on_done=None, on_error=None):
+        # Новый запрос с тем же key отменяет предыдущий (например, быстрое
+        # переключение групп): его результат уже никому не нужен
+        task = Task(func, args, key, label, on_done, on_error)
+        if key is not None:
+            previous = self._latest.get(key)
+            if previous is not None:
+                previous.cancel()
+            self._latest[key] = task
+        self._active.append(task)
+        self._requests.put(task)
+        self._notify_busy()
+        self._schedule_poll()
+        return task
+
+    def cancel(self, key):
+        task = self._latest.pop(key, None)
+        if task is not None:
+            task.cancel()
+
+    def busy(self):
+        return any(not t.cancelled for t in self._active)
+
+    def stop(self):
+        for task in self._active:
+            task.cancel()
+        self._requests.put(None)
+
+    def _run(self):
+        while True:
+            task = self._requests.get()
+            if task is None:
+                return
+            if task.cancelled:
+                self._results.put((task, None, Cancelled()))
+                continue
+            _local.task = task
+            try:
+                self._results.put((task, task.func(*task.args), None))
+            except Exception as e:
+                self._results.put((task, None, e))
+            finally:
+                _local.task = None
+
+    def _schedule_poll(self):
+        if not self._polling:
+            self._polling = True
+            self.root.after(POLL_MS, self._poll)
+
+    def _poll(self):
+        self._polling = False
+        self._show_errors()
+        while True:
+            try:
+                task, result, error = self._results.get_nowait()
+            except queue.Empty:
+                break
+            self._active.remove(task)
+            if task.key is not None and self._latest.get(task.key) is task:
+                del self._latest[task.key]
+            if task.cancelled or isinstance(error, Cancelled):
+                continue
+            try:
+                if error is None:
+                    if task.on_done:
+                        task.on_done(result)
+                elif task.on_error:
+                    task.on_error(error)
+                else:
+                    messagebox.showerror("Ошибка", str(error))
+            except Exception as e:
+                messagebox.showerror("Ошибка", str(e))
+        self._show_errors()
+        self._notify_busy()
+        if self._active:
+            self._schedule_poll()
+
+    def _show_errors(self):
+        while True:
+            try:
+                title, message = _errors.get_nowait()
+            except queue.Empty:
+                return
+            messagebox.showerror(title, message)
+
+    def _notify_busy(self):
+        if self.on_busy:
+            self.on_busy([t.label for t in self._active if not t.cancelled and t.label])